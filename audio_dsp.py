@@ -0,0 +1,264 @@
+# --- Etapa DSP opcional del modo PCM: volumen, normalización de sonoridad y crossfade ---
+# Se aplica con NumPy sobre lotes de frames de 20 ms, antes de que discord.py codifique a Opus:
+# volumen por servidor, una ganancia por emisora que lleva su sonoridad media a un nivel común y un
+# crossfade al cambiar de emisora (la anterior sigue sonando hasta que la nueva entrega audio real).
+# NumPy es opcional: sin él la etapa no se usa y el audio pasa como antes.
+import ctypes
+import math
+
+import discord
+from discord.opus import Encoder as OpusEncoder
+
+from audio_pipeline import PCM_SILENCE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FRAME_SECONDS = OpusEncoder.FRAME_LENGTH / 1000
+FRAME_VALUES = OpusEncoder.SAMPLES_PER_FRAME * OpusEncoder.CHANNELS # Muestras s16 por frame (ambos canales)
+FULL_SCALE = 32768.0
+SILENCE_GATE_DBFS = -60.0 # Frames más bajos (pausas, silencio entre temas) no cuentan para la sonoridad
+GAIN_EPSILON = 1e-3 # Cambios de ganancia menores que esto se aplican sin rampa
+
+
+def dsp_available() -> bool:
+    return np is not None
+
+
+def db_to_gain(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+def _gain_to_db(gain: float) -> float:
+    return 20 * math.log10(gain) if gain > 0 else -math.inf
+
+
+_curves = {} # Curvas compartidas entre todas las fuentes (rampas por tamaño de lote, crossfades por duración)
+
+
+def _batch_ramp(frames: int):
+    # 0 -> 1 a lo largo de ``frames`` frames, repetida por canal (las muestras van intercaladas L/R)
+    key = ("ramp", frames)
+    if key not in _curves:
+        samples = frames * OpusEncoder.SAMPLES_PER_FRAME
+        ramp = (np.arange(1, samples + 1, dtype=np.float32) / samples).repeat(OpusEncoder.CHANNELS)
+        _curves[key] = ramp.reshape(frames, FRAME_VALUES)
+    return _curves[key]
+
+
+def _crossfade_curves(frames: int):
+    # Potencia constante (seno/coseno): la mezcla no baja de volumen a mitad del cruce
+    key = ("crossfade", frames)
+    if key not in _curves:
+        position = _batch_ramp(frames) * (math.pi / 2)
+        _curves[key] = (np.sin(position), np.cos(position))
+    return _curves[key]
+
+
+class StationLoudness:
+    """Sonoridad media de cada emisora y la ganancia que la lleva a ``target_dbfs``.
+
+    Es RMS con compuerta de silencio y media móvil exponencial de ``window`` segundos (aproxima LUFS,
+    sin la ponderación K). Se comparte entre servidores: quien vuelve a una emisora ya medida arranca
+    con la ganancia correcta.
+    """
+
+    def __init__(self, target_dbfs: float = -18.0, window: float = 3.0, max_boost_db: float = 9.0, max_cut_db: float = 15.0):
+        self.target_dbfs = target_dbfs
+        self._target_ms = (FULL_SCALE * db_to_gain(target_dbfs)) ** 2
+        self._gate_ms = (FULL_SCALE * db_to_gain(SILENCE_GATE_DBFS)) ** 2
+        self._alpha = 1 - math.exp(-FRAME_SECONDS / window)
+        self._min_gain = db_to_gain(-max_cut_db)
+        self._max_gain = db_to_gain(max_boost_db)
+        self._levels = {} # clave de emisora -> [media cuadrática, frames medidos]
+
+    def observe(self, key, mean_squares):
+        level = self._levels.get(key)
+        for ms in mean_squares:
+            if ms < self._gate_ms:
+                continue
+            if level is None:
+                level = self._levels[key] = [ms, 1]
+                continue
+            level[1] += 1
+            # Al principio es un promedio simple (converge rápido); después, una media móvil
+            level[0] += max(self._alpha, 1 / level[1]) * (ms - level[0])
+
+    def gain(self, key) -> float:
+        level = self._levels.get(key)
+        if level is None:
+            return 1.0
+        return min(self._max_gain, max(self._min_gain, math.sqrt(self._target_ms / level[0])))
+
+    def level_dbfs(self, key):
+        level = self._levels.get(key)
+        return round(10 * math.log10(level[0] / FULL_SCALE ** 2), 1) if level else None
+
+    def stats(self) -> dict:
+        return {"stations": len(self._levels), "target_dbfs": self.target_dbfs}
+
+
+class DSPSource(discord.AudioSource):
+    """Aplica volumen, normalización y crossfade a una fuente PCM (normalmente :class:`audio_pipeline.MonitoredSource`).
+
+    Si ``buffered()`` dice que la fuente ya tiene frames esperando (buffer de jitter), se leen hasta
+    ``batch_frames`` de una vez y se procesan juntos; nunca se espera por frames que no llegaron.
+    La salida se escribe sobre memoria reservada al inicio y se entrega como vistas ``ctypes``
+    (igual que :class:`jitter_buffer.JitterBuffer`). El silencio de relleno pasa tal cual, sin procesar.
+    """
+
+    def __init__(self, source, volume: float = 1.0, loudness: StationLoudness = None, loudness_key=None,
+                 batch_frames: int = 5, buffered=None):
+        self.source = source
+        self.volume = volume
+        self.loudness = loudness
+        self.loudness_key = loudness_key
+        self._batch = max(1, batch_frames)
+        self._buffered = buffered
+        self._memory = bytearray(self._batch * OpusEncoder.FRAME_SIZE)
+        frame_type = ctypes.c_char * OpusEncoder.FRAME_SIZE
+        self._frames = [frame_type.from_buffer(self._memory, i * OpusEncoder.FRAME_SIZE) for i in range(self._batch)]
+        self._out = np.frombuffer(self._memory, dtype=np.int16).reshape(self._batch, FRAME_VALUES)
+        self._work = np.empty((self._batch, FRAME_VALUES), dtype=np.float32)
+        self._mix = np.empty(FRAME_VALUES, dtype=np.float32)
+        self._gain = None # Última ganancia aplicada (la siguiente arranca desde aquí, sin saltos)
+        self._ready = 0 # Frames procesados en _frames...
+        self._next = 0 # ...y el próximo a entregar
+        self._stash = None # Silencio o fin leído en medio de un lote: se entrega después del lote
+        self._fade_from = None
+        self._fade_frames = 0
+        self._fade_pos = 0
+        self._preroll_left = 0
+        self._on_fade_done = None
+        self.frames = 0
+        self.batches = 0
+        self.crossfades = 0
+
+    @property
+    def _current_error(self):
+        return getattr(self.source, "_current_error", None)
+
+    @property
+    def retired(self) -> bool:
+        return getattr(self.source, "retired", False)
+
+    @retired.setter
+    def retired(self, value: bool):
+        self.source.retired = value # La fuente monitoreada es la que decide no terminar el reproductor
+
+    @property
+    def gain(self) -> float:
+        return self._gain if self._gain is not None else self.volume
+
+    def crossfade_from(self, previous, frames: int, preroll_frames: int = 250, on_done=None):
+        """Mezcla ``previous`` (la fuente que sonaba) con esta durante ``frames`` frames.
+
+        Hasta que esta fuente entregue audio real (o pasen ``preroll_frames``) sigue sonando solo
+        ``previous``. Al terminar se llama ``on_done(previous)`` desde el hilo del reproductor.
+        """
+        self._fade_from = previous
+        self._fade_frames = max(1, frames)
+        self._fade_pos = 0
+        self._preroll_left = preroll_frames
+        self._on_fade_done = on_done
+
+    def read(self):
+        if self._next < self._ready:
+            frame = self._frames[self._next]
+            self._next += 1
+            return frame
+        self._ready = self._next = 0
+        if self._stash is not None:
+            data, self._stash = self._stash, None
+            return data
+        if self._fade_from is not None:
+            return self._read_crossfade()
+        data = self.source.read()
+        if not data or data is PCM_SILENCE:
+            return data
+        self._work[0] = np.frombuffer(data, dtype=np.int16)
+        count = 1
+        if self._buffered is not None:
+            while count < self._batch and self._buffered() > 0:
+                data = self.source.read()
+                if not data or data is PCM_SILENCE:
+                    self._stash = data
+                    break
+                self._work[count] = np.frombuffer(data, dtype=np.int16)
+                count += 1
+        self._process(count)
+        self._ready, self._next = count, 1
+        return self._frames[0]
+
+    def _read_crossfade(self):
+        previous = self._fade_from.read() or PCM_SILENCE # Si la anterior terminó, se cruza desde silencio
+        data = self.source.read()
+        if not data:
+            self._finish_crossfade()
+            return data
+        if data is PCM_SILENCE and self._fade_pos == 0 and self._preroll_left > 0:
+            # La nueva emisora todavía está conectando: sigue sonando la anterior, sin hueco
+            self._preroll_left -= 1
+            return previous
+        if data is PCM_SILENCE:
+            self._work[0] = 0
+        else:
+            self._work[0] = np.frombuffer(data, dtype=np.int16)
+        fade_in, fade_out = _crossfade_curves(self._fade_frames)
+        self._mix[:] = np.frombuffer(previous, dtype=np.int16)
+        self._mix *= fade_out[self._fade_pos]
+        self._process(1, fade_in=fade_in[self._fade_pos], mix=self._mix)
+        self._fade_pos += 1
+        if self._fade_pos >= self._fade_frames:
+            self._finish_crossfade()
+        return self._frames[0]
+
+    def _finish_crossfade(self):
+        previous, on_done = self._fade_from, self._on_fade_done
+        self._fade_from = self._on_fade_done = None
+        if previous is None:
+            return
+        self.crossfades += 1
+        if on_done is not None:
+            on_done(previous)
+
+    def _process(self, count: int, fade_in=None, mix=None):
+        work = self._work[:count]
+        gain = self.volume
+        if self.loudness is not None:
+            mean_squares = np.einsum("ij,ij->i", work, work) / FRAME_VALUES
+            self.loudness.observe(self.loudness_key, mean_squares.tolist())
+            gain *= self.loudness.gain(self.loudness_key)
+        start = self._gain if self._gain is not None else gain
+        if abs(gain - start) <= GAIN_EPSILON * max(start, GAIN_EPSILON):
+            work *= gain
+        else:
+            # Rampa lineal desde la ganancia anterior a lo largo del lote: sin chasquidos al cambiar el volumen
+            work *= start + (gain - start) * _batch_ramp(count)
+        self._gain = gain
+        if fade_in is not None:
+            work[0] *= fade_in
+            work[0] += mix
+        np.clip(work, -FULL_SCALE, FULL_SCALE - 1, out=work)
+        self._out[:count] = work
+        self.frames += count
+        self.batches += 1
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        self._finish_crossfade() # La fuente anterior la limpia quien la recibió en on_done
+        self.source.cleanup()
+
+    def stats(self) -> dict:
+        return {
+            "volume": self.volume,
+            "gain_db": round(_gain_to_db(self.gain), 1),
+            "frames": self.frames,
+            "frames_per_batch": round(self.frames / self.batches, 2) if self.batches else 0.0,
+            "crossfades": self.crossfades,
+            "fading": self._fade_from is not None,
+        }
@@ -0,0 +1,151 @@
+# --- Modos de reproducción: PCM (codifica discord.py) u Opus (codifica o copia ffmpeg) ---
+# Con "pcm" ffmpeg entrega PCM s16le a 48 kHz (~192 KB/s por stream) y discord.py lo codifica a Opus
+# en el hilo del reproductor, 50 veces por segundo y por servidor. Con "opus" ffmpeg entrega Ogg-Opus
+# (~16 KB/s): si la emisora ya es Opus se copia tal cual, si no se codifica dentro de ffmpeg.
+import time
+
+import discord
+from discord.opus import Encoder as OpusEncoder
+
+PLAYBACK_PCM = "pcm"
+PLAYBACK_OPUS = "opus"
+PLAYBACK_MODES = (PLAYBACK_PCM, PLAYBACK_OPUS)
+
+# Frames de silencio para rellenar cuando el stream se retrasa (20 ms cada uno)
+PCM_SILENCE = b'\x00' * OpusEncoder.FRAME_SIZE
+OPUS_SILENCE = b'\xf8\xff\xfe' # El mismo que envía discord.py al pausar
+# Cabeceras del contenedor Ogg que FFmpegOpusAudio entrega como paquetes pero no son audio
+OGG_OPUS_HEADERS = (b'OpusHead', b'OpusTags')
+
+# Códecs de origen que FFmpegOpusAudio copia sin recodificar (cualquier otro se codifica con libopus)
+OPUS_COPY_CODECS = ("opus", "libopus", "copy")
+
+
+def station_playback_mode(station_data, default: str) -> str:
+    """Modo de reproducción de una emisora de PREDEFINED_STATIONS (clave opcional "playback")."""
+    mode = (station_data or {}).get("playback", default)
+    return mode if mode in PLAYBACK_MODES else default
+
+
+class OpusCodecCache:
+    """Resultados de sondeo del códec por URL, para pagar el sondeo solo la primera vez."""
+
+    def __init__(self, max_entries: int = 512, probe_method: str = "native"):
+        self._codecs = {} # url -> códec de origen ("" si el sondeo no lo pudo determinar)
+        self._max_entries = max_entries
+        self._probe_method = probe_method
+
+    def cached(self, url: str):
+        """Códec de origen de la URL si ya se sondeó, o None."""
+        return self._codecs.get(url) or None
+
+    async def probe(self, url: str):
+        codec = self._codecs.get(url)
+        if codec is not None:
+            return codec or None
+        codec, _ = await discord.FFmpegOpusAudio.probe(url, method=self._probe_method)
+        if len(self._codecs) >= self._max_entries:
+            self._codecs.pop(next(iter(self._codecs))) # Descartar el sondeo más antiguo
+        self._codecs[url] = codec or ""
+        print(f"Códec de {url}: {codec or 'desconocido'} -> {'copia directa' if codec in OPUS_COPY_CODECS else 'codificación Opus en ffmpeg'}")
+        return codec
+
+
+class _PipedInputMixin:
+    # Fuente ffmpeg alimentada por stdin (``pipe=True``): al limpiar se cierra también el stream de
+    # entrada, así el hilo escritor de discord.py no queda bloqueado leyendo de la red.
+    _input_stream = None
+
+    def cleanup(self):
+        if self._input_stream is not None:
+            self._input_stream.close()
+            writer = getattr(self, "_pipe_writer_thread", None)
+            if writer is not None:
+                writer.join(0.5)
+        super().cleanup()
+
+
+class PipedPCMAudio(_PipedInputMixin, discord.FFmpegPCMAudio):
+    pass
+
+
+class PipedOpusAudio(_PipedInputMixin, discord.FFmpegOpusAudio):
+    pass
+
+
+def create_pcm_source(url: str, ffmpeg_options: dict, stream=None):
+    # ``stream``: objeto tipo archivo con el audio (ej. icy_metadata.IcyStreamReader) en vez de la URL
+    if stream is not None:
+        source = PipedPCMAudio(stream, pipe=True, **ffmpeg_options)
+        source._input_stream = stream
+        return source
+    return discord.FFmpegPCMAudio(url, **ffmpeg_options)
+
+
+def create_opus_source(url: str, ffmpeg_options: dict, codec: str = None, bitrate: int = 128, stream=None):
+    # ``codec`` es el códec de origen sondeado: si es Opus, FFmpegOpusAudio copia los paquetes;
+    # con cualquier otro valor (o None) ffmpeg codifica con libopus en frames de 20 ms.
+    options = ffmpeg_options.get("options") or ""
+    if codec not in OPUS_COPY_CODECS:
+        options += " -frame_duration 20"
+    kwargs = dict(codec=codec, bitrate=bitrate, before_options=ffmpeg_options.get("before_options"), options=options)
+    if stream is not None:
+        source = PipedOpusAudio(stream, pipe=True, **kwargs)
+        source._input_stream = stream
+        return source
+    return discord.FFmpegOpusAudio(url, **kwargs)
+
+
+def silence_frame(source) -> bytes:
+    return OPUS_SILENCE if source.is_opus() else PCM_SILENCE
+
+
+class MonitoredSource(discord.AudioSource):
+    """Envuelve una fuente para medir el tiempo hasta el primer frame y el ritmo de entrega.
+
+    Los frames de silencio de relleno (``PCM_SILENCE``/``OPUS_SILENCE``) no cuentan como audio real,
+    así el supervisor puede detectar un stream cortado aunque el reproductor siga recibiendo datos.
+    """
+
+    def __init__(self, source, label: str, on_first_frame=None, on_cleanup=None):
+        self.source = source
+        self.label = label
+        self.started_at = time.monotonic()
+        self.first_frame_at = None
+        self.last_frame_at = None
+        self.frames = 0
+        self.silent_frames = 0
+        self.retired = False
+        self._silence = silence_frame(source)
+        self._on_first_frame = on_first_frame
+        self._on_cleanup = on_cleanup
+
+    @property
+    def _current_error(self):
+        # AudioPlayer lo consulta cuando read() devuelve vacío
+        return getattr(self.source, "_current_error", None)
+
+    def read(self) -> bytes:
+        data = self.source.read()
+        if data is PCM_SILENCE or data is OPUS_SILENCE:
+            self.silent_frames += 1
+        elif data:
+            now = time.monotonic()
+            if self.first_frame_at is None:
+                self.first_frame_at = now
+                if self._on_first_frame:
+                    self._on_first_frame(self, now - self.started_at)
+            self.last_frame_at = now
+            self.frames += 1
+        elif self.retired:
+            # Ya se intercambió por otra fuente: no dejar que el reproductor termine por esta lectura
+            return self._silence
+        return data
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self.source.cleanup()
+        if self._on_cleanup:
+            self._on_cleanup()
@@ -0,0 +1,159 @@
+# --- Costo de CPU de la etapa DSP (audio_dsp.py) frente a la codificación Opus que alimenta ---
+# Uso: python -m benchmarks.dsp_cost [--seconds 20] [--batch 1,5,10] [--output res.json]
+# Todo en un solo hilo y en memoria: frames PCM de 20 ms sintéticos (tonos + ruido, como música
+# comprimida) servidos como vistas ctypes, igual que los entrega el buffer de jitter. Se mide el
+# tiempo por frame de cada variante, el de discord.PCMVolumeTransformer (audioop) como referencia
+# y el de codificar ese mismo frame a Opus, que es lo que el reproductor hace justo después.
+import argparse
+import ctypes
+import itertools
+import json
+import platform
+import resource
+import subprocess
+import time
+
+import discord
+import numpy as np
+from discord.opus import Encoder as OpusEncoder
+
+from audio_dsp import DSPSource, StationLoudness
+from benchmarks.guild_scale import percentiles
+
+
+def synthetic_frames(count: int, amplitude: float, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    t = np.arange(count * OpusEncoder.SAMPLES_PER_FRAME) / OpusEncoder.SAMPLING_RATE
+    signal = sum(np.sin(2 * np.pi * f * t + p) for f, p in ((110, 0), (440, 1), (1320, 2), (3520, 3))) / 4
+    signal = signal * (0.6 + 0.4 * np.sin(2 * np.pi * 0.5 * t)) + rng.normal(0, 0.05, t.size)
+    stereo = np.clip(np.repeat(signal * amplitude * 32767, 2), -32768, 32767).astype(np.int16)
+    memory = bytearray(stereo.tobytes())
+    frame_type = ctypes.c_char * OpusEncoder.FRAME_SIZE
+    return memory, [frame_type.from_buffer(memory, i * OpusEncoder.FRAME_SIZE) for i in range(count)]
+
+
+class LoopSource(discord.AudioSource):
+    """Frames en bucle; ``buffered`` simula un buffer de jitter siempre con margen."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.position = 0
+
+    def read(self):
+        frame = self.frames[self.position % len(self.frames)]
+        self.position += 1
+        return frame
+
+    def buffered(self) -> int:
+        return 15
+
+
+def opus_encode_us(frames, count: int, bitrate: int):
+    """µs por frame de codificar a Opus: con la libopus de discord.py o, si no está cargada, con la de ffmpeg."""
+    if discord.opus.is_loaded() or _try_load_opus():
+        encoder = OpusEncoder()
+        encoder.set_bitrate(bitrate)
+        pcm = itertools.cycle(frames)
+        us, _ = time_per_frame(lambda: encoder.encode(next(pcm), OpusEncoder.SAMPLES_PER_FRAME), count)
+        return us, "discord.opus"
+    # Mismo códec y ajustes, medido como CPU del proceso ffmpeg (incluye leer el PCM por stdin)
+    pcm = b"".join(bytes(f) for f in itertools.islice(itertools.cycle(frames), count))
+    best = None
+    for _ in range(3):
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        subprocess.run(["ffmpeg", "-v", "error", "-f", "s16le", "-ar", "48000", "-ac", "2", "-i", "pipe:0", "-c:a", "libopus",
+                        "-b:a", f"{bitrate}k", "-frame_duration", "20", "-f", "null", "-"], input=pcm, check=True)
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        us = ((after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)) * 1e6 / count
+        best = us if best is None else min(best, us)
+    return round(best, 2), "ffmpeg libopus"
+
+
+def _try_load_opus() -> bool:
+    try:
+        discord.opus._load_default()
+    except Exception:
+        return False
+    return discord.opus.is_loaded()
+
+
+def time_per_frame(read, frames: int, repeats: int = 5):
+    # Mejor de varias pasadas (µs por frame), para no medir interrupciones del sistema
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(frames):
+            read()
+        samples.append((time.perf_counter() - started) * 1e6 / frames)
+    return round(min(samples), 2), samples
+
+
+def run(args) -> dict:
+    _, frames = synthetic_frames(500, amplitude=0.8)
+    _, quiet_frames = synthetic_frames(500, amplitude=0.1, seed=2)
+    count = int(args.seconds * 50)
+    results = {}
+    results["opus_encode_us"], results["opus_encode_method"] = opus_encode_us(frames, count, args.bitrate)
+    transformer = discord.PCMVolumeTransformer(LoopSource([bytes(f) for f in frames]), volume=0.7)
+    results["pcm_volume_transformer_us"], _ = time_per_frame(transformer.read, count)
+
+    variants = []
+    for batch in args.batch:
+        for normalize in (False, True):
+            source = LoopSource(frames)
+            dsp = DSPSource(source, volume=0.7, loudness=StationLoudness() if normalize else None, loudness_key="bench",
+                            batch_frames=batch, buffered=source.buffered)
+            us, samples = time_per_frame(dsp.read, count)
+            variants.append({"stage": "volumen + normalización" if normalize else "volumen", "batch_frames": batch,
+                             "us_per_frame": us, "percent_of_opus_encode": round(us * 100 / results["opus_encode_us"], 1),
+                             "cpu_percent_of_core_per_stream": round(us * 50 / 1e4, 3)})
+
+    # Crossfade: cada frame mezcla dos fuentes (ya procesadas) y no hay lotes
+    crossfade = []
+    for _ in range(5):
+        previous = DSPSource(LoopSource(quiet_frames), volume=0.7, loudness=StationLoudness(), loudness_key="a", batch_frames=1)
+        source = LoopSource(frames)
+        dsp = DSPSource(source, volume=0.7, loudness=StationLoudness(), loudness_key="b", batch_frames=1)
+        dsp.crossfade_from(previous, frames=args.crossfade_frames, preroll_frames=0)
+        started = time.perf_counter()
+        for _ in range(args.crossfade_frames):
+            dsp.read()
+        crossfade.append((time.perf_counter() - started) * 1e6 / args.crossfade_frames)
+    variants.append({"stage": "crossfade (incluye la fuente anterior)", "batch_frames": 1, "us_per_frame": round(min(crossfade), 2),
+                     "percent_of_opus_encode": round(min(crossfade) * 100 / results["opus_encode_us"], 1),
+                     "cpu_percent_of_core_per_stream": round(min(crossfade) * 50 / 1e4, 3)})
+
+    # Latencia de la lectura más lenta por lote: un lote grande concentra el costo en un frame
+    source = LoopSource(frames)
+    dsp = DSPSource(source, loudness=StationLoudness(), loudness_key="jitter", batch_frames=max(args.batch), buffered=source.buffered)
+    reads = []
+    for _ in range(count):
+        started = time.perf_counter()
+        dsp.read()
+        reads.append((time.perf_counter() - started) * 1e6)
+    results["read_latency_us_largest_batch"] = percentiles(reads)
+    results["variants"] = variants
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=20.0, help="Audio simulado por pasada")
+    parser.add_argument("--batch", default="1,5,10", help="Tamaños de lote a medir, separados por comas")
+    parser.add_argument("--bitrate", type=int, default=128, help="kbps del codificador Opus de referencia")
+    parser.add_argument("--crossfade-frames", type=int, default=20)
+    parser.add_argument("--output", help="Archivo JSON de salida (por defecto, stdout)")
+    args = parser.parse_args()
+    args.batch = [int(b) for b in args.batch.split(",")]
+    report = {"benchmark": "dsp_cost", "python": platform.python_version(), "numpy": np.__version__,
+              "config": {k: v for k, v in vars(args).items() if k != "output"}, "results": run(args)}
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
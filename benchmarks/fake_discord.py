@@ -0,0 +1,238 @@
+# --- Servidores, canales y clientes de voz falsos para medir el bot sin conectarse a Discord ---
+# Imitan solo lo que usa main.py. El cliente de voz reproduce como el AudioPlayer de discord.py:
+# un hilo por conexión que llama a source.read() cada 20 ms (y codifica Opus si la fuente es PCM),
+# pero en vez de mandar los paquetes por UDP los descarta.
+import asyncio
+import itertools
+import threading
+import time
+
+import discord.opus
+
+from audio_pipeline import PCM_SILENCE
+
+FRAME_SECONDS = 0.02
+_ids = itertools.count(10_000)
+
+
+def _next_id() -> int:
+    return next(_ids)
+
+
+class FakeUser:
+    def __init__(self, name: str, bot: bool = False):
+        self.id = _next_id()
+        self.name = name
+        self.bot = bot
+        self.voice = None # FakeVoiceState mientras esté en un canal de voz
+        self.mention = f"<@{self.id}>"
+
+
+class FakeVoiceState:
+    def __init__(self, channel):
+        self.channel = channel
+
+
+class FakeMessage:
+    """Mensaje del panel: cuenta las ediciones y simula la latencia de la API."""
+
+    def __init__(self, channel, edit_latency: float = 0.0):
+        self.id = _next_id()
+        self.channel = channel
+        self.edit_latency = edit_latency
+        self.edits = 0
+
+    async def edit(self, **kwargs):
+        if self.edit_latency:
+            await asyncio.sleep(self.edit_latency)
+        self.edits += 1
+
+    async def delete(self):
+        pass
+
+
+class FakeTextChannel:
+    def __init__(self, guild, name: str = "radio"):
+        self.id = _next_id()
+        self.guild = guild
+        self.name = name
+        self.mention = f"<#{self.id}>"
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+        return FakeMessage(self)
+
+    def get_partial_message(self, message_id: int):
+        message = FakeMessage(self)
+        message.id = message_id
+        return message
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild, name: str = "Radio"):
+        self.id = _next_id()
+        self.guild = guild
+        self.name = name
+        self.mention = f"<#{self.id}>"
+        self.members = []
+
+    def join(self, member: FakeUser):
+        self.members.append(member)
+        member.voice = FakeVoiceState(self)
+
+    async def connect(self, **kwargs):
+        self.join(self.guild.me)
+        self.guild.voice_client = FakeVoiceClient(self)
+        return self.guild.voice_client
+
+
+class FakeGuild:
+    def __init__(self, name: str):
+        self.id = _next_id()
+        self.name = name
+        self.me = FakeUser("Rock-Bot", bot=True) # Miembro del bot en este servidor (su estado de voz es propio)
+        self.voice_client = None
+        self.text_channel = FakeTextChannel(self)
+        self.voice_channel = FakeVoiceChannel(self)
+        self._channels = {self.text_channel.id: self.text_channel, self.voice_channel.id: self.voice_channel}
+
+    def get_channel(self, channel_id: int):
+        return self._channels.get(channel_id)
+
+
+class FakeVoiceClient:
+    """Cliente de voz con un hilo reproductor al estilo de ``discord.player.AudioPlayer``."""
+
+    def __init__(self, channel: FakeVoiceChannel):
+        self.channel = channel
+        self.guild = channel.guild
+        self._source = None
+        self._after = None
+        self._thread = None
+        self._connected = True
+        self._playing = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._encoder = None
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        # Frames PCM que llegaron como ``bytes`` nuevos (lo que entrega FFmpegPCMAudio); las vistas de un
+        # buffer reutilizado (buffer de jitter, etapa DSP) y el silencio compartido no cuentan
+        self.pcm_frames_allocated = 0
+        self.pcm_bytes_allocated = 0
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def is_playing(self) -> bool:
+        return self._thread is not None and self._playing.is_set() and not self._stopped.is_set()
+
+    def is_paused(self) -> bool:
+        return False
+
+    @property
+    def source(self):
+        return self._source
+
+    @source.setter
+    def source(self, value):
+        with self._lock:
+            self._source = value
+
+    def play(self, source, *, after=None):
+        self._source = source
+        self._after = after
+        self._stopped.clear()
+        self._playing.set()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"fake-player-{self.guild.id}")
+        self._thread.start()
+
+    def _run(self):
+        error = None
+        loops = 0
+        started = time.perf_counter()
+        try:
+            while not self._stopped.is_set():
+                with self._lock:
+                    source = self._source
+                data = source.read()
+                if not data:
+                    break
+                if not source.is_opus():
+                    if type(data) is bytes and data is not PCM_SILENCE:
+                        self.pcm_frames_allocated += 1
+                        self.pcm_bytes_allocated += len(data)
+                    if self._encoder is None and discord.opus.is_loaded():
+                        self._encoder = discord.opus.Encoder()
+                    if self._encoder is not None:
+                        data = self._encoder.encode(data, self._encoder.SAMPLES_PER_FRAME)
+                self.frames_sent += 1
+                self.bytes_sent += len(data)
+                loops += 1
+                time.sleep(max(0.0, started + FRAME_SECONDS * loops - time.perf_counter()))
+        except Exception as e:
+            error = e
+        finally:
+            self._playing.clear()
+            self._stopped.set()
+            with self._lock:
+                source = self._source
+            if self._after is not None:
+                try:
+                    self._after(error)
+                except Exception as e:
+                    print(f"Error en el after del reproductor falso: {e}")
+            source.cleanup()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(1.0)
+
+    async def move_to(self, channel):
+        self.channel = channel
+
+    async def disconnect(self, **kwargs):
+        self.stop()
+        self._connected = False
+        if self.guild.me in self.channel.members:
+            self.channel.members.remove(self.guild.me)
+        self.guild.me.voice = None
+        self.guild.voice_client = None
+
+
+class _FakeResponse:
+    def __init__(self):
+        self.deferred = False
+
+    async def defer(self, **kwargs):
+        self.deferred = True
+
+    async def send_message(self, *args, **kwargs):
+        pass
+
+    async def send_modal(self, modal):
+        pass
+
+
+class _FakeFollowup:
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class FakeInteraction:
+    """Interacción de un botón o menú del panel.
+
+    No hereda de ``discord.Interaction``: ``_play_station_logic`` la trata como un contexto de comando
+    (``author``/``send``), que cuesta lo mismo que el camino de la interacción.
+    """
+
+    def __init__(self, guild: FakeGuild, user: FakeUser):
+        self.guild = guild
+        self.user = self.author = user
+        self.response = _FakeResponse()
+        self.followup = _FakeFollowup()
+
+    async def send(self, *args, **kwargs):
+        pass
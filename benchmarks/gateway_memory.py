@@ -0,0 +1,173 @@
+# --- Memoria y eventos del gateway por perfil (default vs lowmem) sin conectarse a Discord ---
+# Uso: python -m benchmarks.gateway_memory [--guilds 1000] [--messages-per-guild 20] [--output res.json]
+# Cada perfil se mide en un proceso aparte: se arma el bot con sus intents y cachés, se le pasan
+# GUILD_CREATE sintéticos (canales, roles, emojis, oyentes en voz) y luego la actividad típica de
+# un servidor (mensajes, "escribiendo...", reacciones). Los eventos que los intents del perfil no
+# piden no se entregan, igual que haría Discord. Se reporta RSS y CPU de parseo por fase.
+import argparse
+import asyncio
+import gc
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks.guild_scale import process_rss_kb
+
+BASE_ID = 10 ** 17
+
+
+def _snowflake(n: int) -> str:
+    return str(BASE_ID + n)
+
+
+def _user(n: int, bot: bool = False) -> dict:
+    return {"id": _snowflake(n), "username": f"user{n}", "discriminator": "0", "global_name": f"Usuario {n}", "avatar": None, "bot": bot}
+
+
+def _member(n: int, bot: bool = False) -> dict:
+    return {"user": _user(n, bot), "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0}
+
+
+def guild_payload(index: int, args, bot_user_id: int) -> dict:
+    base = index * 10_000
+    guild_id = _snowflake(base)
+    channels = [{"id": _snowflake(base + 1 + c), "type": 0, "name": f"texto-{c}", "position": c, "permission_overwrites": [],
+                 "guild_id": guild_id, "nsfw": False, "topic": None, "last_message_id": None, "rate_limit_per_user": 0}
+                for c in range(args.text_channels)]
+    voice_id = _snowflake(base + 900)
+    channels.append({"id": voice_id, "type": 2, "name": "Radio", "position": 0, "permission_overwrites": [], "guild_id": guild_id,
+                     "bitrate": 64000, "user_limit": 0, "rtc_region": None})
+    listeners = [base + 1000 + n for n in range(args.voice_listeners)]
+    return {
+        "id": guild_id, "name": f"Servidor {index}", "icon": None, "owner_id": _snowflake(base + 1000),
+        "region": "brazil", "afk_channel_id": None, "afk_timeout": 300, "verification_level": 0,
+        "default_message_notifications": 0, "explicit_content_filter": 0, "mfa_level": 0, "nsfw_level": 0,
+        "premium_tier": 0, "preferred_locale": "es-ES", "features": [], "large": args.member_count > 250,
+        "member_count": args.member_count, "unavailable": False,
+        "roles": [{"id": guild_id, "name": "@everyone", "permissions": "1071698660929", "position": 0, "color": 0,
+                   "hoist": False, "managed": False, "mentionable": False, "flags": 0}]
+                 + [{"id": _snowflake(base + 500 + r), "name": f"rol-{r}", "permissions": "0", "position": r + 1, "color": 0,
+                     "hoist": False, "managed": False, "mentionable": False, "flags": 0} for r in range(args.roles)],
+        "emojis": [{"id": _snowflake(base + 700 + e), "name": f"emoji{e}", "roles": [], "require_colons": True,
+                    "managed": False, "animated": False, "available": True} for e in range(args.emojis)],
+        "stickers": [], "threads": [], "stage_instances": [], "guild_scheduled_events": [],
+        "channels": channels,
+        "members": [_member(bot_user_id - BASE_ID, bot=True)] + [_member(n) for n in listeners],
+        "voice_states": [{"user_id": _snowflake(n), "channel_id": voice_id, "session_id": f"s{n}", "deaf": False, "mute": False,
+                          "self_deaf": False, "self_mute": False, "self_video": False, "suppress": False, "request_to_speak_timestamp": None}
+                         for n in listeners],
+        "presences": [],
+    }
+
+
+def activity_events(index: int, args):
+    """Actividad de un servidor: (evento, intent que Discord exige para mandarlo, función que arma el payload)."""
+    base = index * 10_000
+    guild_id = _snowflake(base)
+    for m in range(args.messages_per_guild):
+        author = base + 2000 + m % 50
+        channel_id = _snowflake(base + 1 + m % args.text_channels)
+        message_id = _snowflake(base + 5000 + m)
+        yield "MESSAGE_CREATE", "guild_messages", lambda: {
+            "id": message_id, "channel_id": channel_id, "guild_id": guild_id, "author": _user(author), "member": _member(author),
+            "content": f"mensaje número {m} con algo de texto para que pese como uno real", "timestamp": "2024-01-01T00:00:00+00:00",
+            "edited_timestamp": None, "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+            "attachments": [], "embeds": [], "pinned": False, "type": 0, "flags": 0,
+        }
+        if m % 2 == 0:
+            yield "TYPING_START", "guild_typing", lambda: {"channel_id": channel_id, "guild_id": guild_id, "user_id": _snowflake(author),
+                                                   "timestamp": 1700000000, "member": _member(author)}
+        if m % 4 == 0:
+            yield "MESSAGE_REACTION_ADD", "guild_reactions", lambda: {"user_id": _snowflake(author), "channel_id": channel_id, "message_id": message_id,
+                                                             "guild_id": guild_id, "emoji": {"id": None, "name": "🔥"}, "member": _member(author), "type": 0}
+
+
+async def measure_profile(args) -> dict:
+    from discord.ext import commands
+    import discord
+    from gateway_profile import gateway_options
+
+    bot = commands.Bot(command_prefix="!!", **gateway_options(args.profile))
+    state = bot._connection
+    await bot._async_setup_hook()
+    bot_user_id = BASE_ID + 1
+    state.user = discord.ClientUser(state=state, data=_user(1, bot=True))
+    intents = bot.intents
+
+    gc.collect()
+    result = {"profile": args.profile, "guilds": args.guilds, "intents": intents.value, "rss_start_kb": process_rss_kb()}
+
+    started, cpu = time.perf_counter(), time.process_time()
+    for index in range(args.guilds):
+        state.parse_guild_create(guild_payload(index + 1, args, bot_user_id))
+        if index % 100 == 0:
+            await asyncio.sleep(0)
+    await asyncio.sleep(0.1)
+    gc.collect()
+    result["guild_create_cpu_ms"] = round((time.process_time() - cpu) * 1000, 1)
+    result["rss_after_guilds_kb"] = process_rss_kb()
+
+    received = dropped = 0
+    cpu = time.process_time()
+    for index in range(args.guilds):
+        for event, intent, build_payload in activity_events(index + 1, args):
+            if not getattr(intents, intent):
+                dropped += 1 # Discord ni siquiera lo manda por el socket
+                continue
+            received += 1
+            state.parsers[event](build_payload())
+        await asyncio.sleep(0) # Deja correr on_message (procesar comandos con prefijo)
+    await asyncio.sleep(0.1)
+    gc.collect()
+    activity_cpu = time.process_time() - cpu
+    result.update({
+        "activity_events_received": received,
+        "activity_events_not_sent": dropped,
+        "activity_cpu_ms": round(activity_cpu * 1000, 1),
+        "activity_cpu_us_per_event": round(activity_cpu * 1e6 / received, 1) if received else 0.0,
+        "rss_after_activity_kb": process_rss_kb(),
+        "cached_messages": len(state._messages) if state._messages is not None else 0,
+        "cached_members": sum(len(guild._members) for guild in state.guilds),
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+    })
+    result["rss_per_1000_guilds_kb"] = round((result["rss_after_activity_kb"] - result["rss_start_kb"]) * 1000 / args.guilds)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profile", help="Medir solo este perfil en este proceso (uso interno)")
+    parser.add_argument("--guilds", type=int, default=1000)
+    parser.add_argument("--text-channels", type=int, default=20)
+    parser.add_argument("--roles", type=int, default=15)
+    parser.add_argument("--emojis", type=int, default=30)
+    parser.add_argument("--voice-listeners", type=int, default=3)
+    parser.add_argument("--member-count", type=int, default=500)
+    parser.add_argument("--messages-per-guild", type=int, default=20)
+    parser.add_argument("--output", help="Archivo JSON de salida (por defecto, stdout)")
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(asyncio.run(measure_profile(args))))
+        return
+
+    from gateway_profile import PROFILES
+    passthrough = [f"--{name.replace('_', '-')}={value}" for name, value in vars(args).items()
+                   if name not in ("profile", "output") and value is not None]
+    results = []
+    for profile in PROFILES:
+        completed = subprocess.run([sys.executable, "-m", "benchmarks.gateway_memory", f"--profile={profile}", *passthrough],
+                                   capture_output=True, text=True, check=True)
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    report = {"benchmark": "gateway_memory", "config": {k: v for k, v in vars(args).items() if k not in ("profile", "output")}, "results": results}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
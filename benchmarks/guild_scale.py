@@ -0,0 +1,326 @@
+# --- Escala por número de servidores: el bot completo con Discord simulado y radios locales ---
+# Uso: python -m benchmarks.guild_scale [--guilds 1,10,100,1000] [--stations 4] [--seconds 10]
+#      [--mode broadcast|per-guild] [--icy] [--stall 3] [--output resultados.json]
+# Cada servidor falso se conecta con el botón del panel, sintoniza una emisora con el menú,
+# escucha un rato, cambia de emisora y pasa de página en el catálogo. Se mide el tiempo hasta el
+# primer frame, la latencia del cambio de emisora, CPU/RSS por ffmpeg y del proceso Python, las
+# asignaciones por segundo en el camino del audio y del recolector de basura, y las ediciones del
+# panel por acción.
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fake_discord import FakeGuild, FakeInteraction, FakeUser
+from benchmarks.stream_server import LoopingStreamServer, generate_test_audio
+
+
+def percentiles(values) -> dict:
+    if not values:
+        return {"n": 0, "p50": None, "p95": None, "max": None}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"n": len(values), "p50": round(pick(0.5), 1), "p95": round(pick(0.95), 1), "max": round(values[-1], 1)}
+
+
+def process_rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class _AllocationProbe:
+    """Asignaciones de Python por segundo en el régimen estable.
+
+    CPython no cuenta asignaciones totales, así que se miden las dos que importan aquí, por separado:
+
+    - ``pcm_frames_allocated_per_second``: frames PCM que los reproductores recibieron como ``bytes``
+      nuevos (3840 B cada uno, 50 por segundo y servidor sin buffer de jitter); es la asignación por
+      frame que evitan los buffers reservados al inicio.
+    - ``gc_gen0_collections_per_second``: pasadas de la generación 0 del recolector, que se disparan
+      cada ~700 objetos contenedor (listas, dicts, instancias) creados y aún vivos; mide la presión
+      sobre el GC.
+
+    ``python_small_blocks_net_growth_per_second`` es el crecimiento *neto* de bloques de pymalloc
+    (objetos de hasta 512 B): ~0 en régimen estable, sirve para detectar fugas, no para medir
+    cuánto se asigna. Con ``tracemalloc`` además se registran el pico y los sitios que más memoria
+    retienen, a costa de frenar el proceso.
+    """
+
+    def __init__(self, use_tracemalloc: bool):
+        self.use_tracemalloc = use_tracemalloc
+        self._guilds = []
+        self._blocks = 0
+        self._gen0 = 0
+        self._frames = (0, 0)
+        self._started = 0.0
+
+    @staticmethod
+    def _pcm_allocations(guilds):
+        clients = [guild.voice_client for guild in guilds if guild.voice_client is not None]
+        return sum(c.pcm_frames_allocated for c in clients), sum(c.pcm_bytes_allocated for c in clients)
+
+    def start(self, guilds):
+        if self.use_tracemalloc:
+            tracemalloc.start(1)
+        self._guilds = guilds
+        self._frames = self._pcm_allocations(guilds)
+        self._gen0 = gc.get_stats()[0]["collections"]
+        self._blocks = sys.getallocatedblocks()
+        self._started = time.perf_counter()
+
+    def stop(self) -> dict:
+        elapsed = time.perf_counter() - self._started
+        blocks = sys.getallocatedblocks()
+        gen0 = gc.get_stats()[0]["collections"]
+        frames, frame_bytes = self._pcm_allocations(self._guilds)
+        result = {
+            "pcm_frames_allocated_per_second": round((frames - self._frames[0]) / elapsed, 1),
+            "pcm_frame_kb_allocated_per_second": round((frame_bytes - self._frames[1]) / 1024 / elapsed, 1),
+            "gc_gen0_collections_per_second": round((gen0 - self._gen0) / elapsed, 2),
+            "python_small_blocks_net_growth_per_second": round((blocks - self._blocks) / elapsed, 1),
+        }
+        if self.use_tracemalloc:
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            result["tracemalloc_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+            result["top_allocations"] = [
+                {"site": f"{stat.traceback[0].filename.rsplit(os.sep, 1)[-1]}:{stat.traceback[0].lineno}",
+                 "kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:5]
+            ]
+            tracemalloc.stop()
+        return result
+
+
+class GuildScaleBenchmark:
+    def __init__(self, bot_main, station_keys, servers, args):
+        self.bot_main = bot_main
+        self.station_keys = station_keys
+        self.servers = servers
+        self.args = args
+
+    async def _wait_first_frames(self, guilds, started: dict, previous: dict) -> list:
+        # Tiempo desde la acción hasta que la nueva fuente entrega su primer frame real
+        deadline = time.monotonic() + self.args.first_frame_timeout
+        latencies = {}
+        while len(latencies) < len(guilds) and time.monotonic() < deadline:
+            for guild in guilds:
+                if guild.id in latencies or guild.voice_client is None:
+                    continue
+                source = self.bot_main._playing_source(guild.voice_client) # Debajo de la etapa DSP, si está activa
+                if source is not None and source is not previous.get(guild.id) and getattr(source, "first_frame_at", None):
+                    latencies[guild.id] = (source.first_frame_at - started[guild.id]) * 1000
+            await asyncio.sleep(0.02)
+        return list(latencies.values())
+
+    async def _action(self, guilds, action) -> dict:
+        # Ejecuta la acción en todos los servidores a la vez y cuenta las ediciones de panel que provoca
+        edits_before = sum(self._panel(guild).edits for guild in guilds)
+        started = {}
+        previous = {guild.id: self.bot_main._playing_source(guild.voice_client) for guild in guilds}
+
+        async def run(guild):
+            started[guild.id] = time.monotonic()
+            await action(guild)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(run(guild) for guild in guilds))
+        handler_ms = (time.perf_counter() - t0) * 1000
+        return {"started": started, "previous": previous, "edits_before": edits_before, "handler_ms": round(handler_ms, 1)}
+
+    async def _settle_edits(self, guilds, action_state: dict) -> float:
+        await asyncio.sleep(self.bot_main.PANEL_UPDATE_WINDOW + 0.25) # Dejar que salgan las ediciones agrupadas
+        edits = sum(self._panel(guild).edits for guild in guilds) - action_state["edits_before"]
+        return round(edits / len(guilds), 2)
+
+    def _panel(self, guild):
+        return self.bot_main.get_radio_session(guild).panel_message
+
+    async def run_scale(self, count: int) -> dict:
+        bot_main = self.bot_main
+        guilds = []
+        for index in range(count):
+            guild = FakeGuild(f"bench-{count}-{index}")
+            listener = FakeUser(f"oyente-{index}")
+            guild.voice_channel.join(listener)
+            guild.listener = listener
+            guild.bench_index = index
+            bot_main.bot._connection._guilds[guild.id] = guild
+            session = bot_main.get_radio_session(guild)
+            session.set_panel_message(await guild.text_channel.send())
+            guilds.append(guild)
+
+        result = {"guilds": count}
+        join = await self._action(guilds, lambda guild: bot_main.JoinVoiceButton().callback(FakeInteraction(guild, guild.listener)))
+        result["join_handler_ms"] = join["handler_ms"]
+        result["panel_edits_per_join"] = await self._settle_edits(guilds, join)
+
+        def select(offset):
+            async def action(guild):
+                select = bot_main.StationSelect([bot_main.discord.SelectOption(label="bench", value="bench")], "bench")
+                select._values = [self.station_keys[(guild.bench_index + offset) % len(self.station_keys)]]
+                await select.callback(FakeInteraction(guild, guild.listener))
+            return action
+
+        play = await self._action(guilds, select(0))
+        result["play_handler_ms"] = play["handler_ms"]
+        result["time_to_first_frame_ms"] = percentiles(await self._wait_first_frames(guilds, play["started"], play["previous"]))
+        result["panel_edits_per_play"] = await self._settle_edits(guilds, play)
+
+        # Régimen estable: CPU, memoria y asignaciones mientras todos escuchan
+        probe = _AllocationProbe(self.args.tracemalloc)
+        probe.start(guilds)
+        cpu_before, steady_started = time.process_time(), time.perf_counter()
+        supervisor_before = bot_main.stream_supervisor.stalls_detected
+        if self.args.stall:
+            self.servers[0].stall(self.args.stall)
+        await asyncio.sleep(self.args.seconds)
+        elapsed = time.perf_counter() - steady_started
+        python_cpu = time.process_time() - cpu_before
+        memory = probe.stop()
+        ffmpeg = bot_main.ffmpeg_processes.stats()
+        active = max(1, ffmpeg["active"])
+        result["steady"] = {
+            "seconds": round(elapsed, 2),
+            "python_cpu_percent": round(100 * python_cpu / elapsed, 1),
+            "python_rss_kb": process_rss_kb(),
+            "threads": len(sys._current_frames()),
+            "ffmpeg_processes": ffmpeg["active"],
+            "ffmpeg_rejected": ffmpeg["rejected"],
+            "ffmpeg_cpu_percent_per_stream": round(ffmpeg["cpu_percent"] / active, 2),
+            "ffmpeg_rss_kb_per_stream": ffmpeg["rss_kb"] // active,
+            "stalls_detected": bot_main.stream_supervisor.stalls_detected - supervisor_before,
+            **memory,
+        }
+        render_started = time.perf_counter()
+        exposition = bot_main.metrics.render() # Lo que cuesta una consulta a /metrics con todos sonando
+        result["steady"]["metrics_scrape_ms"] = round((time.perf_counter() - render_started) * 1000, 2)
+        result["steady"]["metrics_lines"] = exposition.count("\n")
+        if self.args.stall:
+            recoveries = bot_main.stream_supervisor.recovery_seconds
+            result["steady"]["recovery_seconds_last"] = round(recoveries[-1], 2) if recoveries else None
+
+        switch = await self._action(guilds, select(1))
+        result["switch_handler_ms"] = switch["handler_ms"]
+        result["station_switch_ms"] = percentiles(await self._wait_first_frames(guilds, switch["started"], switch["previous"]))
+        result["panel_edits_per_switch"] = await self._settle_edits(guilds, switch)
+
+        page = await self._action(guilds, lambda guild: bot_main.CatalogPageButton(1).callback(FakeInteraction(guild, guild.listener)))
+        result["page_handler_ms"] = page["handler_ms"]
+        result["panel_edits_per_page"] = await self._settle_edits(guilds, page)
+
+        result["now_playing"] = bot_main.now_playing.stats()
+        result["panel_updates"] = bot_main.panel_updates.stats()
+
+        await asyncio.gather(*(bot_main.StopAndLeaveButton().callback(FakeInteraction(guild, guild.listener)) for guild in guilds))
+        await asyncio.sleep(1.0) # Los ffmpeg retirados terminan y liberan su cupo
+        for guild in guilds:
+            bot_main.radio_sessions.discard(guild.id)
+            bot_main.bot._connection._guilds.pop(guild.id, None)
+        return result
+
+
+def _configure_environment(args, catalog_path: str, state_path: str):
+    # main.py lee su configuración al importarse: hay que fijarla antes
+    os.environ["RADIO_CATALOG_PATH"] = catalog_path
+    os.environ["RADIO_STATE_DB"] = state_path
+    os.environ["RADIO_BROADCAST_MODE"] = "1" if args.mode == "broadcast" else "0"
+    os.environ["RADIO_ICY_METADATA"] = "1" if args.icy else "0"
+    os.environ.setdefault("RADIO_NOW_PLAYING_INTERVAL", "1")
+
+
+async def _run(args, servers, station_keys) -> list:
+    import main as bot_main
+
+    bot = bot_main.bot
+    await bot._async_setup_hook()
+    bot._connection.user = FakeUser("Rock-Bot", bot=True)
+    bot_main.ffmpeg_processes.start()
+    bot_main.now_playing.start(bot.loop)
+    bot_main.stream_supervisor.start()
+    await bot_main.guild_states.load()
+    await bot_main.station_catalog.ensure_loaded()
+
+    benchmark = GuildScaleBenchmark(bot_main, station_keys, servers, args)
+    results = []
+    for count in args.guilds:
+        print(f"Midiendo {count} servidor(es)...", file=sys.stderr)
+        results.append(await benchmark.run_scale(count))
+    await bot_main.guild_states.flush()
+    await bot_main.stream_resolver.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--guilds", default="1,10,100,1000", help="Cantidades de servidores simulados, separadas por comas")
+    parser.add_argument("--stations", type=int, default=4, help="Emisoras locales distintas entre las que se reparten los servidores")
+    parser.add_argument("--file", help="Archivo de audio a emitir en bucle (por defecto, tonos generados con ffmpeg)")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duración del régimen estable")
+    parser.add_argument("--mode", choices=("broadcast", "per-guild"), default="broadcast",
+                        help="broadcast: un ffmpeg por emisora; per-guild: un ffmpeg por servidor")
+    parser.add_argument("--icy", action="store_true", help="Emisoras con metadatos ICY (títulos que rotan)")
+    parser.add_argument("--stall", type=float, default=0.0, help="Segundos de corte inyectado en la primera emisora")
+    parser.add_argument("--tracemalloc", action="store_true", help="Registrar pico y sitios de asignación (más lento)")
+    parser.add_argument("--first-frame-timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="Archivo JSON de salida (por defecto, stdout)")
+    args = parser.parse_args()
+    args.guilds = [int(value) for value in args.guilds.split(",") if value.strip()]
+
+    workdir = tempfile.mkdtemp(prefix="rockbot_bench_")
+    audio = args.file or generate_test_audio(os.path.join(workdir, "tone.mp3"))
+    servers = [
+        LoopingStreamServer(audio, icy_metaint=16000 if args.icy else 0, titles=[f"Artista {n} - Tema {i}" for i in range(5)],
+                            title_interval=2.0, icy_name=f"Bench {n}").start()
+        for n in range(args.stations)
+    ]
+    station_keys = [f"bench-{n}" for n in range(args.stations)]
+    catalog_path = os.path.join(workdir, "catalog.jsonl")
+    with open(catalog_path, "w") as f:
+        for key, server in zip(station_keys, servers):
+            f.write(json.dumps({"key": key, "name": f"Bench {key}", "url": server.url, "genre": "test", "country": "CL"}) + "\n")
+    _configure_environment(args, catalog_path, os.path.join(workdir, "state.sqlite3"))
+
+    try:
+        with contextlib.redirect_stdout(sys.stderr): # Los print() del bot no ensucian el JSON
+            results = asyncio.run(_run(args, servers, station_keys))
+    finally:
+        for server in servers:
+            server.stop()
+    report = {
+        "benchmark": "guild_scale",
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"mode": args.mode, "stations": args.stations, "seconds": args.seconds, "icy": args.icy, "stall": args.stall,
+                   "tracemalloc": args.tracemalloc},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
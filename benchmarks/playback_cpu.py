@@ -0,0 +1,146 @@
+# --- CPU por stream: modo PCM (codifica discord.py) vs modo Opus (codifica/copia ffmpeg) ---
+# Uso: python -m benchmarks.playback_cpu [--url URL | --file audio.mp3] [--seconds 20]
+# Lee los frames al ritmo del reproductor de discord.py (20 ms) y mide la CPU de ffmpeg
+# (/proc/<pid>/stat) y la del hilo de Python (lectura + codificación Opus si aplica).
+# Sin --url se miden tres casos contra servidores locales: PCM y Opus con una emisora MP3, y Opus
+# con una emisora que ya es Ogg-Opus (copia directa).
+import argparse
+import json
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+import discord.opus
+
+from audio_pipeline import PLAYBACK_OPUS, PLAYBACK_PCM, create_opus_source, create_pcm_source
+from benchmarks.stream_server import LoopingStreamServer, generate_test_audio
+
+FFMPEG_OPTIONS = {'before_options': '-nostdin', 'options': '-vn'}
+FRAME_SECONDS = 0.02
+OPUS_BITRATE = 128
+TEST_AUDIO_SECONDS = 30
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """utime + stime de un proceso según /proc (solo Linux)."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _load_opus() -> bool:
+    if not discord.opus.is_loaded():
+        try:
+            discord.opus._load_default()
+        except Exception:
+            return False
+    return discord.opus.is_loaded()
+
+
+def ffmpeg_opus_encode_seconds(pcm: bytes) -> float:
+    """CPU de codificar ``pcm`` con la libopus de ffmpeg, con los ajustes de ``discord.opus.Encoder``.
+
+    Sustituye a la codificación de discord.py cuando su libopus no está cargada (FEC y 15 % de pérdida
+    esperada, como el codificador del reproductor); incluye leer el PCM por stdin, así que sobrestima un poco.
+    """
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "s16le", "-ar", "48000", "-ac", "2", "-i", "pipe:0", "-c:a", "libopus",
+                    "-b:a", f"{OPUS_BITRATE}k", "-fec", "true", "-packet_loss", "15", "-frame_duration", "20", "-f", "null", "-"], input=pcm, check=True)
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+
+
+def measure(mode: str, url: str, seconds: float, codec: str = None) -> dict:
+    encoder = None
+    pcm_frames = None
+    if mode == PLAYBACK_PCM:
+        if _load_opus():
+            encoder = discord.opus.Encoder()
+            encoder.set_bitrate(OPUS_BITRATE)
+        else:
+            pcm_frames = [] # Se codifican después con ffmpeg, fuera de la medición del hilo
+    if mode == PLAYBACK_OPUS:
+        source = create_opus_source(url, FFMPEG_OPTIONS, codec=codec, bitrate=OPUS_BITRATE)
+    else:
+        source = create_pcm_source(url, FFMPEG_OPTIONS)
+    pid = source._process.pid
+    frames = bytes_read = 0
+    started = time.perf_counter()
+    thread_cpu = time.thread_time()
+    try:
+        while time.perf_counter() - started < seconds:
+            data = source.read()
+            if not data:
+                break
+            frames += 1
+            bytes_read += len(data)
+            if encoder is not None:
+                encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+            elif pcm_frames is not None:
+                pcm_frames.append(data)
+            next_time = started + FRAME_SECONDS * frames
+            time.sleep(max(0.0, next_time - time.perf_counter()))
+        elapsed = time.perf_counter() - started
+        python_cpu = time.thread_time() - thread_cpu
+        ffmpeg_cpu = process_cpu_seconds(pid)
+    finally:
+        source.cleanup()
+    encode_cpu = None
+    encode_by = None
+    if encoder is not None:
+        encode_by = "discord.opus (incluido en el hilo de Python)"
+    elif pcm_frames:
+        encode_cpu = ffmpeg_opus_encode_seconds(b"".join(pcm_frames))
+        encode_by = "ffmpeg libopus (discord.py sin libopus)"
+    elif mode == PLAYBACK_OPUS:
+        encode_by = "copia directa" if codec == "opus" else "ffmpeg libopus (incluido en ffmpeg)"
+    total_cpu = ffmpeg_cpu + python_cpu + (encode_cpu or 0.0)
+    return {
+        "mode": mode,
+        "source_codec": codec or "mp3",
+        "frames": frames,
+        "seconds": round(elapsed, 3),
+        "pipe_kbytes_per_second": round(bytes_read / elapsed / 1000, 1),
+        "ffmpeg_cpu_percent": round(100 * ffmpeg_cpu / elapsed, 2),
+        "python_cpu_percent": round(100 * python_cpu / elapsed, 2),
+        "opus_encode_cpu_percent": round(100 * encode_cpu / elapsed, 2) if encode_cpu is not None else None,
+        "opus_encode": encode_by,
+        "total_cpu_percent": round(100 * total_cpu / elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="Stream a medir (por defecto, servidores locales con audio generado)")
+    parser.add_argument("--file", help="Archivo MP3 a emitir en bucle por el servidor local")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    args = parser.parse_args()
+
+    if args.url:
+        results = [measure(mode, args.url, args.seconds) for mode in (PLAYBACK_PCM, PLAYBACK_OPUS)]
+        print(json.dumps(results, indent=2))
+        return
+
+    tmp = tempfile.gettempdir()
+    mp3_path = args.file or generate_test_audio(os.path.join(tmp, "rockbot_bench.mp3"))
+    opus_path = generate_test_audio(os.path.join(tmp, "rockbot_bench.opus"), seconds=TEST_AUDIO_SECONDS, codec="libopus")
+    mp3_server = LoopingStreamServer(mp3_path).start()
+    # El Ogg-Opus es VBR y con cabeceras de página: emitirlo a su tasa real para no provocar cortes
+    opus_kbps = -(-os.path.getsize(opus_path) * 8 // (TEST_AUDIO_SECONDS * 1000)) + 8
+    opus_server = LoopingStreamServer(opus_path, bitrate_kbps=opus_kbps, content_type="audio/ogg").start()
+    try:
+        results = [
+            measure(PLAYBACK_PCM, mp3_server.url, args.seconds),
+            measure(PLAYBACK_OPUS, mp3_server.url, args.seconds, codec="mp3"),
+            measure(PLAYBACK_OPUS, opus_server.url, args.seconds, codec="opus"),
+        ]
+    finally:
+        mp3_server.stop()
+        opus_server.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# --- Servidor HTTP local que emite un archivo de audio en bucle como si fuera una radio ---
+# Sirve para medir sin depender de internet ni de las emisoras reales.
+import http.server
+import socketserver
+import threading
+import time
+
+
+class _LoopingStreamHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"
+
+    def do_GET(self):
+        server = self.server
+        server.connections += 1
+        metaint = server.icy_metaint if self.headers.get("Icy-MetaData") == "1" else 0
+        if server.icy_status_line:
+            # Respuesta estilo SHOUTcast v1 ("ICY 200 OK") en vez de HTTP
+            self.wfile.write(b"ICY 200 OK\r\n")
+        else:
+            self.send_response_only(200)
+        self.send_header("Content-Type", server.content_type)
+        self.send_header("Cache-Control", "no-cache")
+        if server.icy_name:
+            self.send_header("icy-name", server.icy_name)
+        if metaint:
+            self.send_header("icy-metaint", str(metaint))
+        self.end_headers()
+        data = server.audio_data
+        chunk = max(1, server.bytes_per_second // 10)
+        pos = 0
+        writer = _IcyWriter(self.wfile, metaint, server)
+        try:
+            # Ráfaga inicial como la de un servidor Icecast real, luego a ritmo de tiempo real
+            burst = min(len(data), server.bytes_per_second * server.burst_seconds)
+            writer.write(data[:burst])
+            pos = burst
+            while not server.closing:
+                if time.monotonic() < server.stalled_until:
+                    time.sleep(0.05) # Corte simulado: la conexión sigue abierta pero no llega audio
+                    continue
+                if pos >= len(data):
+                    pos = 0
+                piece = data[pos:pos + chunk]
+                writer.write(piece)
+                pos += len(piece)
+                time.sleep(len(piece) / server.bytes_per_second)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _IcyWriter:
+    """Intercala un bloque de metadatos ICY cada ``metaint`` bytes de audio (si ``metaint`` > 0)."""
+
+    def __init__(self, wfile, metaint: int, server):
+        self.wfile = wfile
+        self.metaint = metaint
+        self.server = server
+        self.until_metadata = metaint
+        self.last_title = None
+
+    def write(self, data: bytes):
+        if not self.metaint:
+            self.wfile.write(data)
+            return
+        while data:
+            piece = data[:self.until_metadata]
+            self.wfile.write(piece)
+            data = data[len(piece):]
+            self.until_metadata -= len(piece)
+            if self.until_metadata == 0:
+                self.wfile.write(self._metadata_block())
+                self.until_metadata = self.metaint
+
+    def _metadata_block(self) -> bytes:
+        title = self.server.current_title()
+        if title == self.last_title:
+            return b"\x00" # Sin cambios
+        self.last_title = title
+        payload = f"StreamTitle='{title}';".encode("utf-8")
+        blocks = -(-len(payload) // 16)
+        return bytes([blocks]) + payload.ljust(blocks * 16, b"\x00")
+
+
+class LoopingStreamServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Emite ``audio_path`` en bucle a ``bitrate_kbps`` en http://127.0.0.1:<puerto>/stream.
+
+    Con ``icy_metaint`` > 0 se comporta como un servidor Shoutcast/Icecast: a los clientes que envían
+    ``Icy-MetaData: 1`` les intercala ``StreamTitle`` rotando entre ``titles`` cada ``title_interval`` s.
+    :meth:`stall` simula un corte: las conexiones siguen abiertas pero dejan de recibir datos.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, audio_path: str, bitrate_kbps: int = 128, content_type: str = "audio/mpeg", port: int = 0, burst_seconds: int = 2,
+                 icy_metaint: int = 0, titles=(), title_interval: float = 10.0, icy_name: str = None, icy_status_line: bool = False):
+        with open(audio_path, "rb") as f:
+            self.audio_data = f.read()
+        self.bytes_per_second = bitrate_kbps * 1000 // 8
+        self.content_type = content_type
+        self.burst_seconds = burst_seconds
+        self.icy_metaint = icy_metaint
+        self.titles = list(titles)
+        self.title_interval = title_interval
+        self.icy_name = icy_name
+        self.icy_status_line = icy_status_line
+        self.started_at = time.monotonic()
+        self.connections = 0
+        self.stalled_until = 0.0
+        self.closing = False
+        super().__init__(("127.0.0.1", port), _LoopingStreamHandler)
+        self._thread = None
+
+    def current_title(self) -> str:
+        if not self.titles:
+            return ""
+        return self.titles[int((time.monotonic() - self.started_at) // self.title_interval) % len(self.titles)]
+
+    def stall(self, seconds: float):
+        self.stalled_until = time.monotonic() + seconds
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/stream"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True, name="looping-stream-server")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.closing = True
+        self.shutdown()
+        self.server_close()
+
+
+def generate_test_audio(path: str, seconds: int = 30, bitrate_kbps: int = 128, executable: str = "ffmpeg", codec: str = "libmp3lame") -> str:
+    """Genera un archivo estéreo de prueba (tonos) con ffmpeg, para no versionar archivos de audio.
+
+    Por defecto MP3; con ``codec="libopus"`` un Ogg-Opus a 48 kHz (emisora que se copia sin recodificar).
+    """
+    import subprocess
+    rate = "48000" if codec == "libopus" else "44100"
+    subprocess.run(
+        [executable, "-hide_banner", "-loglevel", "error", "-y",
+         "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+         "-f", "lavfi", "-i", f"sine=frequency=660:duration={seconds}",
+         "-filter_complex", "amerge=inputs=2", "-ar", rate,
+         "-c:a", codec, "-b:a", f"{bitrate_kbps}k", path],
+        check=True
+    )
+    return path
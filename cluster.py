@@ -0,0 +1,244 @@
+# --- Lanzador del clúster: varios procesos del bot, cada uno con su rango de shards ---
+# Uso:
+#   python cluster.py [--workers 4] [--shards 8]        Arranca el clúster (Ctrl+C lo detiene)
+#   python cluster.py estado                            Estadísticas agregadas de todos los workers
+#   python cluster.py panelradio GUILD_ID [--canal ID]  Reenvía el panel desde el worker que atiende ese servidor
+#
+# Cada worker es un main.py normal con RADIO_SHARD_COUNT/RADIO_SHARD_IDS en el entorno (AutoShardedBot),
+# así el audio (ffmpeg, Opus, el hilo del reproductor de cada conexión) se reparte entre núcleos en vez
+# de competir por un solo GIL. Si un worker se cae o se cuelga, se reinicia solo ese con espera
+# exponencial; los shards de los demás siguen conectados.
+import argparse
+import asyncio
+import codecs
+import json
+import os
+import signal
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from cluster_ipc import ClusterHub, control_request, format_shard_ids, parse_address
+from stream_supervisor import BackoffPolicy
+
+load_dotenv()
+TOKEN = os.getenv('BOT_TOKEN')
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+# --- Configuración del clúster ---
+CLUSTER_WORKERS = int(os.getenv('RADIO_CLUSTER_WORKERS', '0')) # 0 = uno por núcleo (limitado por la cantidad de shards)
+SHARD_COUNT = int(os.getenv('RADIO_SHARD_COUNT', '0')) # 0 = lo que recomiende Discord
+CLUSTER_IPC = os.getenv('RADIO_CLUSTER_IPC', '127.0.0.1:8790') # Canal local entre el lanzador y los workers
+# Segundos sin estadísticas de un worker ya conectado antes de darlo por colgado y reiniciarlo (0 = no vigilar)
+HEARTBEAT_TIMEOUT = float(os.getenv('RADIO_CLUSTER_HEARTBEAT_TIMEOUT', '90'))
+RESTART_BACKOFF_BASE = float(os.getenv('RADIO_CLUSTER_BACKOFF_BASE', '2'))
+RESTART_BACKOFF_CAP = float(os.getenv('RADIO_CLUSTER_BACKOFF_CAP', '120'))
+HEALTHY_AFTER = 300.0 # Un worker que aguantó esto arriba vuelve a empezar la espera desde cero
+STOP_TIMEOUT = 20.0 # Margen para que cada worker cierre sus conexiones de voz y guarde el estado
+
+
+async def fetch_gateway_info(token: str):
+    """``(shards recomendados, max_concurrency)`` según ``GET /gateway/bot``."""
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        async with session.get("https://discord.com/api/v10/gateway/bot", headers={"Authorization": f"Bot {token}"}) as response:
+            response.raise_for_status()
+            data = await response.json()
+    limits = data.get("session_start_limit", {})
+    print(f"[clúster] Discord recomienda {data['shards']} shard(s); inicios de sesión restantes hoy: {limits.get('remaining', '?')}.")
+    return int(data["shards"]), int(limits.get("max_concurrency", 1))
+
+
+def split_shards(shard_count: int, workers: int):
+    """Reparte los shards en ``workers`` rangos contiguos de tamaño parejo."""
+    workers = max(1, min(workers, shard_count))
+    size, extra = divmod(shard_count, workers)
+    ranges, start = [], 0
+    for index in range(workers):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+class WorkerProcess:
+    """Un main.py con su rango de shards; se reinicia si termina sin que se haya pedido detener el clúster."""
+
+    def __init__(self, cluster_id: int, shard_ids, env: dict, hub: ClusterHub, backoff: BackoffPolicy):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.env = env
+        self.hub = hub
+        self.backoff = backoff
+        self.process = None
+        self.restarts = 0
+
+    async def run(self, stopping: asyncio.Event):
+        attempt = 0
+        while not stopping.is_set():
+            started = time.monotonic()
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, "-u", MAIN_PATH, env=self.env,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                start_new_session=True, # El Ctrl+C de la terminal lo recibe el lanzador y él detiene a cada worker
+            )
+            print(f"[clúster] Worker {self.cluster_id} iniciado (pid {self.process.pid}, shards {format_shard_ids(self.shard_ids)}).")
+            output = asyncio.create_task(self._forward_output(self.process.stdout))
+            watchdog = asyncio.create_task(self._watch_heartbeat())
+            code = await self.process.wait()
+            watchdog.cancel()
+            await output
+            if stopping.is_set():
+                break
+            if time.monotonic() - started > HEALTHY_AFTER:
+                attempt = 0
+            delay = self.backoff.delay(attempt)
+            attempt += 1
+            self.restarts += 1
+            print(f"[clúster] Worker {self.cluster_id} terminó (código {code}); se reinicia en {delay:.1f} s.")
+            try:
+                await asyncio.wait_for(stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        if self.process is None or self.process.returncode is not None:
+            return
+        # SIGINT: discord.py cierra el bot ordenadamente y main.py escribe el último lote de estado
+        self.process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(self.process.wait(), STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"[clúster] Worker {self.cluster_id} no se detuvo a tiempo; se mata.")
+            self.process.kill()
+            await self.process.wait()
+
+    async def _forward_output(self, stream: asyncio.StreamReader):
+        prefix = f"[w{self.cluster_id}] "
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace") # Un carácter puede quedar entre dos pedazos
+        line_start = True
+        while True:
+            try:
+                data = await stream.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                data = e.partial # Terminó la salida (la última línea puede no tener salto)
+                if not data:
+                    return
+            except asyncio.LimitOverrunError as e:
+                # Línea más larga que el buffer del StreamReader (64 KiB): queda en el buffer y se reenvía
+                # por pedazos; readline() la descartaría con ValueError y cortaría run() sin reinicio
+                data = await stream.read(e.consumed)
+            text = decoder.decode(data)
+            sys.stdout.write(prefix + text if line_start else text)
+            sys.stdout.flush()
+            line_start = data.endswith(b"\n")
+
+    async def _watch_heartbeat(self):
+        # Un event loop bloqueado deja de mandar estadísticas aunque el proceso siga vivo
+        if HEARTBEAT_TIMEOUT <= 0:
+            return
+        while True:
+            await asyncio.sleep(HEARTBEAT_TIMEOUT / 3)
+            age = self.hub.heartbeat_age(self.cluster_id)
+            if age is not None and age > HEARTBEAT_TIMEOUT and self.process.returncode is None:
+                print(f"[clúster] Worker {self.cluster_id} sin señales hace {age:.0f} s; se reinicia.")
+                self.process.kill()
+                return
+
+
+async def run_cluster(args):
+    shard_count, identify_concurrency = args.shards, 1
+    if TOKEN:
+        try:
+            recommended, identify_concurrency = await fetch_gateway_info(TOKEN)
+            shard_count = shard_count or recommended
+        except Exception as e:
+            print(f"[clúster] No se pudo consultar /gateway/bot: {e}")
+    if not shard_count:
+        shard_count = args.workers or os.cpu_count() or 1
+        print(f"[clúster] Sin cantidad de shards; se usan {shard_count}.")
+    workers = args.workers or os.cpu_count() or 1
+    host, port = parse_address(CLUSTER_IPC)
+    hub = ClusterHub(shard_count, host=host, port=port, identify_concurrency=identify_concurrency)
+    await hub.start()
+    print(f"[clúster] Canal IPC en {hub.address}; {shard_count} shard(s) en {min(workers, shard_count)} worker(s).")
+
+    metrics_base = int(os.getenv('RADIO_METRICS_PORT', '0'))
+    backoff = BackoffPolicy(base=RESTART_BACKOFF_BASE, cap=RESTART_BACKOFF_CAP)
+    processes = []
+    for cluster_id, shard_ids in enumerate(split_shards(shard_count, workers)):
+        env = dict(os.environ,
+                   RADIO_SHARD_COUNT=str(shard_count), RADIO_SHARD_IDS=format_shard_ids(shard_ids),
+                   RADIO_CLUSTER_ID=str(cluster_id), RADIO_CLUSTER_IPC=hub.address)
+        if metrics_base:
+            env["RADIO_METRICS_PORT"] = str(metrics_base + cluster_id) # Un endpoint por worker
+        if cluster_id:
+            env["RADIO_SYNC_COMMANDS"] = "0" # Los comandos slash son globales: basta con que los registre uno
+        processes.append(WorkerProcess(cluster_id, shard_ids, env, hub, backoff))
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    runners = [asyncio.create_task(worker.run(stopping)) for worker in processes]
+    await stopping.wait()
+    print("[clúster] Deteniendo workers...")
+    await asyncio.gather(*(worker.stop() for worker in processes))
+    await asyncio.gather(*runners, return_exceptions=True)
+    await hub.close()
+
+
+def print_status(stats: dict):
+    print(f"Shards: {stats['shard_count']} | IDENTIFY coordinados: {stats['identifies']} | comandos enrutados: {stats['routed']}")
+    for cluster_id, worker in stats["workers"].items():
+        print(f"• Worker {cluster_id} (pid {worker['pid']}, shards {format_shard_ids(worker['shards'])}): "
+              f"{worker.get('guilds', '?')} servidores, {worker.get('voice_sessions', '?')} en voz, "
+              f"{worker.get('ffmpeg_active', '?')} ffmpeg, {worker.get('rss_mb', '?')} MB, "
+              f"latencia {worker.get('latency_ms', '?')} ms (hace {worker['stats_age']} s)")
+    totals = stats["totals"]
+    if totals:
+        print(f"Total: {totals.get('guilds', 0)} servidores, {totals.get('voice_sessions', 0)} en voz, "
+              f"{totals.get('ffmpeg_active', 0)} ffmpeg, {totals.get('rss_mb', 0)} MB en los workers")
+
+
+async def run_control(args):
+    if args.command == "estado":
+        stats = await control_request(CLUSTER_IPC, "cluster_stats")
+        if args.json:
+            print(json.dumps(stats, indent=2, ensure_ascii=False))
+        else:
+            print_status(stats)
+    elif args.command == "panelradio":
+        route_args = {"channel_id": args.canal} if args.canal else {}
+        result = await control_request(CLUSTER_IPC, "route", guild_id=args.guild_id, route_cmd="panelradio", args=route_args)
+        print(f"✅ Panel enviado en {result['guild']} (canal {result['channel_id']}, mensaje {result['message_id']}).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lanzador del bot en varios procesos con shards.")
+    parser.add_argument("--workers", type=int, default=CLUSTER_WORKERS, help="Procesos del bot (por defecto, uno por núcleo)")
+    parser.add_argument("--shards", type=int, default=SHARD_COUNT, help="Shards en total (por defecto, los que recomiende Discord)")
+    subcommands = parser.add_subparsers(dest="command")
+    status = subcommands.add_parser("estado", help="Estadísticas agregadas del clúster en marcha")
+    status.add_argument("--json", action="store_true")
+    panel = subcommands.add_parser("panelradio", help="Reenvía el panel de un servidor desde el worker que lo atiende")
+    panel.add_argument("guild_id", type=int)
+    panel.add_argument("--canal", type=int, help="Canal de texto (por defecto, el dedicado o el del panel anterior)")
+    args = parser.parse_args()
+
+    if args.command:
+        try:
+            asyncio.run(run_control(args))
+        except (OSError, RuntimeError, LookupError, asyncio.TimeoutError) as e:
+            print(f"❌ {e or e.__class__.__name__}")
+            sys.exit(1)
+        return
+    if not TOKEN:
+        print("Error: BOT_TOKEN no encontrado en .env.")
+        sys.exit(1)
+    asyncio.run(run_cluster(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+# --- Canal IPC local entre el lanzador del clúster y sus procesos (workers) ---
+# Protocolo mínimo de líneas JSON sobre TCP local. Cada worker se conecta al lanzador, anuncia sus
+# shards, le manda estadísticas cada cierto tiempo y atiende comandos administrativos (ej. reenviar
+# el panel de un servidor) que el lanzador le enruta según a qué shard pertenece el servidor.
+# El lanzador además reparte los turnos de IDENTIFY para que los procesos no choquen con el límite
+# de inicios de sesión de Discord.
+import asyncio
+import itertools
+import json
+import os
+import time
+
+IDENTIFY_INTERVAL = 5.0 # Discord permite max_concurrency IDENTIFY cada 5 s
+MAX_LINE = 1 << 20
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """Shard que atiende al servidor (fórmula de Discord)."""
+    return (guild_id >> 22) % shard_count
+
+
+def parse_shard_ids(text: str):
+    """``"0-3"``, ``"0,2,5"`` o combinaciones (``"0-3,8"``) -> lista ordenada; vacío -> None (todos)."""
+    shard_ids = set()
+    for part in filter(None, (p.strip() for p in (text or "").split(","))):
+        first, _, last = part.partition("-")
+        shard_ids.update(range(int(first), int(last or first) + 1))
+    return sorted(shard_ids) or None
+
+
+def format_shard_ids(shard_ids) -> str:
+    """Inverso de :func:`parse_shard_ids`, con rangos compactos."""
+    ranges = []
+    for shard_id in sorted(shard_ids):
+        if ranges and ranges[-1][1] == shard_id - 1:
+            ranges[-1][1] = shard_id
+        else:
+            ranges.append([shard_id, shard_id])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def parse_address(address: str):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+async def _send(writer: asyncio.StreamWriter, message: dict):
+    writer.write(json.dumps(message, separators=(",", ":"), default=str).encode() + b"\n")
+    await writer.drain()
+
+
+class _Peer:
+    """Extremo de una conexión: envía mensajes y espera las respuestas a sus pedidos por ``id``."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self._pending = {} # id -> Future de la respuesta
+        self._ids = itertools.count(1)
+
+    async def request(self, message: dict, timeout: float = 30.0):
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await _send(self.writer, {**message, "id": request_id})
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    def resolve(self, message: dict) -> bool:
+        future = self._pending.get(message.get("id"))
+        if future is None or future.done():
+            return False
+        if message.get("ok", True):
+            future.set_result(message.get("result"))
+        else:
+            future.set_exception(RuntimeError(message.get("error") or "error en el worker"))
+        return True
+
+    def fail_all(self, error: str):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(error))
+        self._pending.clear()
+
+
+class ClusterHub:
+    """Lado del lanzador: registro de workers, estadísticas agregadas, enrutamiento y turnos de IDENTIFY."""
+
+    def __init__(self, shard_count: int, host: str = "127.0.0.1", port: int = 0, identify_concurrency: int = 1):
+        self.shard_count = shard_count
+        self.host = host
+        self.port = port
+        self.identify_concurrency = max(1, identify_concurrency)
+        self._server = None
+        self._workers = {} # cluster_id -> {"peer", "shards", "pid", "stats", "stats_at", "connected_at"}
+        self._identify_locks = [asyncio.Lock() for _ in range(self.identify_concurrency)]
+        self._identify_last = [0.0] * self.identify_concurrency
+        self.identifies = 0
+        self.routed = 0
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_LINE)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        for worker in list(self._workers.values()):
+            worker["peer"].writer.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def worker_for_guild(self, guild_id: int):
+        shard_id = shard_for_guild(guild_id, self.shard_count)
+        for cluster_id, worker in self._workers.items():
+            if shard_id in worker["shards"]:
+                return cluster_id, worker
+        return None, None
+
+    async def route(self, guild_id: int, command: str, args: dict, timeout: float = 30.0):
+        """Ejecuta ``command`` en el worker dueño del servidor y devuelve su resultado."""
+        cluster_id, worker = self.worker_for_guild(guild_id)
+        if worker is None:
+            raise LookupError(f"Ningún worker conectado atiende el shard {shard_for_guild(guild_id, self.shard_count)}")
+        self.routed += 1
+        return await worker["peer"].request({"op": "command", "cmd": command, "args": {**args, "guild_id": guild_id}}, timeout)
+
+    def heartbeat_age(self, cluster_id: int):
+        """Segundos desde las últimas estadísticas del worker (None si aún no se conectó o no mandó ninguna)."""
+        worker = self._workers.get(cluster_id)
+        if worker is None:
+            return None
+        return time.monotonic() - (worker["stats_at"] or worker["connected_at"])
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        workers = {
+            str(cluster_id): {"shards": worker["shards"], "pid": worker["pid"], "stats_age": round(now - worker["stats_at"], 1) if worker["stats_at"] else None,
+                              **(worker["stats"] or {})}
+            for cluster_id, worker in sorted(self._workers.items())
+        }
+        totals = {}
+        for worker in self._workers.values():
+            for key, value in (worker["stats"] or {}).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] = round(totals.get(key, 0) + value, 2)
+        return {"shard_count": self.shard_count, "workers": workers, "totals": totals, "identifies": self.identifies, "routed": self.routed}
+
+    async def _identify_turn(self, shard_id: int):
+        # Igual que discord.py dentro de un proceso: un IDENTIFY por cubo cada 5 s, pero entre todos los procesos
+        bucket = shard_id % self.identify_concurrency
+        async with self._identify_locks[bucket]:
+            wait = self._identify_last[bucket] + IDENTIFY_INTERVAL - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._identify_last[bucket] = time.monotonic()
+            self.identifies += 1
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = _Peer(reader, writer)
+        cluster_id = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                op = message.get("op")
+                if op == "hello":
+                    cluster_id = message["cluster"]
+                    self._workers[cluster_id] = {"peer": peer, "shards": message["shards"], "pid": message.get("pid"),
+                                                 "stats": None, "stats_at": None, "connected_at": time.monotonic()}
+                    print(f"[clúster] Worker {cluster_id} conectado (shards {message['shards']}, pid {message.get('pid')}).")
+                elif op == "stats" and cluster_id in self._workers:
+                    self._workers[cluster_id].update(stats=message["stats"], stats_at=time.monotonic())
+                elif op == "reply":
+                    peer.resolve(message)
+                elif op == "request":
+                    # Pedidos de un worker o de la línea de comandos hacia el lanzador
+                    asyncio.get_running_loop().create_task(self._answer(peer, message))
+        except (ConnectionError, json.JSONDecodeError, asyncio.IncompleteReadError, ValueError) as e:
+            print(f"[clúster] Conexión IPC cerrada con error: {e}")
+        finally:
+            peer.fail_all("el worker se desconectó")
+            if cluster_id is not None and self._workers.get(cluster_id, {}).get("peer") is peer:
+                del self._workers[cluster_id]
+            writer.close()
+
+    async def _answer(self, peer: _Peer, message: dict):
+        reply = {"op": "reply", "id": message.get("id"), "ok": True}
+        try:
+            command = message.get("cmd")
+            if command == "identify":
+                await self._identify_turn(int(message["shard_id"]))
+            elif command == "cluster_stats":
+                reply["result"] = self.stats()
+            elif command == "route":
+                reply["result"] = await self.route(int(message["guild_id"]), message["route_cmd"], message.get("args") or {})
+            else:
+                raise ValueError(f"Pedido desconocido: {command}")
+        except Exception as e:
+            reply.update(ok=False, error=str(e) or e.__class__.__name__)
+        try:
+            await _send(peer.writer, reply)
+        except ConnectionError:
+            pass
+
+
+class ClusterWorkerLink:
+    """Lado del worker: se conecta al lanzador, le manda estadísticas y atiende comandos enrutados.
+
+    ``handlers`` mapea nombre de comando -> corrutina ``handler(args) -> resultado JSON``.
+    ``collect_stats()`` devuelve el dict de estadísticas que se publica cada ``stats_interval`` s.
+    """
+
+    def __init__(self, address: str, cluster_id: int, shard_ids, handlers: dict, collect_stats, stats_interval: float = 10.0):
+        self.address = address
+        self.cluster_id = cluster_id
+        self.shard_ids = list(shard_ids)
+        self._handlers = handlers
+        self._collect_stats = collect_stats
+        self.stats_interval = stats_interval
+        self._peer = None
+        self._connected = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def request(self, command: str, timeout: float = 30.0, **fields):
+        await asyncio.wait_for(self._connected.wait(), timeout)
+        return await self._peer.request({"op": "request", "cmd": command, **fields}, timeout)
+
+    async def before_identify(self, shard_id: int, *, initial: bool = False):
+        """Reemplazo de ``Client.before_identify_hook``: pide turno al lanzador (o espera como discord.py si no responde)."""
+        self.start() # El primer IDENTIFY llega antes que on_ready
+        try:
+            await self.request("identify", timeout=max(60.0, IDENTIFY_INTERVAL * 4), shard_id=shard_id)
+        except (asyncio.TimeoutError, ConnectionError, RuntimeError) as e:
+            print(f"[clúster] Sin turno de IDENTIFY del lanzador ({e}); esperando {IDENTIFY_INTERVAL:.0f} s.")
+            if not initial:
+                await asyncio.sleep(IDENTIFY_INTERVAL)
+
+    async def _run(self):
+        host, port = parse_address(self.address)
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+            except OSError as e:
+                print(f"[clúster] No se pudo conectar al lanzador en {self.address}: {e}; reintentando.")
+                await asyncio.sleep(2)
+                continue
+            self._peer = _Peer(reader, writer)
+            await _send(writer, {"op": "hello", "cluster": self.cluster_id, "shards": self.shard_ids, "pid": os.getpid()})
+            self._connected.set()
+            stats_task = asyncio.get_running_loop().create_task(self._publish_stats(writer))
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    message = json.loads(line)
+                    if message.get("op") == "reply":
+                        self._peer.resolve(message)
+                    elif message.get("op") == "command":
+                        asyncio.get_running_loop().create_task(self._run_command(writer, message))
+            except (ConnectionError, json.JSONDecodeError, ValueError) as e:
+                print(f"[clúster] Se cortó el canal con el lanzador: {e}")
+            finally:
+                self._connected.clear()
+                stats_task.cancel()
+                self._peer.fail_all("se cortó el canal con el lanzador")
+                writer.close()
+            await asyncio.sleep(1)
+
+    async def _publish_stats(self, writer):
+        while True:
+            try:
+                await _send(writer, {"op": "stats", "stats": self._collect_stats()})
+            except ConnectionError:
+                return
+            except Exception as e:
+                print(f"[clúster] Error juntando estadísticas: {e}")
+            await asyncio.sleep(self.stats_interval)
+
+    async def _run_command(self, writer, message: dict):
+        reply = {"op": "reply", "id": message.get("id"), "ok": True}
+        handler = self._handlers.get(message.get("cmd"))
+        try:
+            if handler is None:
+                raise ValueError(f"Comando desconocido: {message.get('cmd')}")
+            reply["result"] = await handler(message.get("args") or {})
+        except Exception as e:
+            reply.update(ok=False, error=str(e) or e.__class__.__name__)
+        try:
+            await _send(writer, reply)
+        except ConnectionError:
+            pass
+
+
+async def control_request(address: str, command: str, timeout: float = 30.0, **fields):
+    """Pedido puntual al lanzador desde fuera del clúster (línea de comandos)."""
+    host, port = parse_address(address)
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port, limit=MAX_LINE), timeout)
+    try:
+        await _send(writer, {"op": "request", "cmd": command, "id": 1, **fields})
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if not line:
+                raise ConnectionError("el lanzador cerró la conexión")
+            message = json.loads(line)
+            if message.get("op") == "reply" and message.get("id") == 1:
+                if not message.get("ok", True):
+                    raise RuntimeError(message.get("error") or "error en el lanzador")
+                return message.get("result")
+    finally:
+        writer.close()
@@ -1,10 +1,17 @@
 PREDEFINED_STATIONS = {
     "rockandpop": {
         "name": "Rock and Pop",
-        "url": "https://26593.live.streamtheworld.com/ROCK_AND_POPAAC_SC"
+        "url": "https://26593.live.streamtheworld.com/ROCK_AND_POPAAC_SC",
+        # "playback" opcional: "opus" hace que ffmpeg entregue Opus (copia o codifica) y omite la etapa DSP;
+        # sin la clave se usa RADIO_PLAYBACK_MODE ("pcm" por defecto: codifica discord.py)
+        # Espejos alternativos a los que el supervisor cambia si la URL principal se corta
+        "mirrors": [
+            "https://playerservices.streamtheworld.com/api/livestream-redirect/ROCK_AND_POPAAC_SC",
+        ]
     },
     "carabineros": {
         "name": "Radio Carabineros",
-        "url": "https://streaming.prositel.cl/8374/stream"
+        "url": "https://streaming.prositel.cl/8374/stream",
+        "mirrors": []
     },
 }
@@ -0,0 +1,269 @@
+# --- Gestor de procesos ffmpeg: límite global, cola justa y contabilidad de recursos ---
+# Cada FFmpegPCMAudio/FFmpegOpusAudio lanza un ffmpeg. Aquí se limita cuántos corren a la vez
+# (los que no caben esperan en una cola FIFO con timeout), se mide su RSS y CPU desde /proc y se
+# matan los huérfanos (dueño desconectado o proceso terminado sin que se llamara a "after").
+import asyncio
+import collections
+import os
+import time
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+KILL_WAIT_TIMEOUT = 1.0 # Segundos que se espera a que un ffmpeg matado termine antes de darlo por perdido
+
+
+class FFmpegAdmissionError(Exception):
+    """No hubo cupo para un ffmpeg nuevo dentro del tiempo de espera."""
+
+
+def read_proc_usage(pid: int):
+    """Devuelve ``(segundos_cpu, rss_kb)`` del proceso leyendo /proc, o None si ya no existe."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+        rss_kb = 0
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss_kb = int(line.split()[1])
+                    break
+        return cpu_seconds, rss_kb
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class FFmpegSlot:
+    """Cupo para un proceso ffmpeg. Se libera al terminar el proceso, con :meth:`release` o al limpiar al dueño."""
+
+    __slots__ = ("manager", "owner", "label", "process", "admitted_at", "cpu_seconds", "cpu_percent", "rss_kb",
+                 "_sampled_at", "released")
+
+    def __init__(self, manager, owner, label: str):
+        self.manager = manager
+        self.owner = owner
+        self.label = label
+        self.process = None
+        self.admitted_at = time.monotonic()
+        self.cpu_seconds = 0.0
+        self.cpu_percent = 0.0
+        self.rss_kb = 0
+        self._sampled_at = None
+        self.released = False
+
+    def bind(self, source):
+        """Asocia el proceso ffmpeg de una fuente de discord.py (``source._process``)."""
+        self.process = getattr(source, "_process", None)
+        return source
+
+    def transfer(self, owner):
+        self.owner = owner
+
+    def release(self, kill: bool = False):
+        self.manager._release(self, kill)
+
+    def release_threadsafe(self):
+        """Para llamarlo desde el hilo del reproductor (ej. en ``cleanup`` de la fuente)."""
+        loop = self.manager._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.release)
+
+    def sample(self, now: float) -> bool:
+        """Actualiza CPU/RSS. Devuelve False si el proceso ya terminó."""
+        process = self.process
+        if process is None:
+            return True
+        if process.poll() is not None:
+            return False
+        usage = read_proc_usage(process.pid)
+        if usage is None:
+            return False
+        cpu_seconds, self.rss_kb = usage
+        if self._sampled_at is not None and now > self._sampled_at:
+            self.cpu_percent = 100 * (cpu_seconds - self.cpu_seconds) / (now - self._sampled_at)
+        self.cpu_seconds = cpu_seconds
+        self._sampled_at = now
+        return True
+
+
+class FFmpegProcessManager:
+    """Límite global de procesos ffmpeg con cola FIFO, muestreo de recursos y limpieza de huérfanos.
+
+    ``owner_alive(owner)`` indica si el dueño de un proceso sigue necesitándolo; si devuelve False
+    el proceso se mata en el siguiente muestreo.
+    """
+
+    def __init__(self, max_processes: int = 32, queue_timeout: float = 10.0, sample_interval: float = 2.0,
+                 unbound_grace: float = 30.0, owner_alive=None):
+        self.max_processes = max_processes
+        self.queue_timeout = queue_timeout
+        self.sample_interval = sample_interval
+        self.unbound_grace = unbound_grace
+        self._owner_alive = owner_alive
+        self._slots = set()
+        self._waiters = collections.deque()
+        self._reserved = 0 # Cupos ya entregados a un waiter que aún no despierta
+        self._dying = 0 # Procesos matados que todavía no terminan: siguen ocupando su cupo
+        self._task = None
+        self._loop = None
+        self.admitted = 0
+        self.rejected = 0
+        self.reaped = 0
+
+    @property
+    def active(self) -> int:
+        return len(self._slots)
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._task = self._loop.create_task(self._sample_loop())
+
+    def _has_free_slot(self) -> bool:
+        return len(self._slots) + self._reserved + self._dying < self.max_processes
+
+    async def admit(self, owner, label: str = "", timeout: float = None) -> FFmpegSlot:
+        """Espera (en orden de llegada) un cupo para lanzar un ffmpeg."""
+        if self._has_free_slot() and not self.waiting:
+            return self._grant(owner, label)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout if timeout is not None else self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # El cupo llegó justo al expirar o cancelar: pasarlo al siguiente de la cola
+                self._reserved -= 1
+                self._hand_over_next()
+            waiter.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise FFmpegAdmissionError(f"Sin cupo para ffmpeg ({self.active}/{self.max_processes} en uso, {self.waiting} en cola)") from None
+            raise
+        self._reserved -= 1
+        return self._grant(owner, label)
+
+    def try_admit(self, owner, label: str = ""):
+        """Cupo inmediato o None, sin esperar ni adelantarse a la cola (para trabajo de baja prioridad)."""
+        if self._has_free_slot() and not self.waiting:
+            return self._grant(owner, label)
+        return None
+
+    def _grant(self, owner, label: str) -> FFmpegSlot:
+        slot = FFmpegSlot(self, owner, label)
+        self._slots.add(slot)
+        self.admitted += 1
+        return slot
+
+    def _release(self, slot: FFmpegSlot, kill: bool):
+        if slot.released:
+            return
+        slot.released = True
+        self._slots.discard(slot)
+        process = slot.process
+        if kill and process is not None and process.poll() is None:
+            try:
+                process.kill()
+            except Exception as e:
+                print(f"No se pudo matar ffmpeg {process.pid} ({slot.label}): {e}")
+            else:
+                self._reap_killed(process, slot.label)
+                return
+        self._hand_over_next()
+
+    def _reap_killed(self, process, label: str):
+        # Esperar al proceso fuera del event loop (se llega aquí desde on_voice_state_update y el
+        # reaper de inactividad); su cupo pasa al siguiente recién cuando terminó de verdad
+        self._dying += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            self._killed_done(process, label, self._wait_killed(process))
+            return
+        future = loop.run_in_executor(None, self._wait_killed, process)
+        future.add_done_callback(lambda f: self._killed_done(process, label, None if f.cancelled() else f.result()))
+
+    @staticmethod
+    def _wait_killed(process):
+        try:
+            process.wait(timeout=KILL_WAIT_TIMEOUT)
+        except Exception as e:
+            return e
+        return None
+
+    def _killed_done(self, process, label: str, error):
+        self._dying -= 1
+        if error is not None:
+            print(f"ffmpeg {process.pid} ({label}) no terminó tras matarlo: {error}")
+        self._hand_over_next()
+
+    def _hand_over_next(self):
+        # El cupo liberado pasa directo al primero de la cola, así nadie se cuela
+        while self._waiters and self._has_free_slot():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._reserved += 1
+                waiter.set_result(None)
+                return
+
+    def release_owner(self, owner) -> int:
+        """Mata y libera todos los procesos de un dueño (ej. al desconectarse de voz)."""
+        slots = [slot for slot in self._slots if slot.owner == owner]
+        for slot in slots:
+            slot.release(kill=True)
+        return len(slots)
+
+    async def _sample_loop(self):
+        while True:
+            await asyncio.sleep(self.sample_interval)
+            slots = list(self._slots)
+            # Leer /proc fuera del event loop; liberar y matar sí se hace en el loop
+            exited = await asyncio.get_running_loop().run_in_executor(None, self._sample_processes, slots)
+            self._reap(slots, exited)
+
+    def _sample_processes(self, slots) -> set:
+        now = time.monotonic()
+        return {slot for slot in slots if slot.process is not None and not slot.sample(now)}
+
+    def _reap(self, slots, exited):
+        now = time.monotonic()
+        for slot in slots:
+            if slot.released:
+                continue
+            if slot in exited:
+                slot.release() # El proceso terminó: liberar aunque nunca se haya llamado a "after"
+            elif slot.process is None:
+                if now - slot.admitted_at > self.unbound_grace:
+                    slot.release() # Cupo concedido pero nunca usado
+            elif self._owner_alive and not self._owner_alive(slot.owner):
+                self.reaped += 1
+                print(f"Matando ffmpeg huérfano {slot.process.pid} ({slot.label}).")
+                slot.release(kill=True)
+
+    def sample_all(self):
+        slots = list(self._slots)
+        self._reap(slots, self._sample_processes(slots))
+
+    def stats(self) -> dict:
+        slots = list(self._slots)
+        return {
+            "active": len(slots),
+            "max": self.max_processes,
+            "waiting": self.waiting,
+            "dying": self._dying,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "reaped": self.reaped,
+            "rss_kb": sum(slot.rss_kb for slot in slots),
+            "cpu_percent": round(sum(slot.cpu_percent for slot in slots), 1),
+            "processes": [
+                {"label": slot.label, "owner": str(slot.owner), "pid": slot.process.pid if slot.process else None,
+                 "rss_kb": slot.rss_kb, "cpu_percent": round(slot.cpu_percent, 1)}
+                for slot in slots
+            ],
+        }
@@ -0,0 +1,32 @@
+# --- Perfiles de conexión al gateway de Discord ---
+# "default": comandos con prefijo (!!play...), así que el bot recibe y procesa todos los mensajes
+# de todos los servidores. "lowmem": solo comandos de aplicación (/radio...) y el panel persistente;
+# el gateway deja de mandar mensajes, escritura, reacciones, etc., y las cachés se reducen al mínimo.
+import discord
+
+PROFILE_DEFAULT = "default"
+PROFILE_LOW_MEMORY = "lowmem"
+PROFILES = (PROFILE_DEFAULT, PROFILE_LOW_MEMORY)
+
+
+def gateway_options(profile: str) -> dict:
+    """Argumentos de ``commands.Bot``/``discord.Client`` (intents y cachés) para el perfil."""
+    if profile == PROFILE_LOW_MEMORY:
+        # guilds: canales y roles (el panel y los permisos los necesitan); voice_states: conexión de voz
+        # y conteo de oyentes. Las interacciones (slash, botones, menús) llegan con cualquier intent.
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.voice_states = True
+        member_cache_flags = discord.MemberCacheFlags.none()
+        member_cache_flags.voice = True # Solo quien está en un canal de voz (para contar oyentes)
+        return {
+            "intents": intents,
+            "member_cache_flags": member_cache_flags,
+            "max_messages": None, # Sin caché de mensajes: el panel se edita con PartialMessage
+            "chunk_guilds_at_startup": False,
+        }
+    intents = discord.Intents.default()
+    intents.guilds = True
+    intents.voice_states = True
+    intents.message_content = True # Para los comandos con prefijo
+    return {"intents": intents}
@@ -0,0 +1,158 @@
+# --- Estado persistente por servidor (SQLite en modo WAL) ---
+# Guarda dónde está el panel de cada servidor, qué emisora sonaba y en qué canal de voz, para que
+# tras un reinicio el bot recupere el panel sin llamadas REST ni editar el .env y retome la radio.
+# Las escrituras se juntan en lotes y se hacen en un hilo propio, nunca en el event loop.
+import asyncio
+import concurrent.futures
+import sqlite3
+import time
+
+GUILD_STATE_FIELDS = (
+    "panel_channel_id",
+    "panel_message_id",
+    "voice_channel_id",
+    "station_key",
+    "station_name",
+    "stream_url",
+    "playback_mode",
+    "volume_percent",
+)
+_INTEGER_SUFFIXES = ("_id", "_percent")
+
+
+def _column_type(field: str) -> str:
+    return "INTEGER" if field.endswith(_INTEGER_SUFFIXES) else "TEXT"
+
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS guild_state (
+    guild_id INTEGER PRIMARY KEY,
+    {", ".join(f"{field} {_column_type(field)}" for field in GUILD_STATE_FIELDS)},
+    updated_at REAL NOT NULL
+)
+"""
+_UPSERT = (
+    f"INSERT INTO guild_state (guild_id, {', '.join(GUILD_STATE_FIELDS)}, updated_at) "
+    f"VALUES ({', '.join('?' * (len(GUILD_STATE_FIELDS) + 2))}) "
+    f"ON CONFLICT(guild_id) DO UPDATE SET {', '.join(f'{field} = excluded.{field}' for field in GUILD_STATE_FIELDS)}, updated_at = excluded.updated_at"
+)
+
+
+class GuildStateStore:
+    """Filas ``guild_id -> {campo: valor}`` (campos en ``GUILD_STATE_FIELDS``) con escritura diferida en lotes.
+
+    :meth:`save` solo deja la fila pendiente en memoria; ``flush_delay`` segundos después todas las
+    filas pendientes se escriben en una sola transacción. Filas sin cambios no se vuelven a escribir.
+    """
+
+    def __init__(self, path: str, flush_delay: float = 1.0):
+        self.path = path
+        self.flush_delay = flush_delay
+        # Un solo hilo: la conexión SQLite se usa siempre desde el mismo hilo y las escrituras no se cruzan
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="guild-state")
+        self._connection = None
+        self._pending = {} # guild_id -> fila (o None para borrarla)
+        self._saved = {} # Última fila escrita por servidor
+        self._flush_handle = None
+        self._loop = None
+        self.rows_written = 0
+        self.batches = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL") # En WAL basta para no corromper; se puede perder el último lote
+            connection.execute(_SCHEMA)
+            # Bases creadas por versiones anteriores: agregar las columnas nuevas (quedan en NULL)
+            existing = {row[1] for row in connection.execute("PRAGMA table_info(guild_state)")}
+            for field in GUILD_STATE_FIELDS:
+                if field not in existing:
+                    connection.execute(f"ALTER TABLE guild_state ADD COLUMN {field} {_column_type(field)}")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    async def load(self) -> dict:
+        """Todas las filas guardadas; también queda como referencia para omitir escrituras repetidas."""
+        self._loop = asyncio.get_running_loop()
+        rows = await self._loop.run_in_executor(self._executor, self._load)
+        self._saved.update(rows)
+        return rows
+
+    def _load(self) -> dict:
+        cursor = self._connect().execute(f"SELECT guild_id, {', '.join(GUILD_STATE_FIELDS)} FROM guild_state")
+        return {row[0]: dict(zip(GUILD_STATE_FIELDS, row[1:])) for row in cursor}
+
+    def get(self, guild_id: int):
+        """Fila más reciente del servidor (pendiente o ya escrita), o None."""
+        if guild_id in self._pending:
+            return self._pending[guild_id]
+        return self._saved.get(guild_id)
+
+    def guild_ids(self) -> set:
+        return {guild_id for guild_id, row in {**self._saved, **self._pending}.items() if row is not None}
+
+    def save(self, guild_id: int, row: dict):
+        row = {field: row.get(field) for field in GUILD_STATE_FIELDS}
+        if self._pending.get(guild_id, self._saved.get(guild_id)) == row:
+            return
+        self._pending[guild_id] = row
+        self._schedule_flush()
+
+    def forget(self, guild_id: int):
+        if guild_id in self._saved or guild_id in self._pending:
+            self._pending[guild_id] = None
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            loop = self._loop or asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.flush_delay, lambda: loop.create_task(self.flush()))
+
+    async def flush(self):
+        self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write, batch)
+        except sqlite3.Error as e:
+            print(f"No se pudo guardar el estado de {len(batch)} servidor(es): {e}")
+            for guild_id, row in batch.items():
+                self._pending.setdefault(guild_id, row) # Reintentar en el próximo lote
+            self._schedule_flush()
+            return
+        for guild_id, row in batch.items():
+            if row is None:
+                self._saved.pop(guild_id, None)
+            else:
+                self._saved[guild_id] = row
+
+    def _write(self, batch: dict):
+        now = time.time()
+        upserts = [(guild_id, *(row[field] for field in GUILD_STATE_FIELDS), now) for guild_id, row in batch.items() if row is not None]
+        deletes = [(guild_id,) for guild_id, row in batch.items() if row is None]
+        connection = self._connect()
+        with connection: # Una transacción por lote
+            if upserts:
+                connection.executemany(_UPSERT, upserts)
+            if deletes:
+                connection.executemany("DELETE FROM guild_state WHERE guild_id = ?", deletes)
+        self.rows_written += len(batch)
+        self.batches += 1
+
+    def close(self):
+        """Escribe lo pendiente y cierra (llamar con el event loop ya detenido, ej. después de ``bot.run``)."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            self._executor.submit(self._write, batch).result()
+        if self._connection is not None:
+            self._executor.submit(self._connection.close).result()
+        self._executor.shutdown()
+
+    def stats(self) -> dict:
+        return {"guilds": len(self._saved), "pending": len(self._pending), "rows_written": self.rows_written, "batches": self.batches}
@@ -0,0 +1,282 @@
+# --- Metadatos ICY ("ahora suena") leídos de la misma conexión que alimenta a ffmpeg ---
+# Los servidores Shoutcast/Icecast intercalan cada ``icy-metaint`` bytes de audio un bloque con
+# ``StreamTitle='Artista - Canción';``. En vez de abrir una segunda conexión por emisora, el bot
+# abre la conexión él mismo, quita esos bloques y le pasa a ffmpeg solo el audio por stdin.
+import http.client
+import re
+import socket
+import ssl
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+MAX_REDIRECTS = 5
+_STREAM_TITLE = re.compile(rb"StreamTitle='(.*?)';", re.DOTALL)
+
+
+class IcyStreamError(Exception):
+    """La conexión al stream falló o el servidor respondió con error."""
+
+
+class _IcyHTTPResponse(http.client.HTTPResponse):
+    # Los servidores SHOUTcast v1 responden "ICY 200 OK", que http.client rechaza por no ser HTTP/x
+    def _read_status(self):
+        line = str(self.fp.readline(http.client._MAXLINE + 1), "iso-8859-1")
+        if not line:
+            raise http.client.RemoteDisconnected("El servidor cerró la conexión sin responder")
+        if line.startswith("ICY "):
+            line = "HTTP/1.0 " + line[4:]
+        parts = line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+            raise http.client.BadStatusLine(line)
+        return parts[0], int(parts[1]), parts[2].strip() if len(parts) > 2 else ""
+
+
+def parse_stream_title(block: bytes):
+    """Título de un bloque de metadatos ICY, o None si el bloque no trae ``StreamTitle``."""
+    match = _STREAM_TITLE.search(block)
+    if match is None:
+        return None
+    raw = match.group(1)
+    try:
+        title = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        title = raw.decode("latin-1") # Muchos servidores antiguos mandan Latin-1
+    return title.strip()
+
+
+class IcyStreamReader:
+    """Objeto tipo archivo (``read``/``close``) con el audio del stream sin los bloques de metadatos.
+
+    Se le pasa a FFmpegPCMAudio/FFmpegOpusAudio con ``pipe=True``: discord.py lo lee en su hilo
+    escritor. ``on_metadata(title, station_name)`` se llama desde ese hilo cuando cambia algo y
+    ``on_close()`` una sola vez, al cerrarlo. Si la conexión se corta se reintenta
+    ``reconnect_attempts`` veces antes de dar el stream por terminado.
+    """
+
+    def __init__(self, url: str, on_metadata=None, timeout: float = 10.0, reconnect_attempts: int = 3,
+                 user_agent: str = "Rock-Bot/1.0", on_close=None):
+        self.url = url
+        self._on_metadata = on_metadata
+        self._on_close = on_close
+        self.timeout = timeout
+        self.reconnect_attempts = reconnect_attempts
+        self.user_agent = user_agent
+        self._connection = None
+        self._response = None
+        self._until_metadata = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.metaint = 0
+        self.content_type = None
+        self.station_name = None
+        self.title = None
+        self.reconnects = 0
+
+    def _connect(self):
+        url = self.url
+        for _ in range(MAX_REDIRECTS):
+            parts = urlsplit(url)
+            if parts.scheme == "https":
+                connection = http.client.HTTPSConnection(parts.hostname, parts.port, timeout=self.timeout, context=ssl.create_default_context())
+            else:
+                connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=self.timeout)
+            connection.response_class = _IcyHTTPResponse
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            connection.request("GET", path, headers={"Icy-MetaData": "1", "User-Agent": self.user_agent, "Accept": "*/*"})
+            response = connection.getresponse()
+            if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                url = urljoin(url, response.getheader("Location"))
+                connection.close()
+                continue
+            if response.status >= 400:
+                connection.close()
+                raise IcyStreamError(f"{url} respondió HTTP {response.status}")
+            with self._lock:
+                if self._closed:
+                    connection.close()
+                    return
+                self._connection, self._response = connection, response
+            self.metaint = int(response.getheader("icy-metaint") or 0)
+            self._until_metadata = self.metaint
+            self.content_type = response.getheader("Content-Type")
+            station_name = response.getheader("icy-name")
+            if station_name:
+                # Las cabeceras HTTP llegan como Latin-1; la mayoría de los servidores en realidad manda UTF-8
+                try:
+                    station_name = station_name.encode("latin-1").decode("utf-8")
+                except UnicodeError:
+                    pass
+                if station_name.strip() != self.station_name:
+                    self.station_name = station_name.strip()
+                    self._notify()
+            return
+        raise IcyStreamError(f"Demasiadas redirecciones desde {self.url}")
+
+    def _disconnect(self):
+        with self._lock:
+            connection, self._connection, self._response = self._connection, None, None
+        if connection is not None:
+            sock = connection.sock
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR) # Despierta a un read() bloqueado en otro hilo
+                except OSError:
+                    pass
+            connection.close()
+
+    def _notify(self):
+        if self._on_metadata:
+            try:
+                self._on_metadata(self.title, self.station_name)
+            except Exception as e:
+                print(f"Error publicando metadatos ICY de {self.url}: {e}")
+
+    def _read_audio(self, size: int) -> bytes:
+        response = self._response
+        if self.metaint:
+            if self._until_metadata == 0:
+                self._read_metadata(response)
+            size = min(size, self._until_metadata)
+        data = response.read1(size)
+        if self.metaint:
+            self._until_metadata -= len(data)
+        return data
+
+    def _read_metadata(self, response):
+        length = response.read(1)
+        if not length:
+            return
+        self._until_metadata = self.metaint
+        if length[0] == 0:
+            return # Sin cambios desde el bloque anterior
+        block = response.read(length[0] * 16)
+        title = parse_stream_title(block)
+        if title is not None and title != self.title:
+            self.title = title
+            self._notify()
+
+    def read(self, size: int = 8192) -> bytes:
+        attempts = 0
+        while not self._closed:
+            try:
+                if self._response is None:
+                    self._connect()
+                    continue
+                data = self._read_audio(size)
+                if data:
+                    return data
+                error = "el servidor cerró la conexión"
+            except (OSError, http.client.HTTPException, IcyStreamError, ValueError) as e:
+                error = str(e) or e.__class__.__name__
+            self._disconnect()
+            if self._closed:
+                break
+            if attempts >= self.reconnect_attempts:
+                print(f"Stream {self.url} perdido tras {attempts} reintentos: {error}")
+                break
+            attempts += 1
+            self.reconnects += 1
+            print(f"Reconectando a {self.url} ({error}), intento {attempts}.")
+            time.sleep(0.5 * 2 ** (attempts - 1))
+        return b''
+
+    def close(self):
+        with self._lock:
+            first, self._closed = not self._closed, True
+        self._disconnect()
+        if first and self._on_close:
+            self._on_close()
+
+
+class NowPlayingHub:
+    """Último título conocido por stream y aviso (limitado) a quien lo muestre.
+
+    ``on_change(key, title, station_name)`` se llama en el event loop como máximo una vez cada
+    ``min_interval`` segundos por stream; si el título cambia más rápido se publica solo el último.
+    Cuando se cierra el último lector de un stream se olvida su título.
+    """
+
+    def __init__(self, on_change, min_interval: float = 15.0):
+        self._on_change = on_change
+        self.min_interval = min_interval
+        self._loop = None
+        self._current = {} # key -> (título, nombre de la emisora)
+        self._published_at = {}
+        self._pending = {} # key -> TimerHandle de la publicación diferida
+        self._readers = {} # key -> lectores abiertos (se crean en hilos de ffmpeg, de ahí el lock)
+        self._readers_lock = threading.Lock()
+        self.changes = 0
+        self.published = 0
+
+    def start(self, loop):
+        self._loop = loop
+
+    def reader_callbacks(self, key: str):
+        """``(on_metadata, on_close)`` para un :class:`IcyStreamReader` nuevo del stream ``key``.
+
+        Se ejecutan en los hilos de discord.py; el trabajo de verdad se pasa al event loop.
+        """
+        with self._readers_lock:
+            self._readers[key] = self._readers.get(key, 0) + 1
+
+        def on_metadata(title, station_name):
+            self._call_in_loop(self._update, key, title, station_name)
+
+        def on_close():
+            with self._readers_lock:
+                remaining = self._readers.get(key, 1) - 1
+                if remaining > 0:
+                    self._readers[key] = remaining
+                    return
+                self._readers.pop(key, None)
+            self._call_in_loop(self._evict, key)
+        return on_metadata, on_close
+
+    def _call_in_loop(self, callback, *args):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(callback, *args)
+
+    def current(self, key: str):
+        """``(título, nombre de la emisora)`` del stream, o ``(None, None)``."""
+        return self._current.get(key, (None, None))
+
+    def _update(self, key: str, title, station_name):
+        if self._current.get(key) == (title, station_name):
+            return # Otro servidor escuchando el mismo stream ya lo había informado
+        self._current[key] = (title, station_name)
+        self.changes += 1
+        if key in self._pending:
+            return # Ya hay una publicación programada: saldrá con el valor más reciente
+        wait = self._published_at.get(key, float("-inf")) + self.min_interval - time.monotonic()
+        if wait <= 0:
+            self._publish(key)
+        else:
+            self._pending[key] = self._loop.call_later(wait, self._publish, key)
+
+    def _evict(self, key: str):
+        with self._readers_lock:
+            if self._readers.get(key):
+                return # Se abrió otro lector del mismo stream mientras tanto (ej. reconexión del supervisor)
+        self._current.pop(key, None)
+        self._published_at.pop(key, None)
+        handle = self._pending.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+
+    def _publish(self, key: str):
+        self._pending.pop(key, None)
+        if key not in self._current:
+            return
+        self._published_at[key] = time.monotonic()
+        self.published += 1
+        title, station_name = self._current[key]
+        self._on_change(key, title, station_name)
+
+    def stats(self) -> dict:
+        with self._readers_lock:
+            readers = sum(self._readers.values())
+        return {"streams": len(self._current), "readers": readers, "changes": self.changes, "published": self.published}
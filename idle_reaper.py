@@ -0,0 +1,108 @@
+# --- Sesiones sin oyentes: pausar o desconectar cuando el canal de voz queda vacío ---
+# Cuenta los oyentes humanos del canal donde está el bot en cada servidor a partir de los eventos
+# de voz (sin recorrer los miembros en cada evento). Si el canal queda vacío más de ``grace``
+# segundos se llama a ``on_idle``; si alguien vuelve a un servidor pausado, a ``on_listener_return``.
+import asyncio
+
+# Qué hacer con una sesión sin oyentes (RADIO_IDLE_ACTION)
+IDLE_PAUSE = "pause" # Deja de decodificar pero sigue en el canal y retoma al volver alguien
+IDLE_DISCONNECT = "disconnect" # Sale del canal
+IDLE_ACTIONS = (IDLE_PAUSE, IDLE_DISCONNECT)
+
+
+class IdleSessionReaper:
+    """Conteo de oyentes por canal del bot y plazo de gracia antes de liberar la sesión.
+
+    ``on_idle(guild_id)`` y ``on_listener_return(guild_id)`` son corrutinas. ``on_idle`` debe
+    devolver True si la sesión quedó pausada (sigue en el canal) para avisar cuando alguien vuelva.
+    """
+
+    def __init__(self, on_idle, on_listener_return=None, grace: float = 120.0):
+        self._on_idle = on_idle
+        self._on_listener_return = on_listener_return
+        self.grace = grace
+        self._channels = {} # guild_id -> canal de voz del bot
+        self._listeners = {} # guild_id -> oyentes humanos en ese canal
+        self._timers = {} # guild_id -> TimerHandle del plazo de gracia
+        self._paused = set() # Servidores pausados por falta de oyentes
+        self.reaped = 0
+        self.resumed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.grace > 0
+
+    def watch_channel(self, guild_id: int, channel_id: int, listeners: int):
+        """El bot entró (o se movió) a ``channel_id``: punto de partida del conteo."""
+        self._channels[guild_id] = channel_id
+        self._listeners[guild_id] = listeners
+        self._update(guild_id)
+
+    def unwatch(self, guild_id: int):
+        """El bot salió del canal de voz."""
+        self._channels.pop(guild_id, None)
+        self._listeners.pop(guild_id, None)
+        self._paused.discard(guild_id)
+        self._cancel_timer(guild_id)
+
+    def member_moved(self, guild_id: int, before_channel_id, after_channel_id):
+        """Evento de voz de un miembro humano (entrar, salir o cambiar de canal)."""
+        channel_id = self._channels.get(guild_id)
+        if channel_id is None or before_channel_id == after_channel_id:
+            return # Mute/deafen o un canal que no es el del bot
+        if before_channel_id == channel_id:
+            self._listeners[guild_id] = max(0, self._listeners[guild_id] - 1)
+        elif after_channel_id == channel_id:
+            self._listeners[guild_id] += 1
+        else:
+            return
+        self._update(guild_id)
+
+    def listeners(self, guild_id: int) -> int:
+        return self._listeners.get(guild_id, 0)
+
+    def is_paused(self, guild_id: int) -> bool:
+        return guild_id in self._paused
+
+    def _update(self, guild_id: int):
+        if not self.enabled:
+            return
+        if self._listeners[guild_id] > 0:
+            self._cancel_timer(guild_id)
+            if guild_id in self._paused:
+                self._paused.discard(guild_id)
+                self.resumed += 1
+                if self._on_listener_return:
+                    asyncio.get_running_loop().create_task(self._on_listener_return(guild_id))
+        elif guild_id not in self._timers and guild_id not in self._paused:
+            loop = asyncio.get_running_loop()
+            self._timers[guild_id] = loop.call_later(self.grace, lambda: loop.create_task(self._reap(guild_id)))
+
+    def _cancel_timer(self, guild_id: int):
+        timer = self._timers.pop(guild_id, None)
+        if timer:
+            timer.cancel()
+
+    async def _reap(self, guild_id: int):
+        self._timers.pop(guild_id, None)
+        if self._listeners.get(guild_id, 1) > 0:
+            return # Alguien volvió justo antes de que venciera el plazo
+        self.reaped += 1
+        try:
+            paused = await self._on_idle(guild_id)
+        except Exception as e:
+            print(f"Error liberando la sesión sin oyentes del guild {guild_id}: {e}")
+            return
+        if paused and guild_id in self._channels:
+            self._paused.add(guild_id)
+            if self._listeners[guild_id] > 0:
+                self._update(guild_id) # Llegó alguien mientras se pausaba
+
+    def stats(self) -> dict:
+        return {
+            "watched": len(self._channels),
+            "empty": sum(1 for count in self._listeners.values() if count == 0),
+            "paused": len(self._paused),
+            "reaped": self.reaped,
+            "resumed": self.resumed,
+        }
@@ -0,0 +1,160 @@
+# --- Buffer de jitter entre la salida de ffmpeg y el reproductor de discord.py ---
+# Un hilo lee ffmpeg por adelantado y guarda los frames en memoria reservada una sola vez, así un
+# corte corto de red se cubre con lo que ya está en el buffer en vez de oírse como un hueco, y el
+# camino de 20 ms del reproductor no crea un objeto ``bytes`` nuevo por frame.
+import collections
+import ctypes
+import threading
+import time
+
+import discord
+from discord.opus import Encoder as OpusEncoder
+
+from audio_pipeline import OGG_OPUS_HEADERS, silence_frame
+
+
+class JitterBuffer(discord.AudioSource):
+    """Fuente que lee ``source`` en un hilo y la entrega con ``target_frames`` frames de margen.
+
+    En modo PCM los frames se escriben con ``readinto`` directo desde el stdout de ffmpeg sobre un
+    ``bytearray`` reservado al inicio y se entregan como vistas ``ctypes`` de ese mismo bloque (el
+    codificador Opus de discord.py usa ``ctypes.cast``, que no acepta ``memoryview``). En modo Opus
+    los paquetes ya vienen como ``bytes`` desde el demuxer Ogg y solo se guarda la referencia.
+
+    Si el buffer se vacía se entrega silencio y no se vuelve a sonar hasta juntar de nuevo
+    ``target_frames``; si se llena se descarta el frame más antiguo.
+    """
+
+    def __init__(self, source, target_frames: int = 15, max_frames: int = 75, underrun_timeout: float = 0.06):
+        self._source = source
+        self.max_frames = max(1, max_frames)
+        self.target_frames = min(max(0, target_frames), self.max_frames)
+        self._underrun_timeout = underrun_timeout
+        self._opus = source.is_opus()
+        self._silence = silence_frame(source)
+        # Un hueco extra para el frame que está usando el reproductor y otro para el que se está escribiendo
+        slot_count = self.max_frames + 2
+        if self._opus:
+            self._slots = [b''] * slot_count
+        else:
+            self._memory = bytearray(slot_count * OpusEncoder.FRAME_SIZE)
+            frame_type = ctypes.c_char * OpusEncoder.FRAME_SIZE
+            self._slots = [frame_type.from_buffer(self._memory, i * OpusEncoder.FRAME_SIZE) for i in range(slot_count)]
+        self._free = list(range(slot_count))
+        self._ready = collections.deque() # Índices de huecos con audio, en orden de llegada
+        self._held = None # Hueco entregado en la última lectura (el reproductor aún lo está usando)
+        self._buffering = self.target_frames > 0
+        self._cond = threading.Condition()
+        self._ended = False
+        self._closed = False
+        self.created_at = time.monotonic()
+        self.overruns = 0
+        self.underruns = 0
+        self.rebuffers = 0
+        self._thread = threading.Thread(target=self._read_ahead, daemon=True, name="jitter-buffer")
+        self._thread.start()
+
+    @property
+    def _current_error(self):
+        return getattr(self._source, "_current_error", None)
+
+    @property
+    def is_alive(self) -> bool:
+        return not self._ended and not self._closed
+
+    @property
+    def buffered_frames(self) -> int:
+        return len(self._ready)
+
+    def set_target(self, target_frames: int):
+        with self._cond:
+            self.target_frames = min(max(0, target_frames), self.max_frames)
+
+    def _read_ahead(self):
+        source = self._source
+        stdout = getattr(source, "_stdout", None) if isinstance(source, discord.FFmpegPCMAudio) else None
+        try:
+            while not self._closed:
+                with self._cond:
+                    index = self._free.pop() # Siempre queda uno: a lo sumo max_frames listos y uno en uso
+                if not self._write_frame(source, stdout, index):
+                    with self._cond:
+                        self._free.append(index)
+                    break
+                with self._cond:
+                    if len(self._ready) >= self.max_frames:
+                        # Lleno (reproductor en pausa o atrasado): se descarta el frame más antiguo, solo
+                        # cuando ya llegó uno nuevo que lo reemplace
+                        self._free.append(self._ready.popleft())
+                        self.overruns += 1
+                    self._ready.append(index)
+                    if self._buffering and len(self._ready) >= self.target_frames:
+                        self._buffering = False
+                    self._cond.notify()
+        except Exception as e:
+            if not self._closed:
+                print(f"Error leyendo ffmpeg en el buffer de jitter: {e}")
+        finally:
+            with self._cond:
+                self._ended = True
+                self._cond.notify_all()
+
+    def _write_frame(self, source, stdout, index: int) -> bool:
+        if self._opus:
+            data = source.read()
+            while data.startswith(OGG_OPUS_HEADERS):
+                data = source.read()
+            self._slots[index] = data
+            return bool(data)
+        if stdout is not None:
+            if stdout.readinto(self._slots[index]) == OpusEncoder.FRAME_SIZE:
+                return True
+            source._check_process_returncode() # Igual que FFmpegPCMAudio.read con una lectura incompleta
+            return False
+        data = source.read()
+        if len(data) != OpusEncoder.FRAME_SIZE:
+            return False
+        offset = index * OpusEncoder.FRAME_SIZE
+        self._memory[offset:offset + OpusEncoder.FRAME_SIZE] = data
+        return True
+
+    def read(self):
+        with self._cond:
+            if self._held is not None:
+                self._free.append(self._held) # El reproductor ya terminó con el frame anterior
+                self._held = None
+            if self._buffering and not self._ended:
+                return self._silence
+            if not self._ready and not self._ended:
+                self._cond.wait(self._underrun_timeout)
+            if self._ready:
+                self._held = self._ready.popleft()
+                return self._slots[self._held]
+            if self._ended or self._closed:
+                return b''
+            self.underruns += 1
+            if self.target_frames:
+                self.rebuffers += 1
+                self._buffering = True # Juntar margen otra vez antes de volver a sonar
+            return self._silence
+
+    def is_opus(self) -> bool:
+        return self._opus
+
+    def cleanup(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._source.cleanup()
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._ready),
+            "target": self.target_frames,
+            "max": self.max_frames,
+            "underruns": self.underruns,
+            "overruns": self.overruns,
+            "rebuffers": self.rebuffers,
+        }
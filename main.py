@@ -1,58 +1,265 @@
 import discord
 from discord.ext import commands
+from discord import app_commands
 import os
 from dotenv import load_dotenv
 from emisoras_data import PREDEFINED_STATIONS
+from station_catalog import StationCatalog, normalize_key
+from panel_updates import PanelUpdateScheduler, panel_fingerprint
+from audio_dsp import DSPSource, StationLoudness, dsp_available
+from audio_pipeline import PCM_SILENCE, PLAYBACK_OPUS, PLAYBACK_PCM, MonitoredSource, OpusCodecCache, create_opus_source, create_pcm_source, station_playback_mode
+from stream_prefetch import StreamPrefetchPool, WarmStream
+from jitter_buffer import JitterBuffer
+from station_broadcast import BroadcastHub
+from stream_resolver import StreamResolveError, StreamResolver
+from stream_supervisor import BackoffPolicy, StreamSupervisor, mirror_for_attempt
+from icy_metadata import IcyStreamReader, NowPlayingHub
+from ffmpeg_manager import FFmpegAdmissionError, FFmpegProcessManager, read_proc_usage
+from guild_state import GuildStateStore
+from startup_reconciler import GuildReconciler
+from gateway_profile import PROFILE_DEFAULT, PROFILE_LOW_MEMORY, PROFILES, gateway_options
+from idle_reaper import IDLE_ACTIONS, IDLE_DISCONNECT, IDLE_PAUSE, IdleSessionReaper
+from cluster_ipc import ClusterWorkerLink, format_shard_ids, parse_shard_ids, shard_for_guild
+from metrics import MetricsRegistry, MetricsServer, RateLimitLogCounter
+from radio_sessions import RadioSession, RadioSessionRegistry, DISCONNECTED_LABEL, NO_STATION_LABEL
 import asyncio
+import logging
+import math
+import time
+from urllib.parse import urlparse
 
 # Cargar variables de entorno
 load_dotenv()
 TOKEN = os.getenv('BOT_TOKEN')
 PREFIX = os.getenv('PREFIX', '!!')
+# "default": comandos con prefijo (lee todos los mensajes); "lowmem": solo comandos slash y el panel, cachés mínimas
+GATEWAY_PROFILE = os.getenv('RADIO_GATEWAY_PROFILE', PROFILE_DEFAULT).lower()
+if GATEWAY_PROFILE not in PROFILES:
+    print(f"RADIO_GATEWAY_PROFILE={GATEWAY_PROFILE!r} no existe (opciones: {', '.join(PROFILES)}); se usa {PROFILE_DEFAULT!r}.")
+    GATEWAY_PROFILE = PROFILE_DEFAULT
+# Registrar los comandos slash en Discord al arrancar (en "lowmem" no hay !!sincronizar: no se leen mensajes)
+SYNC_COMMANDS_ON_START = os.getenv('RADIO_SYNC_COMMANDS', '1' if GATEWAY_PROFILE == PROFILE_LOW_MEMORY else '0').lower() in ('1', 'true', 'yes', 'si', 'sí')
 
 DEDICATED_TEXT_CHANNEL_ID = os.getenv('DEDICATED_TEXT_ID')
 RADIO_CONTROLS_MESSAGE_ID = os.getenv('RADIO_CONTROLS_ID')
-
-# Configuración de Intents
-intents = discord.Intents.default()
-intents.guilds = True
-intents.voice_states = True
-intents.message_content = True
-
-bot = commands.Bot(command_prefix=PREFIX, intents=intents)
-
-# Almacenamiento global simple para el mensaje de controles y estado de radio
-# Para múltiples servidores, esto necesitaría ser un diccionario por guild_id
-controls_message_info = {"message_obj": None, "current_station_name": "Ninguna", "voice_channel_name": "Desconectado"}
+# Base SQLite con el panel, la emisora y el canal de voz de cada servidor (para retomar tras reiniciar)
+STATE_DB_PATH = os.getenv('RADIO_STATE_DB', 'radio_state.sqlite3')
+# Ventana (segundos) en la que se agrupan las actualizaciones del panel de un mismo servidor
+PANEL_UPDATE_WINDOW = float(os.getenv('PANEL_UPDATE_WINDOW', '0.75'))
+# Catálogo de emisoras adicional (JSON Lines: una emisora por línea con "name", "url", "genre", "country"...)
+STATION_CATALOG_PATH = os.getenv('RADIO_CATALOG_PATH')
+# Modo difusión: un solo ffmpeg/codificador Opus por emisora compartido entre todos los servidores
+BROADCAST_MODE = os.getenv('RADIO_BROADCAST_MODE', '0').lower() in ('1', 'true', 'yes', 'si', 'sí')
+BROADCAST_BUFFER_FRAMES = int(os.getenv('RADIO_BROADCAST_BUFFER_FRAMES', '250')) # 250 frames de 20 ms = 5 s
+
+# Modo de reproducción por defecto ("pcm" u "opus"); cada emisora puede fijar el suyo con la clave "playback"
+DEFAULT_PLAYBACK_MODE = os.getenv('RADIO_PLAYBACK_MODE', PLAYBACK_PCM).lower()
+OPUS_BITRATE = int(os.getenv('RADIO_OPUS_BITRATE', '128')) # kbps al codificar Opus dentro de ffmpeg
+
+# Streams en espera para cambiar de emisora al instante (0 = desactivado)
+PREFETCH_MAX_STREAMS = int(os.getenv('RADIO_PREFETCH_STREAMS', '0'))
+PREFETCH_MAX_MEMORY_MB = float(os.getenv('RADIO_PREFETCH_MEMORY_MB', '16'))
+PREFETCH_BUFFER_FRAMES = int(os.getenv('RADIO_PREFETCH_BUFFER_FRAMES', '50')) # 50 frames de 20 ms = 1 s
+
+# Buffer de jitter entre ffmpeg y el reproductor: margen que se junta antes de sonar y tope (0 = desactivado)
+JITTER_TARGET_FRAMES = int(os.getenv('RADIO_JITTER_TARGET_FRAMES', '15')) # 15 frames de 20 ms = 300 ms
+JITTER_MAX_FRAMES = int(os.getenv('RADIO_JITTER_MAX_FRAMES', '75')) # 75 frames de 20 ms = 1,5 s
+
+# Caché del resolvedor de URLs (playlists, redirecciones, espejos), en segundos
+RESOLVER_TTL = float(os.getenv('RADIO_RESOLVER_TTL', '300'))
+RESOLVER_NEGATIVE_TTL = float(os.getenv('RADIO_RESOLVER_NEGATIVE_TTL', '30'))
+
+# Supervisor de streams: segundos sin audio antes de reiniciar y espera exponencial con jitter entre intentos
+STALL_DEADLINE = float(os.getenv('RADIO_STALL_DEADLINE', '8'))
+STARTUP_DEADLINE = float(os.getenv('RADIO_STARTUP_DEADLINE', '15')) # Segundos para el primer frame de un stream nuevo
+RESTART_MAX_ATTEMPTS = int(os.getenv('RADIO_RESTART_MAX_ATTEMPTS', '8'))
+RESTART_BACKOFF_BASE = float(os.getenv('RADIO_RESTART_BACKOFF_BASE', '1'))
+RESTART_BACKOFF_CAP = float(os.getenv('RADIO_RESTART_BACKOFF_CAP', '60'))
+# Servidores que se reconcilian en paralelo al arrancar (cada uno hace varias llamadas a la API)
+RECONCILE_CONCURRENCY = int(os.getenv('RADIO_RECONCILE_CONCURRENCY', '5'))
+# Tope por servidor para que una conexión de voz colgada no retrase el informe de arranque
+RECONCILE_GUILD_TIMEOUT = float(os.getenv('RADIO_RECONCILE_GUILD_TIMEOUT', '30'))
+
+# Máximo de procesos ffmpeg simultáneos y segundos que un play espera en cola por un cupo
+FFMPEG_MAX_PROCESSES = int(os.getenv('FFMPEG_MAX_PROCESSES', '32'))
+FFMPEG_QUEUE_TIMEOUT = float(os.getenv('FFMPEG_QUEUE_TIMEOUT', '10'))
+
+# "Ahora suena": leer los metadatos ICY de la misma conexión del audio y segundos mínimos entre
+# ediciones del panel por cambio de título. Opcional: el stream pasa por el lector de Python en vez de
+# que ffmpeg abra la URL con sus -reconnect (ver README)
+ICY_METADATA = os.getenv('RADIO_ICY_METADATA', '0').lower() in ('1', 'true', 'yes', 'si', 'sí')
+NOW_PLAYING_MIN_INTERVAL = float(os.getenv('RADIO_NOW_PLAYING_INTERVAL', '15'))
+
+# --- Configuración de la etapa DSP (solo modo PCM, requiere NumPy) ---
+# Volumen por servidor, normalización de sonoridad por emisora y crossfade al cambiar de emisora
+DSP_ENABLED = os.getenv('RADIO_DSP', '0').lower() in ('1', 'true', 'yes', 'si', 'sí')
+if DSP_ENABLED and not dsp_available():
+    print("RADIO_DSP=1 necesita NumPy (pip install numpy); la etapa DSP queda desactivada.")
+    DSP_ENABLED = False
+DSP_NORMALIZE = os.getenv('RADIO_DSP_NORMALIZE', '1').lower() in ('1', 'true', 'yes', 'si', 'sí')
+DSP_TARGET_DBFS = float(os.getenv('RADIO_DSP_TARGET_DBFS', '-18')) # Nivel RMS común de todas las emisoras
+DSP_CROSSFADE_MS = int(os.getenv('RADIO_DSP_CROSSFADE_MS', '400')) # 0 = cambio directo
+DSP_BATCH_FRAMES = int(os.getenv('RADIO_DSP_BATCH_FRAMES', '5')) # Frames ya disponibles que se procesan juntos
+MAX_VOLUME_PERCENT = 200
+
+# --- Configuración de sesiones sin oyentes ---
+# Segundos con el canal de voz vacío antes de liberar la sesión (0 = nunca)
+IDLE_GRACE = float(os.getenv('RADIO_IDLE_GRACE', '120'))
+# "pause": deja de decodificar pero sigue en el canal y retoma al volver alguien; "disconnect": sale del canal
+IDLE_ACTION = os.getenv('RADIO_IDLE_ACTION', IDLE_PAUSE).lower().strip()
+if IDLE_ACTION not in IDLE_ACTIONS:
+    # Sin valor por defecto: con un error de tipeo ("disconect") el bot haría lo contrario de lo pedido
+    raise SystemExit(f"RADIO_IDLE_ACTION={IDLE_ACTION!r} no existe (opciones: {', '.join(IDLE_ACTIONS)}).")
+
+# --- Configuración de métricas (formato Prometheus) ---
+METRICS_PORT = int(os.getenv('RADIO_METRICS_PORT', '0')) # 0 = sin endpoint HTTP
+METRICS_HOST = os.getenv('RADIO_METRICS_HOST', '127.0.0.1')
+# Fracción de eventos frecuentes (ediciones del panel) que se registran en los histogramas
+METRICS_SAMPLE_RATE = float(os.getenv('RADIO_METRICS_SAMPLE_RATE', '1'))
+
+# --- Configuración de shards (la fija cluster.py para cada worker; sin ella, un solo proceso como siempre) ---
+SHARD_COUNT = int(os.getenv('RADIO_SHARD_COUNT', '0')) # 0 = sin shards explícitos
+SHARD_IDS = parse_shard_ids(os.getenv('RADIO_SHARD_IDS', '')) # "0-3" o "0,1,2"; vacío = todos los shards
+CLUSTER_ID = int(os.getenv('RADIO_CLUSTER_ID', '0'))
+CLUSTER_IPC = os.getenv('RADIO_CLUSTER_IPC') # host:puerto del canal IPC del lanzador
+
+FFMPEG_OPTIONS = {
+    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -nostdin',
+    'options': '-vn'
+}
+# Cuando el audio llega por stdin (IcyStreamReader) la reconexión la hace el lector, no ffmpeg
+FFMPEG_PIPE_OPTIONS = {
+    'before_options': '-nostdin',
+    'options': '-vn'
+}
+
+# Intents y cachés según el perfil (ver gateway_profile.py)
+if SHARD_COUNT:
+    # Un rango de shards por proceso (ver cluster.py); AutoShardedBot los mantiene sobre una sola conexión por shard
+    bot = commands.AutoShardedBot(command_prefix=PREFIX, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, **gateway_options(GATEWAY_PROFILE))
+else:
+    bot = commands.Bot(command_prefix=PREFIX, **gateway_options(GATEWAY_PROFILE))
+OWNED_SHARDS = frozenset(SHARD_IDS or range(SHARD_COUNT))
+
+def _owns_guild(guild_id: int) -> bool:
+    # Con shards, la base de estado es compartida entre workers: cada uno solo toca sus servidores
+    return not SHARD_COUNT or shard_for_guild(guild_id, SHARD_COUNT) in OWNED_SHARDS
+
+def _command_hint(name: str) -> str:
+    # Cómo se invoca un comando en el perfil actual (en "lowmem" los de prefijo no llegan)
+    return f"/{name}" if GATEWAY_PROFILE == PROFILE_LOW_MEMORY else f"{PREFIX}{name}"
+
+# Emisoras predefinidas + catálogo del archivo, indexado en segundo plano la primera vez que se necesita
+station_catalog = StationCatalog(PREDEFINED_STATIONS, path=STATION_CATALOG_PATH)
+
+# Estado de radio por servidor (panel, emisora, conexión de voz), indexado por guild_id
+radio_sessions = RadioSessionRegistry()
+
+def get_radio_session(guild: discord.Guild) -> RadioSession:
+    return radio_sessions.get_or_create(guild.id)
+
+guild_states = GuildStateStore(STATE_DB_PATH)
+
+# Sonoridad medida de cada emisora (etapa DSP), compartida por todos los servidores que la escuchan
+station_loudness = StationLoudness(target_dbfs=DSP_TARGET_DBFS) if DSP_ENABLED and DSP_NORMALIZE else None
+
+# --- Métricas ---
+metrics = MetricsRegistry(sample_rate=METRICS_SAMPLE_RATE)
+metrics_server = MetricsServer(metrics, host=METRICS_HOST, port=METRICS_PORT)
+interaction_latency = metrics.histogram("interaction_followup_seconds", "Tiempo entre el defer de una interacción y su respuesta.")
+panel_edit_latency = metrics.histogram("panel_edit_seconds", "Duración de cada edición del panel en la API de Discord.", sampled=True)
+first_audio_latency = metrics.histogram("time_to_first_audio_seconds", "Desde que se crea la fuente hasta su primer frame con audio.")
+discord_rate_limited = metrics.counter("discord_rate_limited", "Respuestas 429 de Discord reintentadas por discord.py.")
+logging.getLogger("discord.http").addHandler(RateLimitLogCounter(discord_rate_limited))
+metrics.gauge("voice_sessions", "Servidores con el bot conectado a voz.",
+              collect=lambda: sum(1 for s in radio_sessions if s.voice_client and s.voice_client.is_connected()))
+metrics.gauge("ffmpeg_processes", "Procesos ffmpeg activos.", collect=lambda: ffmpeg_processes.stats()["active"])
+metrics.gauge("idle_paused_sessions", "Sesiones en pausa porque su canal de voz quedó sin oyentes.",
+              collect=lambda: idle_reaper.stats()["paused"])
+metrics.gauge("ffmpeg_waiting", "Streams esperando cupo de ffmpeg.", collect=lambda: ffmpeg_processes.waiting)
+
+def _session_frame_metrics():
+    # Se leen los contadores que las fuentes ya llevan: el hilo de audio no paga nada extra por las métricas
+    sent, dropped = [], []
+    for session in radio_sessions:
+        source = _playing_source(session.voice_client)
+        if not isinstance(source, MonitoredSource):
+            continue
+        guild = {"guild": session.guild_id}
+        sent.append(({**guild, "kind": "audio"}, source.frames))
+        sent.append(({**guild, "kind": "silence"}, source.silent_frames))
+        inner = source.source
+        dropped.append((guild, inner.stats()["overruns"] if isinstance(inner, JitterBuffer) else getattr(inner, "frames_dropped", 0)))
+    yield "session_frames_total", "counter", "Frames entregados al reproductor por la fuente actual de cada sesión.", sent
+    yield "session_frames_dropped_total", "counter", "Frames descartados (buffer lleno u oyente atrasado) por la fuente actual.", dropped
+
+metrics.add_collector(_session_frame_metrics)
+
+def _save_guild_state(session: RadioSession):
+    # Al apagar, discord.py desconecta la voz él mismo: eso no cuenta como que el usuario pidió parar
+    if bot.is_closed():
+        return
+    guild = bot.get_guild(session.guild_id)
+    voice_state = guild.me.voice if guild and guild.me else None
+    panel = session.panel_message
+    guild_states.save(session.guild_id, {
+        "panel_channel_id": panel.channel.id if panel else None,
+        "panel_message_id": panel.id if panel else None,
+        "voice_channel_id": voice_state.channel.id if voice_state and voice_state.channel else None,
+        "station_key": session.station_key,
+        "station_name": session.station_name,
+        "stream_url": session.stream_url,
+        "playback_mode": session.playback_mode,
+        "volume_percent": round(session.volume * 100) if session.volume != 1.0 else None,
+    })
+
+def _dedicated_text_channel(guild: discord.Guild):
+    # El canal dedicado del .env solo pertenece a un servidor; en el resto el panel vive donde se envió con panelradio
+    if not DEDICATED_TEXT_CHANNEL_ID:
+        return None
+    try:
+        return guild.get_channel(int(DEDICATED_TEXT_CHANNEL_ID))
+    except ValueError:
+        return None
 
 # --- Función para Actualizar el Mensaje de Controles ---
-async def update_controls_message(guild: discord.Guild, error_message: str = None):
-    global controls_message_info
-    if not DEDICATED_TEXT_CHANNEL_ID or not controls_message_info["message_obj"]:
+async def update_controls_message(guild: discord.Guild, error_message: str = None, immediate: bool = False):
+    # Las ráfagas de llamadas (play, after del reproductor, voice_state...) se agrupan en una sola edición.
+    # Un error pedido dentro de la ventana no se pierde porque otra llamada sin error llegue detrás.
+    if error_message or not panel_updates.is_pending(guild.id):
+        get_radio_session(guild).last_error = error_message
+    if immediate:
+        await panel_updates.flush_now(guild)
+    else:
+        panel_updates.request(guild)
+
+async def _flush_controls_message(guild: discord.Guild):
+    session = get_radio_session(guild)
+    if not session.panel_message:
         # Intentar buscar el mensaje si el objeto no está cargado (ej. después de un reinicio antes de on_ready completo)
-        if DEDICATED_TEXT_CHANNEL_ID and RADIO_CONTROLS_MESSAGE_ID:
+        text_channel = _dedicated_text_channel(guild)
+        if text_channel and RADIO_CONTROLS_MESSAGE_ID:
             try:
-                text_channel = guild.get_channel(int(DEDICATED_TEXT_CHANNEL_ID))
-                controls_message_info["message_obj"] = await text_channel.fetch_message(int(RADIO_CONTROLS_MESSAGE_ID))
+                session.set_panel_message(await text_channel.fetch_message(int(RADIO_CONTROLS_MESSAGE_ID)))
             except:
-                print("No se pudo encontrar el mensaje de controles para actualizarlo.")
-                return # No se puede actualizar si no hay mensaje
+                print(f"No se pudo encontrar el mensaje de controles para actualizarlo en guild {guild.id}.")
+                return None # No se puede actualizar si no hay mensaje
         else:
-            return
+            return None
 
 
     # Actualizar estado de conexión de voz
     vc = guild.voice_client
+    session.voice_client = vc
     if vc and vc.is_connected():
-        controls_message_info["voice_channel_name"] = vc.channel.name
+        session.voice_channel_name = vc.channel.name
     else:
-        controls_message_info["voice_channel_name"] = "Desconectado 🚫"
-        controls_message_info["current_station_name"] = "Ninguna" # Si no está en voz, no suena nada
+        session.mark_disconnected() # Si no está en voz, no suena nada
 
     embed_color = discord.Color.gold()
-    if controls_message_info["current_station_name"] != "Ninguna" and controls_message_info["voice_channel_name"] != "Desconectado 🚫":
+    if session.current_station_name != NO_STATION_LABEL and session.voice_channel_name != DISCONNECTED_LABEL:
         embed_color = discord.Color.green()
-    elif controls_message_info["voice_channel_name"] == "Desconectado 🚫":
+    elif session.voice_channel_name == DISCONNECTED_LABEL:
         embed_color = discord.Color.red()
 
 
@@ -61,35 +268,203 @@ async def update_controls_message(guild: discord.Guild, error_message: str = Non
         description="Usa los controles de abajo para manejar la radio.",
         color=embed_color
     )
-    embed.add_field(name="🔊 Estado Conexión de Voz", value=f"`{controls_message_info['voice_channel_name']}`", inline=True)
-    embed.add_field(name="🎶 Actualmente Sonando", value=f"`{controls_message_info['current_station_name']}`", inline=True)
-
-    if error_message:
-        embed.add_field(name="⚠️ Último Error", value=error_message, inline=False)
+    embed.add_field(name="🔊 Estado Conexión de Voz", value=f"`{session.voice_channel_name}`", inline=True)
+    now_playing_title, icy_station_name = now_playing.current(session.now_playing_key)
+    current_station_label = session.current_station_name
+    if icy_station_name and session.station_key is None and current_station_label == session.station_name:
+        current_station_label = icy_station_name # URL directa: mejor el nombre que anuncia el servidor
+    embed.add_field(name="🎶 Actualmente Sonando", value=f"`{current_station_label}`", inline=True)
+    if now_playing_title and session.now_playing_key:
+        embed.add_field(name="🎵 Ahora Suena", value=now_playing_title[:1024], inline=False)
+
+    station_keys, session.catalog_page, has_next = station_catalog.page(session.catalog_query, session.catalog_page)
+    navigation = len(station_catalog) > 25 or bool(session.catalog_query)
+    if navigation:
+        catalog_status = f"Página {session.catalog_page + 1} · {len(station_catalog)} emisoras"
+        if session.catalog_query:
+            catalog_status = f"Filtro `{session.catalog_query}`: página {session.catalog_page + 1}" if station_keys else f"Sin resultados para `{session.catalog_query}`"
+        embed.add_field(name="📚 Catálogo", value=catalog_status, inline=False)
+
+    if session.last_error:
+        embed.add_field(name="⚠️ Último Error", value=session.last_error, inline=False)
         embed.color = discord.Color.orange() # Cambiar color si hay error
 
-    embed.set_footer(text=f"Bot {bot.user.name} | {PREFIX}help")
+    embed.set_footer(text=f"Bot {bot.user.name} | {_command_hint('radio' if GATEWAY_PROFILE == PROFILE_LOW_MEMORY else 'help')}")
     embed.set_thumbnail(url="https://cdn-icons-png.flaticon.com/512/2907/2907109.png") # Ejemplo de Thumbnail
 
-    view = PersistentRadioControlsView(PREDEFINED_STATIONS) # Siempre reenviar la vista para asegurar que esté activa
+    # Siempre reenviar la vista para asegurar que esté activa
+    view = PersistentRadioControlsView(station_keys, has_previous=session.catalog_page > 0, has_next=has_next, navigation=navigation)
+
+    fingerprint = panel_fingerprint(embed, view)
+    if fingerprint == session.panel_fingerprint:
+        return False # Nada visible cambió, no gastamos una llamada a la API
 
     try:
-        if controls_message_info["message_obj"]:
-            await controls_message_info["message_obj"].edit(content=None, embed=embed, view=view)
+        with panel_edit_latency.time():
+            await session.panel_message.edit(content=None, embed=embed, view=view)
+        session.panel_fingerprint = fingerprint
+        return True
     except discord.NotFound:
-        print("El mensaje de controles original fue borrado. Se intentará recrear en la próxima ejecución de on_ready si RADIO_CONTROLS_MESSAGE_ID está vacío.")
-        controls_message_info["message_obj"] = None # Marcar como no encontrado
+        print(f"El mensaje de controles del guild {guild.id} fue borrado. Usa {_command_hint('panelradio')} para recrearlo.")
+        session.set_panel_message(None) # Marcar como no encontrado
+        _save_guild_state(session)
     except Exception as e:
         print(f"Error al editar el mensaje de controles: {e}")
+    return None
+
+panel_updates = PanelUpdateScheduler(_flush_controls_message, window=PANEL_UPDATE_WINDOW)
+
+def _panel_update_metrics():
+    stats = panel_updates.stats()
+    yield ("panel_updates_total", "counter", "Actualizaciones del panel pedidas, según cómo terminaron (enviada, fusionada, sin cambios).",
+           [({"result": result}, stats[result]) for result in ("requested", "sent", "coalesced", "skipped")])
+    yield "panel_updates_pending", "gauge", "Servidores con una actualización del panel esperando su ventana.", [({}, stats["pending"])]
+
+metrics.add_collector(_panel_update_metrics)
+
+# --- Resolución de URLs (playlists .pls/.m3u/.m3u8, redirecciones, espejos) ---
+stream_resolver = StreamResolver(ttl=RESOLVER_TTL, negative_ttl=RESOLVER_NEGATIVE_TTL)
+
+# --- Difusión compartida por emisora (modo RADIO_BROADCAST_MODE) ---
+opus_codecs = OpusCodecCache() # Códec sondeado por URL (copia directa si la emisora ya es Opus)
+
+# --- Metadatos ICY ("ahora suena") ---
+def _on_now_playing(stream_url: str, title, station_name):
+    # Un cambio de título se publica a los servidores sintonizados en ese stream (índice por clave)
+    for guild_id in radio_sessions.now_playing_guilds(stream_url):
+        session = radio_sessions.get(guild_id)
+        if session.panel_message:
+            guild = bot.get_guild(guild_id)
+            if guild:
+                panel_updates.request(guild) # Sin tocar last_error: un título nuevo no borra un error
+
+now_playing = NowPlayingHub(_on_now_playing, min_interval=NOW_PLAYING_MIN_INTERVAL)
+
+def _icy_stream(url: str):
+    # Lector con metadatos ICY para streams HTTP directos; None si ffmpeg debe abrir la URL (archivos, HLS)
+    if not ICY_METADATA or urlparse(url).scheme not in ("http", "https"):
+        return None
+    if urlparse(url).path.lower().endswith((".m3u8", ".m3u", ".pls")):
+        return None
+    on_metadata, on_close = now_playing.reader_callbacks(url)
+    return IcyStreamReader(url, on_metadata=on_metadata, on_close=on_close)
+
+def _create_ffmpeg_source(url: str, playback_mode: str):
+    stream = _icy_stream(url)
+    ffmpeg_options = FFMPEG_PIPE_OPTIONS if stream is not None else FFMPEG_OPTIONS
+    if playback_mode == PLAYBACK_OPUS:
+        return create_opus_source(url, ffmpeg_options, codec=opus_codecs.cached(url), bitrate=OPUS_BITRATE, stream=stream)
+    return create_pcm_source(url, ffmpeg_options, stream=stream)
+
+def _broadcast_source_factory(url: str):
+    # ffmpeg produce Opus una sola vez por emisora; los frames se reparten a todos los oyentes
+    return _create_ffmpeg_source(url, PLAYBACK_OPUS)
+
+station_broadcasts = BroadcastHub(_broadcast_source_factory, capacity=BROADCAST_BUFFER_FRAMES)
+
+# --- Gestor de procesos ffmpeg (límite global y cola de admisión) ---
+def _ffmpeg_owner_alive(owner) -> bool:
+    # Los procesos de un servidor solo tienen sentido mientras el bot siga en voz allí;
+    # los de difusiones y streams en espera se limpian solos al detenerse
+    if isinstance(owner, int):
+        guild = bot.get_guild(owner)
+        return bool(guild and guild.voice_client and guild.voice_client.is_connected())
+    return True
+
+ffmpeg_processes = FFmpegProcessManager(max_processes=FFMPEG_MAX_PROCESSES, queue_timeout=FFMPEG_QUEUE_TIMEOUT, owner_alive=_ffmpeg_owner_alive)
+
+def _spawn_station_source(url: str, name: str, playback_mode: str, slot):
+    # Lanza el ffmpeg con un cupo ya concedido. El códec ya debe estar sondeado (opus_codecs.probe)
+    # si el modo es Opus o difusión.
+    try:
+        if BROADCAST_MODE:
+            # Se comparte la conexión y la codificación con los demás servidores que escuchan esta emisora
+            source = station_broadcasts.listen(url, name, on_start=slot.bind)
+        else:
+            source = slot.bind(_create_ffmpeg_source(url, playback_mode))
+    except Exception:
+        slot.release()
+        raise
+    if slot.process is None:
+        slot.release() # Otro servidor ya había arrancado la difusión: no se lanzó ningún ffmpeg
+    return source
+
+async def _open_station_source(url: str, name: str, playback_mode: str, owner):
+    # Devuelve (fuente, cupo del ffmpeg propio o None si es una difusión compartida)
+    if BROADCAST_MODE:
+        if station_broadcasts.is_live(url):
+            return station_broadcasts.listen(url, name), None
+        slot = await ffmpeg_processes.admit(("difusion", url), label=name)
+        return _spawn_station_source(url, name, playback_mode, slot), None
+    slot = await ffmpeg_processes.admit(owner, label=name)
+    source = _spawn_station_source(url, name, playback_mode, slot)
+    if JITTER_MAX_FRAMES > 0:
+        # La difusión ya lee por adelantado en su propio anillo; aquí cada servidor tiene su ffmpeg
+        source = JitterBuffer(source, target_frames=JITTER_TARGET_FRAMES, max_frames=JITTER_MAX_FRAMES)
+    return source, slot
+
+def _retire_source(source, delay: float = 0.5):
+    # El hilo del reproductor puede estar aún dentro de source.read(): se limpia un poco después
+    if source is not None:
+        source.retired = True
+        bot.loop.call_later(delay, lambda: bot.loop.run_in_executor(None, source.cleanup))
+
+def _retire_after_crossfade(source):
+    # Llamado desde el hilo del reproductor cuando termina el crossfade
+    try:
+        bot.loop.call_soon_threadsafe(_retire_source, source)
+    except RuntimeError: # Event loop cerrado (apagando): limpiar aquí mismo
+        source.cleanup()
+
+def _playing_source(voice_client):
+    # Fuente monitoreada que está sonando (debajo de la etapa DSP, si la hay)
+    source = voice_client.source if voice_client else None
+    return source.source if isinstance(source, DSPSource) else source
+
+def _log_first_frame(source: MonitoredSource, elapsed: float):
+    first_audio_latency.observe(elapsed)
+    print(f"Primer frame de {source.label} en {elapsed * 1000:.0f} ms.")
+
+# --- Streams en espera (RADIO_PREFETCH_STREAMS) ---
+def _prefetch_factory(station_key: str):
+    station_data = station_catalog.get(station_key)
+    playback_mode = station_playback_mode(station_data, DEFAULT_PLAYBACK_MODE)
+    url = stream_resolver.cached(station_data["url"]) or station_data["url"]
+    if BROADCAST_MODE and station_broadcasts.is_live(url):
+        return station_broadcasts.listen(url, station_data["name"]) # Basta con mantener viva la difusión compartida
+    # Los streams en espera nunca se adelantan a la cola de usuarios que esperan un ffmpeg
+    owner = ("difusion", url) if BROADCAST_MODE else ("espera", station_key)
+    slot = ffmpeg_processes.try_admit(owner, label=f"{station_data['name']} (en espera)")
+    if slot is None:
+        raise FFmpegAdmissionError("sin cupo de ffmpeg libre")
+    source = _spawn_station_source(url, station_data["name"], playback_mode, slot)
+    if BROADCAST_MODE:
+        return source
+    # El tope de memoria reparte el buffer entre todos los streams en espera
+    max_frames = int(PREFETCH_MAX_MEMORY_MB * 1024 * 1024 // (max(PREFETCH_MAX_STREAMS, 1) * len(PCM_SILENCE)))
+    warm = WarmStream(source, max_frames=max(5, min(PREFETCH_BUFFER_FRAMES, max_frames)))
+    warm.slot = slot
+    return warm
+
+stream_prefetch = StreamPrefetchPool(_prefetch_factory, max_streams=PREFETCH_MAX_STREAMS, exclusive=not BROADCAST_MODE)
+stream_prefetch.set_candidates(station_catalog.keys(25)) # Las mismas que muestra la primera página del menú StationSelect
 
 # --- Función Auxiliar para Reproducir Audio (modificada para actualizar panel) ---
-async def _play_station_logic(interaction_or_ctx, station_key_or_url: str):
-    global controls_message_info
+async def _play_station_logic(interaction_or_ctx, station_key_or_url: str, latency_component: str = None):
+    # Con ``latency_component`` (llamar justo después del defer) se mide hasta la respuesta efímera, no
+    # lo que viene después (edición del panel, prefetch)
     is_interaction = isinstance(interaction_or_ctx, discord.Interaction)
+    deferred_at = time.perf_counter()
+
+    async def send_followup(text: str):
+        await interaction_or_ctx.followup.send(text, ephemeral=True)
+        if latency_component:
+            interaction_latency.observe(time.perf_counter() - deferred_at, component=latency_component)
 
     user = interaction_or_ctx.user if is_interaction else interaction_or_ctx.author
     guild = interaction_or_ctx.guild
-    voice_client = guild.voice_client
+    session = get_radio_session(guild)
+    voice_client = session.voice_client = guild.voice_client
 
     error_to_display_on_panel = None
 
@@ -97,7 +472,7 @@ async def _play_station_logic(interaction_or_ctx, station_key_or_url: str):
         error_to_display_on_panel = f"No estoy en un canal de voz. Usa el botón 'Conectarse'."
         if is_interaction:
             # El defer ya se hizo, ahora usamos followup para el mensaje efímero
-            await interaction_or_ctx.followup.send(error_to_display_on_panel, ephemeral=True)
+            await send_followup(error_to_display_on_panel)
         else:
             await interaction_or_ctx.send(error_to_display_on_panel)
         await update_controls_message(guild, error_message=error_to_display_on_panel)
@@ -105,75 +480,232 @@ async def _play_station_logic(interaction_or_ctx, station_key_or_url: str):
 
     if user.voice is None or user.voice.channel != voice_client.channel:
         error_to_display_on_panel = f"Debes estar en mi mismo canal ({voice_client.channel.mention}) para cambiar la emisora."
-        if is_interaction: await interaction_or_ctx.followup.send(error_to_display_on_panel, ephemeral=True)
+        if is_interaction: await send_followup(error_to_display_on_panel)
         else: await interaction_or_ctx.send(error_to_display_on_panel)
         await update_controls_message(guild, error_message=error_to_display_on_panel)
         return
 
-    if voice_client.is_playing() or voice_client.is_paused():
-        voice_client.stop()
-        await asyncio.sleep(0.5)
-
     actual_stream_url = ""
     station_display_name_for_panel = "Desconocida"
-    input_key = station_key_or_url.lower().strip()
-
-    if input_key in PREDEFINED_STATIONS:
-        station_data = PREDEFINED_STATIONS[input_key]
+    playback_mode = station_playback_mode(None, DEFAULT_PLAYBACK_MODE)
+    input_key = station_key_or_url.strip()
+    station_key = None
+
+    await station_catalog.ensure_loaded()
+    if input_key not in station_catalog:
+        input_key = normalize_key(input_key) # Las claves del catálogo van en minúsculas
+    if input_key not in station_catalog and "://" not in input_key:
+        # Ni clave ni URL: se toma la emisora que mejor calce con el texto ("rock and pop", "cooperativa")
+        input_key = next(iter(station_catalog.search(input_key, limit=1)), input_key)
+
+    if input_key in station_catalog:
+        station_key = input_key
+        station_data = station_catalog.get(input_key)
         actual_stream_url = station_data["url"]
         station_display_name_for_panel = station_data["name"]
+        playback_mode = station_playback_mode(station_data, DEFAULT_PLAYBACK_MODE)
     else:
         actual_stream_url = station_key_or_url.strip("<>")
         station_display_name_for_panel = "URL Directa" # O podrías intentar obtener un título si es un stream con metadata
 
     if not actual_stream_url:
         error_to_display_on_panel = f"No pude determinar una URL para: `{station_key_or_url}`."
-        if is_interaction: await interaction_or_ctx.followup.send(error_to_display_on_panel, ephemeral=True)
+        if is_interaction: await send_followup(error_to_display_on_panel)
         else: await interaction_or_ctx.send(error_to_display_on_panel)
         await update_controls_message(guild, error_message=error_to_display_on_panel)
         return
 
-    ffmpeg_options = {
-        'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -nostdin',
-        'options': '-vn'
-    }
-
     try:
-        audio_source = discord.FFmpegPCMAudio(actual_stream_url, **ffmpeg_options)
-        if not voice_client.is_playing():
-            voice_client.play(audio_source, after=lambda e: asyncio.run_coroutine_threadsafe(after_playback_error_handler(guild, e, station_display_name_for_panel), bot.loop))
-
-            controls_message_info["current_station_name"] = station_display_name_for_panel
-            if is_interaction: # El mensaje efímero de defer ya se envió. Solo actualizamos panel.
-                 await interaction_or_ctx.followup.send(f"✅ Sintonizando: **{station_display_name_for_panel}**",ephemeral=True)
-            else: # Para comando !play
-                await interaction_or_ctx.send(f"🎧 ¡Reproduciendo ahora: **{station_display_name_for_panel}** en {voice_client.channel.mention}!")
-
-            await update_controls_message(guild) # Actualiza el panel con la nueva emisora
-
+        await _start_station_playback(guild, voice_client, session, actual_stream_url, station_display_name_for_panel, playback_mode, station_key=station_key)
+        # A partir de aquí el supervisor puede recuperar esta emisora si el stream se corta
+        session.set_station(station_key, station_display_name_for_panel, actual_stream_url, playback_mode)
+        _save_guild_state(session)
+
+        if is_interaction: # El mensaje efímero de defer ya se envió. Solo actualizamos panel.
+             await send_followup(f"✅ Sintonizando: **{station_display_name_for_panel}**")
+        else: # Para comando !play
+            await interaction_or_ctx.send(f"🎧 ¡Reproduciendo ahora: **{station_display_name_for_panel}** en {voice_client.channel.mention}!")
+
+        await update_controls_message(guild) # Actualiza el panel con la nueva emisora
+        stream_prefetch.refresh() # Reponer el stream en espera que se acaba de usar
+
+    except FFmpegAdmissionError as e:
+        print(f"Admisión de ffmpeg rechazada en guild {guild.id}: {e}")
+        error_to_display_on_panel = "🚦 Hay demasiadas radios sonando ahora mismo, intenta de nuevo en unos segundos."
+        if is_interaction: await send_followup(error_to_display_on_panel)
+        else: await interaction_or_ctx.send(error_to_display_on_panel)
+        await update_controls_message(guild, error_message=error_to_display_on_panel)
+    except StreamResolveError as e:
+        error_to_display_on_panel = f"No pude abrir **{station_display_name_for_panel}**: `{e}`"
+        if is_interaction: await send_followup(error_to_display_on_panel)
+        else: await interaction_or_ctx.send(error_to_display_on_panel)
+        await update_controls_message(guild, error_message=error_to_display_on_panel)
     except Exception as e:
         print(f"Critical error playing ({station_display_name_for_panel}): {e}")
         error_message_str = str(e)
         error_to_display_on_panel = f"No pude reproducir **{station_display_name_for_panel}**. Error: `{error_message_str}`"
-        if is_interaction: await interaction_or_ctx.followup.send(error_to_display_on_panel, ephemeral=True)
+        if is_interaction: await send_followup(error_to_display_on_panel)
         else: await interaction_or_ctx.send(error_to_display_on_panel)
-        controls_message_info["current_station_name"] = "Error al reproducir"
+        session.current_station_name = "Error al reproducir"
         await update_controls_message(guild, error_message=error_to_display_on_panel)
 
+async def _start_station_playback(guild: discord.Guild, voice_client, session: RadioSession, stream_url: str,
+                                  station_name: str, playback_mode: str, station_key: str = None, use_prefetch: bool = True):
+    # Crea la fuente de la emisora y la pone a sonar (o la intercambia por la actual, sin cortar el reproductor)
+    stream_url = await stream_resolver.resolve(stream_url) # Expande playlists y sigue redirecciones (cacheado con TTL)
+    if BROADCAST_MODE or playback_mode == PLAYBACK_OPUS:
+        # Sondeo del códec (cacheado por URL): si ya es Opus, ffmpeg solo copia los paquetes
+        await opus_codecs.probe(stream_url)
+    audio_source = slot = None
+    if station_key and use_prefetch:
+        stream_prefetch.record_selection(station_key)
+        audio_source = stream_prefetch.claim(station_key) # Stream ya conectado y con buffer, si lo hay
+        if audio_source is not None:
+            slot = audio_source.slot
+            slot.transfer(guild.id)
+            audio_source.set_target(JITTER_TARGET_FRAMES) # Desde ahora se comporta como el buffer de jitter
+    if audio_source is None:
+        audio_source, slot = await _open_station_source(stream_url, station_name, playback_mode, owner=guild.id)
+    monitored = audio_source = MonitoredSource(audio_source, station_name, on_first_frame=_log_first_frame,
+                                               on_cleanup=slot.release_threadsafe if slot else None)
+    if DSP_ENABLED and not monitored.is_opus():
+        jitter = monitored.source if isinstance(monitored.source, JitterBuffer) else None
+        audio_source = DSPSource(monitored, volume=session.volume, loudness=station_loudness, loudness_key=station_key or stream_url,
+                                 batch_frames=DSP_BATCH_FRAMES, buffered=(lambda: jitter.buffered_frames) if jitter else None)
+
+    if voice_client.is_playing() or voice_client.is_paused():
+        # Cambio de emisora: se intercambia la fuente del reproductor en marcha, sin pausa fija
+        old_source = voice_client.source
+        if DSP_CROSSFADE_MS > 0 and isinstance(audio_source, DSPSource) and isinstance(old_source, DSPSource):
+            # La anterior sigue sonando hasta que la nueva tenga audio y luego se cruzan
+            old_source.retired = True
+            audio_source.crossfade_from(old_source, frames=max(1, DSP_CROSSFADE_MS // 20), on_done=_retire_after_crossfade)
+            voice_client.source = audio_source
+        else:
+            voice_client.source = audio_source
+            _retire_source(old_source)
+    else:
+        voice_client.play(audio_source, after=lambda e: asyncio.run_coroutine_threadsafe(after_playback_error_handler(guild, e, session.station_name or session.current_station_name), bot.loop))
+
+    session.current_station_name = station_name
+    session.idle_paused = False
+    session.now_playing_key = stream_url # Metadatos ICY del stream que de verdad está sonando
+    stream_supervisor.watch(guild.id, monitored, station_name)
+    return monitored
+
+def _stop_station_playback(session: RadioSession):
+    # El usuario pidió parar: olvidar la emisora para que el supervisor no la recupere (ni al reiniciar)
+    session.clear_station()
+    stream_supervisor.unwatch(session.guild_id)
+    _save_guild_state(session)
+
 async def after_playback_error_handler(guild: discord.Guild, error, station_name: str):
+    session = get_radio_session(guild)
     if error:
         print(f'Error del reproductor para {station_name} en guild {guild.id}: {error}')
-        controls_message_info["current_station_name"] = f"Error en {station_name}"
     else: # Reproducción terminó normalmente (o fue detenida)
-        # No necesariamente significa que debamos poner "Ninguna", podría haber sido detenida para cambiar.
-        # La lógica de stop/play se encarga de poner la nueva.
-        # Si un stream termina por sí solo (muy raro para radio), entonces sí.
         print(f"Reproducción de {station_name} finalizada en guild {guild.id}.")
-        # Si queremos que al terminar un stream se ponga "Ninguna"
-        # if guild.voice_client and not guild.voice_client.is_playing():
-        # controls_message_info["current_station_name"] = "Ninguna"
+    if session.idle_paused:
+        return # La detuvo el reaper por falta de oyentes: ya actualizó el panel
+
+    vc = guild.voice_client
+    if session.stream_url and vc and vc.is_connected():
+        # Nadie pidió parar: el stream se cortó solo, el supervisor lo vuelve a levantar
+        session.current_station_name = f"Reconectando {station_name}..."
+        stream_supervisor.report_failure(guild.id, str(error) if error else "el stream terminó")
+        await update_controls_message(guild)
+        return
+
+    if error:
+        session.current_station_name = f"Error en {station_name}"
     await update_controls_message(guild, error_message=str(error) if error else None)
 
+# --- Supervisor de streams: detección de cortes y failover a espejos ---
+def _station_stream_urls(session: RadioSession) -> list:
+    # URL principal y espejos de la emisora (clave "mirrors" en emisoras_data.py)
+    station_data = station_catalog.get(session.station_key) if session.station_key else None
+    if station_data:
+        return [station_data["url"], *station_data.get("mirrors", ())]
+    return [session.stream_url]
+
+async def _restart_station_playback(guild_id: int, attempt: int):
+    guild = bot.get_guild(guild_id)
+    session = radio_sessions.get(guild_id)
+    if guild is None or session is None or not session.stream_url:
+        return False
+    voice_client = guild.voice_client
+    if not voice_client or not voice_client.is_connected():
+        return False
+    urls = _station_stream_urls(session)
+    url = mirror_for_attempt(urls, attempt)
+    if BROADCAST_MODE:
+        station_broadcasts.drop_stalled(stream_resolver.cached(url) or url, STALL_DEADLINE)
+    print(f"Reiniciando {session.station_name} en guild {guild_id} (intento {attempt + 1}, {url}).")
+    await _start_station_playback(guild, voice_client, session, url, session.station_name, session.playback_mode,
+                                  station_key=session.station_key, use_prefetch=attempt == 0)
+    await update_controls_message(guild)
+    return True
+
+async def _on_recovery_give_up(guild_id: int, reason: str):
+    guild = bot.get_guild(guild_id)
+    session = radio_sessions.get(guild_id)
+    if guild is None or session is None:
+        return
+    session.current_station_name = f"Error en {session.station_name}"
+    _stop_station_playback(session)
+    await update_controls_message(guild, error_message=f"No pude recuperar la emisora: {reason}")
+
+stream_supervisor = StreamSupervisor(
+    _restart_station_playback, stall_deadline=STALL_DEADLINE, startup_deadline=STARTUP_DEADLINE, max_attempts=RESTART_MAX_ATTEMPTS,
+    backoff=BackoffPolicy(base=RESTART_BACKOFF_BASE, cap=RESTART_BACKOFF_CAP), on_give_up=_on_recovery_give_up
+)
+
+
+# --- Sesiones sin oyentes ---
+def _human_listeners(channel) -> int:
+    return sum(1 for member in channel.members if not member.bot)
+
+async def _on_session_idle(guild_id: int) -> bool:
+    guild = bot.get_guild(guild_id)
+    session = radio_sessions.get(guild_id)
+    voice_client = guild.voice_client if guild else None
+    if session is None or voice_client is None or not voice_client.is_connected():
+        return False
+    if IDLE_ACTION == IDLE_DISCONNECT or not session.stream_url:
+        print(f"Nadie escucha en {voice_client.channel.name} ({guild.name}): desconectando.")
+        _stop_station_playback(session)
+        await voice_client.disconnect() # on_voice_state_update actualiza el panel
+        return False
+    print(f"Nadie escucha en {voice_client.channel.name} ({guild.name}): radio en pausa.")
+    # Se conserva la emisora pero se suelta ffmpeg, el buffer y la codificación hasta que vuelva alguien
+    session.idle_paused = True
+    stream_supervisor.unwatch(guild_id)
+    voice_client.stop()
+    ffmpeg_processes.release_owner(guild_id)
+    session.current_station_name = f"{session.station_name} (en pausa, sin oyentes)"
+    await update_controls_message(guild)
+    return True
+
+async def _on_listener_return(guild_id: int):
+    guild = bot.get_guild(guild_id)
+    session = radio_sessions.get(guild_id)
+    voice_client = guild.voice_client if guild else None
+    if session is None or not session.idle_paused or not session.stream_url or voice_client is None or not voice_client.is_connected():
+        return
+    print(f"Volvió un oyente a {voice_client.channel.name} ({guild.name}): retomando {session.station_name}.")
+    try:
+        await _start_station_playback(guild, voice_client, session, session.stream_url, session.station_name,
+                                      session.playback_mode, station_key=session.station_key)
+    except Exception as e:
+        print(f"No se pudo retomar la radio en guild {guild_id}: {e}")
+        session.idle_paused = False
+        _stop_station_playback(session)
+        await update_controls_message(guild, error_message=f"No pude retomar la emisora: {e}")
+        return
+    await update_controls_message(guild)
+
+idle_reaper = IdleSessionReaper(_on_session_idle, _on_listener_return, grace=IDLE_GRACE)
+
 
 # --- Clases para la Vista de Controles Persistentes ---
 class JoinVoiceButton(discord.ui.Button):
@@ -181,9 +713,9 @@ class JoinVoiceButton(discord.ui.Button):
         super().__init__(label="Conectarme a Voz", style=discord.ButtonStyle.green, custom_id="persistent_join_voice_button", emoji="🎤")
 
     async def callback(self, interaction: discord.Interaction):
-        global controls_message_info
         user = interaction.user
         guild = interaction.guild
+        session = get_radio_session(guild)
         voice_client = guild.voice_client
         error_to_display = None
 
@@ -194,26 +726,28 @@ class JoinVoiceButton(discord.ui.Button):
         user_voice_channel = user.voice.channel
 
         await interaction.response.defer(ephemeral=True, thinking=True) # Deferir porque conectar puede tardar
+        deferred_at = time.perf_counter()
 
         if voice_client is None:
             try:
-                await user_voice_channel.connect()
-                controls_message_info["voice_channel_name"] = user_voice_channel.name
+                session.voice_client = await user_voice_channel.connect()
+                session.voice_channel_name = user_voice_channel.name
                 await interaction.followup.send(f"✅ ¡Conectado a **{user_voice_channel.name}**! Ahora puedes seleccionar una emisora.", ephemeral=True)
             except Exception as e:
                 error_to_display = f"🛑 No pude unirme a tu canal: {e}"
                 await interaction.followup.send(error_to_display, ephemeral=True)
         elif voice_client.channel == user_voice_channel:
-            controls_message_info["voice_channel_name"] = user_voice_channel.name # Asegurar que esté actualizado
+            session.voice_channel_name = user_voice_channel.name # Asegurar que esté actualizado
             await interaction.followup.send(f"👍 Ya estoy en tu canal: **{user_voice_channel.name}**.", ephemeral=True)
         else:
             try:
                 await voice_client.move_to(user_voice_channel)
-                controls_message_info["voice_channel_name"] = user_voice_channel.name
+                session.voice_channel_name = user_voice_channel.name
                 await interaction.followup.send(f"✅ Me he movido a tu canal: **{user_voice_channel.name}**.", ephemeral=True)
             except Exception as e:
                 error_to_display = f"🛑 No pude moverme a tu canal: {e}"
                 await interaction.followup.send(error_to_display, ephemeral=True)
+        interaction_latency.observe(time.perf_counter() - deferred_at, component="join_voice")
 
         await update_controls_message(guild, error_message=error_to_display)
 
@@ -222,18 +756,18 @@ class StopAndLeaveButton(discord.ui.Button):
         super().__init__(label="Detener y Salir", style=discord.ButtonStyle.red, custom_id="persistent_stop_leave_button", emoji="✖️")
 
     async def callback(self, interaction: discord.Interaction):
-        global controls_message_info
         guild = interaction.guild
+        session = get_radio_session(guild)
         voice_client = guild.voice_client
 
         await interaction.response.defer(ephemeral=True, thinking=True)
 
         if voice_client and voice_client.is_connected():
+            _stop_station_playback(session)
             if voice_client.is_playing():
                 voice_client.stop()
             await voice_client.disconnect()
-            controls_message_info["current_station_name"] = "Ninguna"
-            controls_message_info["voice_channel_name"] = "Desconectado 🚫"
+            session.mark_disconnected()
             await interaction.followup.send("👋 Radio detenida y me he desconectado.", ephemeral=True)
         else:
             await interaction.followup.send("⚠️ No estoy conectado a ningún canal de voz.", ephemeral=True)
@@ -243,10 +777,9 @@ class StopAndLeaveButton(discord.ui.Button):
 
 class StationSelect(discord.ui.Select):
     def __init__(self, options_list, placeholder_text):
-        super().__init__(custom_id="persistent_station_select_menu", placeholder=placeholder_text, min_values=1, max_values=1, options=options_list)
+        super().__init__(custom_id="persistent_station_select_menu", placeholder=placeholder_text, min_values=1, max_values=1, options=options_list, row=1)
 
     async def callback(self, interaction: discord.Interaction):
-        global controls_message_info
         selected_station_key = self.values[0]
 
         if not interaction.guild.voice_client or not interaction.guild.voice_client.is_connected():
@@ -256,114 +789,245 @@ class StationSelect(discord.ui.Select):
             await interaction.response.send_message(f"⚠️ Debes estar en mi mismo canal de voz ({interaction.guild.voice_client.channel.mention}) para cambiar la emisora.", ephemeral=True)
             return
 
-        station_name_for_feedback = PREDEFINED_STATIONS.get(selected_station_key, {}).get("name", selected_station_key)
         await interaction.response.defer(ephemeral=True, thinking=True) # Deferir la respuesta efímera
 
-        await _play_station_logic(interaction, selected_station_key)
+        await _play_station_logic(interaction, selected_station_key, latency_component="station_select")
         # La actualización del panel y el mensaje de "Reproduciendo ahora" (no efímero) se manejan en _play_station_logic
 
+class CatalogPageButton(discord.ui.Button):
+    def __init__(self, step: int, disabled: bool = False):
+        label, emoji, custom_id = ("Anterior", "◀️", "persistent_catalog_prev_button") if step < 0 else ("Siguiente", "▶️", "persistent_catalog_next_button")
+        super().__init__(label=label, style=discord.ButtonStyle.grey, custom_id=custom_id, emoji=emoji, row=2, disabled=disabled)
+        self.step = step
+
+    async def callback(self, interaction: discord.Interaction):
+        session = get_radio_session(interaction.guild)
+        session.catalog_page = max(0, session.catalog_page + self.step)
+        await interaction.response.defer()
+        await update_controls_message(interaction.guild, immediate=True)
+
+class CatalogSearchModal(discord.ui.Modal, title="Buscar emisora"):
+    query = discord.ui.TextInput(label="Nombre, género o país", placeholder="Vacío para ver todo el catálogo", required=False, max_length=100)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        session = get_radio_session(interaction.guild)
+        session.catalog_query = self.query.value.strip()
+        session.catalog_page = 0
+        await interaction.response.defer()
+        await station_catalog.ensure_loaded()
+        await update_controls_message(interaction.guild, immediate=True)
+
+class CatalogSearchButton(discord.ui.Button):
+    def __init__(self):
+        super().__init__(label="Buscar", style=discord.ButtonStyle.blurple, custom_id="persistent_catalog_search_button", emoji="🔎", row=2)
+
+    async def callback(self, interaction: discord.Interaction):
+        await interaction.response.send_modal(CatalogSearchModal())
+
 class PersistentRadioControlsView(discord.ui.View):
-    def __init__(self, stations_dict):
+    def __init__(self, station_keys=None, has_previous: bool = False, has_next: bool = True, navigation: bool = True):
         super().__init__(timeout=None)
 
         self.add_item(JoinVoiceButton())
         self.add_item(StopAndLeaveButton()) # Nuevo botón para detener y salir
 
         options = []
-        for i, (key, station_info) in enumerate(stations_dict.items()):
-            if i >= 25: break
+        for key in (station_keys if station_keys is not None else station_catalog.keys(25))[:25]:
+            name, details = station_catalog.describe(key)
             options.append(discord.SelectOption(
-                label=station_info['name'][:100], value=key, emoji="🎶", # Ejemplo de emoji
-                description=f"Escuchar {station_info['name'][:100]}"
+                label=name[:100], value=key, emoji="🎶", # Ejemplo de emoji
+                description=(details or f"Escuchar {name}")[:100]
             ))
 
         if options:
             self.add_item(StationSelect(options_list=options, placeholder_text="🎶 Elige una emisora..."))
 
+        if navigation: # Catálogo de más de 25 emisoras (límite de Discord por menú) o con filtro activo
+            self.add_item(CatalogPageButton(-1, disabled=not has_previous))
+            self.add_item(CatalogSearchButton())
+            self.add_item(CatalogPageButton(1, disabled=not has_next))
+
+async def _load_station_catalog():
+    await station_catalog.ensure_loaded()
+    stream_prefetch.set_candidates(station_catalog.keys(25))
+    # Los paneles ya enviados pasan a mostrar el catálogo completo
+    for session in radio_sessions:
+        guild = bot.get_guild(session.guild_id)
+        if guild and session.panel_message:
+            await update_controls_message(guild)
+
+async def _reconcile_guild(guild_id: int):
+    # Deja el servidor como estaba guardado: panel localizado y radio sonando si había oyentes.
+    # Idempotente: lo que ya está bien no se toca, así que repetirlo tras una reconexión es barato.
+    guild = bot.get_guild(guild_id)
+    if guild is None:
+        return # El bot ya no está en ese servidor (o aún no llegó ese shard)
+    session = get_radio_session(guild)
+    state = guild_states.get(guild_id) or {}
+    if state.get("volume_percent") is not None:
+        session.volume = state["volume_percent"] / 100
+    was_playing = guild.voice_client is not None and guild.voice_client.is_playing()
+    if not session.panel_message:
+        await _restore_panel(guild, session, state)
+    resumed = False
+    if state.get("stream_url") and not was_playing:
+        resumed = await _resume_guild_playback(guild, session, state)
+    if session.panel_message and (resumed or not was_playing):
+        # Inmediato: la edición cuenta dentro del límite de concurrencia de la reconciliación
+        await update_controls_message(guild, immediate=True)
+
+async def _restore_panel(guild: discord.Guild, session: RadioSession, state: dict):
+    channel = guild.get_channel(state["panel_channel_id"]) if state.get("panel_channel_id") else None
+    if channel is not None and state.get("panel_message_id"):
+        # Un PartialMessage basta para editar el panel: no hace falta pedirlo a la API
+        session.set_panel_message(channel.get_partial_message(state["panel_message_id"]))
+        return
+    text_channel = _dedicated_text_channel(guild)
+    if not isinstance(text_channel, discord.TextChannel):
+        return # Los demás servidores obtienen su panel con el comando panelradio
+    print(f"Buscando/Actualizando mensaje de controles en: {text_channel.name} ({guild.name})")
+    if RADIO_CONTROLS_MESSAGE_ID:
+        # Solo la primera vez: desde ahí el ID del panel queda en la base de estado
+        try:
+            session.set_panel_message(await text_channel.fetch_message(int(RADIO_CONTROLS_MESSAGE_ID)))
+        except (discord.NotFound, ValueError):
+            print(f"ID de mensaje ({RADIO_CONTROLS_MESSAGE_ID}) no válido o mensaje no encontrado. Se creará uno nuevo.")
+    if not session.panel_message:
+        embed = discord.Embed(title="Cargando Panel de Radio...", color=discord.Color.light_grey())
+        session.set_panel_message(await text_channel.send(content="📡", embed=embed, view=PersistentRadioControlsView()))
+        print(f"Nuevo mensaje de controles enviado (ID {session.panel_message.id}); queda guardado en {STATE_DB_PATH}.")
+    _save_guild_state(session)
+
+async def _resume_guild_playback(guild: discord.Guild, session: RadioSession, state: dict) -> bool:
+    voice_channel = guild.get_channel(state["voice_channel_id"]) if state["voice_channel_id"] else None
+    if not isinstance(voice_channel, discord.VoiceChannel) or not any(not m.bot for m in voice_channel.members):
+        # Sin oyentes no vale la pena reconectar; se olvida la emisora para no intentarlo en cada arranque
+        _save_guild_state(session)
+        return False
+    voice_client = guild.voice_client or await voice_channel.connect()
+    session.voice_client = voice_client
+    session.voice_channel_name = voice_channel.name
+    await _start_station_playback(guild, voice_client, session, state["stream_url"], state["station_name"],
+                                  state["playback_mode"], station_key=state["station_key"])
+    session.set_station(state["station_key"], state["station_name"], state["stream_url"], state["playback_mode"])
+    _save_guild_state(session)
+    print(f"Radio retomada en {guild.name}: {state['station_name']} en {voice_channel.name}.")
+    return True
+
+guild_reconciler = GuildReconciler(_reconcile_guild, concurrency=RECONCILE_CONCURRENCY, guild_timeout=RECONCILE_GUILD_TIMEOUT)
+
+def _guilds_to_reconcile(first_run: bool) -> set:
+    guild_ids = {guild_id for guild_id in guild_states.guild_ids() if _owns_guild(guild_id)}
+    dedicated = bot.get_channel(int(DEDICATED_TEXT_CHANNEL_ID)) if DEDICATED_TEXT_CHANNEL_ID and DEDICATED_TEXT_CHANNEL_ID.isdigit() else None
+    if dedicated is not None and hasattr(dedicated, "guild"):
+        guild_ids.add(dedicated.guild.id)
+    if first_run:
+        return guild_ids
+    # Tras una reconexión solo hace falta revisar lo que quedó a medias: paneles sin cargar o radios calladas
+    pending = set()
+    for guild_id in guild_ids:
+        session = radio_sessions.get(guild_id)
+        guild = bot.get_guild(guild_id)
+        if session is None or not session.panel_message:
+            pending.add(guild_id)
+        elif guild is not None and session.stream_url and not (guild.voice_client and guild.voice_client.is_playing()):
+            pending.add(guild_id)
+    return pending
+
 # --- Eventos del Bot ---
+_startup_done = False
+
 @bot.event
 async def on_ready():
-    global controls_message_info
+    global _startup_done
     print(f'¡Bot {bot.user.name} está en línea y listo!')
-    print(f'Prefijo de comandos: {PREFIX}')
-    await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name="la radio | "+PREFIX+"help"))
+    first_run = not _startup_done
+    # La presencia se pierde con cada nueva identificación ante el gateway; el resto se hace una vez por proceso
+    await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name="la radio | "+_command_hint('radio' if GATEWAY_PROFILE == PROFILE_LOW_MEMORY else 'help')))
+    if first_run:
+        _startup_done = True
+        print(f'Prefijo de comandos: {PREFIX}' if GATEWAY_PROFILE == PROFILE_DEFAULT else 'Perfil lowmem: solo comandos slash (/radio, /conectar, /salir, /panelradio, /volumen, /procesos).')
+        # Es importante registrar la vista ANTES de intentar interactuar con mensajes antiguos
+        bot.add_view(PersistentRadioControlsView())
+        print("Vista persistente de controles de radio registrada.")
+        if cluster_link is not None:
+            cluster_link.start() # Normalmente ya arrancó con el primer IDENTIFY
+            print(f"Worker {CLUSTER_ID} del clúster: shards {format_shard_ids(OWNED_SHARDS)} de {SHARD_COUNT}.")
+        ffmpeg_processes.start()
+        now_playing.start(bot.loop)
+        stream_supervisor.start()
+        # Resolver de antemano las URLs de las emisoras predefinidas (en paralelo con el resto del arranque)
+        asyncio.create_task(stream_resolver.prewarm([station["url"] for station in PREDEFINED_STATIONS.values()]))
+        stream_prefetch.refresh()
+        if not station_catalog.loaded:
+            asyncio.create_task(_load_station_catalog())
+        await guild_states.load()
+        if SYNC_COMMANDS_ON_START:
+            try:
+                synced = await bot.tree.sync()
+                print(f"{len(synced)} comando(s) slash sincronizados.")
+            except discord.HTTPException as e:
+                print(f"No se pudieron sincronizar los comandos slash: {e}")
+        if METRICS_PORT:
+            try:
+                await metrics_server.start()
+            except OSError as e:
+                print(f"No se pudo abrir el endpoint de métricas en {METRICS_HOST}:{METRICS_PORT}: {e}")
+        if not DEDICATED_TEXT_CHANNEL_ID:
+            print(f"DEDICATED_TEXT_CHANNEL_ID no configurado. Usa {_command_hint('panelradio')} en cada servidor para crear su panel.")
+        elif not DEDICATED_TEXT_CHANNEL_ID.isdigit():
+            print("Error: DEDICATED_TEXT_CHANNEL_ID en .env debe ser un número entero.")
 
-    # Es importante registrar la vista ANTES de intentar interactuar con mensajes antiguos
-    bot.add_view(PersistentRadioControlsView(PREDEFINED_STATIONS))
-    print("Vista persistente de controles de radio registrada.")
+    # Sincronizar sesiones con las conexiones de voz que ya existan (ej. tras una reconexión del gateway)
+    for vc in bot.voice_clients:
+        session = get_radio_session(vc.guild)
+        session.voice_client = vc
+        session.voice_channel_name = vc.channel.name
+        idle_reaper.watch_channel(vc.guild.id, vc.channel.id, _human_listeners(vc.channel))
 
-    if DEDICATED_TEXT_CHANNEL_ID:
-        try:
-            text_channel_id = int(DEDICATED_TEXT_CHANNEL_ID)
-            # Asumimos que el bot solo necesita operar en un guild principal para este panel
-            # Si tienes múltiples guilds, necesitarías una forma de identificar el guild correcto
-            # o tener paneles por guild. Aquí tomamos el primer guild para simplicidad.
-            target_guild = bot.guilds[0] if bot.guilds else None
-            if not target_guild:
-                print("El bot no está en ningún servidor. Panel no configurado.")
-                return
-
-            text_channel = target_guild.get_channel(text_channel_id)
-
-            if text_channel and isinstance(text_channel, discord.TextChannel):
-                print(f"Buscando/Actualizando mensaje de controles en: {text_channel.name}")
-
-                initial_message_id = None
-                if RADIO_CONTROLS_MESSAGE_ID:
-                    try:
-                        initial_message_id = int(RADIO_CONTROLS_MESSAGE_ID)
-                        controls_message_info["message_obj"] = await text_channel.fetch_message(initial_message_id)
-                    except (discord.NotFound, ValueError):
-                        print(f"ID de mensaje ({RADIO_CONTROLS_MESSAGE_ID}) no válido o mensaje no encontrado. Se creará uno nuevo.")
-                        initial_message_id = None # Forzar creación
-                        controls_message_info["message_obj"] = None # Resetear
-
-                if not controls_message_info["message_obj"]: # Si no se pudo cargar o no había ID
-                    # Limpiar mensajes antiguos del bot en el canal (con cuidado si hay otros mensajes del bot)
-                    # async for message in text_channel.history(limit=10):
-                    # if message.author == bot.user and not (message.components and any(c.custom_id == "persistent_join_voice_button" for c in message.components[0].children)): # Evitar borrar el panel actual si ya existe
-                    # await message.delete()
-                    # print("Mensajes antiguos del bot limpiados (si los había).")
-
-                    view = PersistentRadioControlsView(PREDEFINED_STATIONS) # Crear la vista para el nuevo mensaje
-                    embed = discord.Embed(title="Cargando Panel de Radio...", color=discord.Color.light_grey())
-                    controls_message_info["message_obj"] = await text_channel.send(content="📡", embed=embed, view=view)
-                    print(f"NUEVO MENSAJE DE CONTROLES ENVIADO. Su ID es: {controls_message_info['message_obj'].id}")
-                    print("POR FAVOR, ACTUALIZA 'RADIO_CONTROLS_MESSAGE_ID' EN TU ARCHIVO .ENV CON ESTE NUEVO ID.")
-
-                await update_controls_message(target_guild) # Llamada inicial para establecer el estado correcto
-
-            else:
-                print(f"ID de canal de texto ({DEDICATED_TEXT_CHANNEL_ID}) no encontrado o no es un canal de texto.")
-        except ValueError:
-            print("Error: DEDICATED_TEXT_CHANNEL_ID en .env debe ser un número entero.")
-        except Exception as e:
-            print(f"Error catastrófico durante on_ready en config. de panel: {e}")
-            import traceback
-            traceback.print_exc()
-    else:
-        print("DEDICATED_TEXT_CHANNEL_ID no configurado. El panel de control persistente no se activará.")
+    report = await guild_reconciler.run(_guilds_to_reconcile(first_run), reason="arranque" if first_run else "reconexión")
+    print(report.summary())
+    for guild_id, error in report.failures.items():
+        print(f"  • guild {guild_id}: {error}")
 
 # --- Listener para Voice State Updates (opcional, para actualizar panel si el bot es desconectado) ---
 @bot.event
 async def on_voice_state_update(member, before, after):
-    global controls_message_info
-    # Si el miembro que cambió de estado es nuestro bot
-    if member.id == bot.user.id:
-        if before.channel and not after.channel: # El bot fue desconectado de un canal
-            print(f"Bot desconectado del canal de voz {before.channel.name} en {member.guild.name}")
-            controls_message_info["voice_channel_name"] = "Desconectado 🚫"
-            controls_message_info["current_station_name"] = "Ninguna"
-            await update_controls_message(member.guild)
-        elif not before.channel and after.channel: # El bot se conectó a un canal
-            print(f"Bot conectado al canal de voz {after.channel.name} en {member.guild.name}")
-            controls_message_info["voice_channel_name"] = after.channel.name
-            # No cambiamos current_station_name aquí, eso lo hace la lógica de play
-            await update_controls_message(member.guild)
-        elif before.channel != after.channel and after.channel: # El bot se movió a otro canal
-            print(f"Bot movido de {before.channel.name} a {after.channel.name} en {member.guild.name}")
-            controls_message_info["voice_channel_name"] = after.channel.name
-            await update_controls_message(member.guild)
+    if member.id != bot.user.id:
+        if not member.bot: # Oyentes humanos que entran o salen del canal del bot
+            idle_reaper.member_moved(member.guild.id, before.channel.id if before.channel else None, after.channel.id if after.channel else None)
+        return
+    # Desde aquí, el miembro que cambió de estado es nuestro bot
+    session = get_radio_session(member.guild)
+    if before.channel and not after.channel: # El bot fue desconectado de un canal
+        print(f"Bot desconectado del canal de voz {before.channel.name} en {member.guild.name}")
+        _stop_station_playback(session)
+        session.mark_disconnected()
+        idle_reaper.unwatch(member.guild.id)
+        ffmpeg_processes.release_owner(member.guild.id) # Por si el "after" del reproductor nunca llega
+        _save_guild_state(session)
+        await update_controls_message(member.guild)
+    elif not before.channel and after.channel: # El bot se conectó a un canal
+        print(f"Bot conectado al canal de voz {after.channel.name} en {member.guild.name}")
+        session.voice_client = member.guild.voice_client
+        session.voice_channel_name = after.channel.name
+        idle_reaper.watch_channel(member.guild.id, after.channel.id, _human_listeners(after.channel))
+        # No cambiamos current_station_name aquí, eso lo hace la lógica de play
+        _save_guild_state(session)
+        await update_controls_message(member.guild)
+    elif before.channel != after.channel and after.channel: # El bot se movió a otro canal
+        print(f"Bot movido de {before.channel.name} a {after.channel.name} en {member.guild.name}")
+        session.voice_channel_name = after.channel.name
+        idle_reaper.watch_channel(member.guild.id, after.channel.id, _human_listeners(after.channel))
+        _save_guild_state(session)
+        await update_controls_message(member.guild)
+
+
+@bot.event
+async def on_guild_remove(guild):
+    # Expulsado del servidor: su estado ya no sirve
+    radio_sessions.discard(guild.id)
+    guild_states.forget(guild.id)
 
 
 # --- Comandos del Bot (simplificados o mantenidos para flexibilidad) ---
@@ -404,6 +1068,7 @@ async def leave(ctx):
     guild = ctx.guild
     voice_client = guild.voice_client
     if voice_client and voice_client.is_connected():
+        _stop_station_playback(get_radio_session(guild))
         if voice_client.is_playing():
             voice_client.stop()
         await voice_client.disconnect()
@@ -419,36 +1084,223 @@ async def play(ctx, *, station_input: str):
     await _play_station_logic(ctx, station_input)
 
 # El comando `emisoras` puede ser útil para debug o si alguien borra el panel
-@bot.command(name="panelradio", help="(Re)envía el panel de control de la radio al canal dedicado.")
+@bot.command(name="panelradio", help="(Re)envía el panel de control de la radio al canal dedicado (o al canal actual).")
 @commands.has_permissions(manage_guild=True) # Solo admins pueden reenviar el panel
 async def panelradio(ctx):
-    global controls_message_info
-    if DEDICATED_TEXT_CHANNEL_ID:
-        text_channel_id = int(DEDICATED_TEXT_CHANNEL_ID)
-        text_channel = ctx.guild.get_channel(text_channel_id)
-        if text_channel:
-            # Borrar el mensaje antiguo si tenemos su ID y existe
-            if RADIO_CONTROLS_MESSAGE_ID and controls_message_info["message_obj"]:
-                try:
-                    old_msg = await text_channel.fetch_message(int(RADIO_CONTROLS_MESSAGE_ID))
-                    await old_msg.delete()
-                    print(f"Mensaje de panel antiguo (ID: {RADIO_CONTROLS_MESSAGE_ID}) borrado.")
-                except discord.NotFound:
-                    print(f"Mensaje de panel antiguo (ID: {RADIO_CONTROLS_MESSAGE_ID}) no encontrado para borrar.")
-                except Exception as e:
-                    print(f"Error borrando mensaje de panel antiguo: {e}")
-
-            view = PersistentRadioControlsView(PREDEFINED_STATIONS)
-            embed = discord.Embed(title="Cargando Panel de Radio...", color=discord.Color.light_grey())
-            new_panel_msg = await text_channel.send(content="📡", embed=embed, view=view)
-            controls_message_info["message_obj"] = new_panel_msg
-            await update_controls_message(ctx.guild) # Actualiza con el estado correcto
-            await ctx.send(f"✅ Panel de radio reenviado. Nuevo ID de mensaje: `{new_panel_msg.id}`. **¡Actualiza tu .env!**", ephemeral=True)
-            print(f"PANEL MANUALMENTE REENVIADO. Nuevo ID: {new_panel_msg.id}. ACTUALIZA .ENV")
-        else:
-            await ctx.send("❌ Canal de texto dedicado no encontrado.", ephemeral=True)
+    # El canal dedicado del .env solo aplica a su servidor; en los demás el panel se envía al canal actual
+    text_channel = _dedicated_text_channel(ctx.guild) or ctx.channel
+    if text_channel:
+        await _send_panel(ctx.guild, text_channel)
+        await ctx.send(f"✅ Panel de radio enviado a {text_channel.mention}.", ephemeral=True)
+    else:
+        await ctx.send("❌ Canal de texto no encontrado.", ephemeral=True)
+
+async def _send_panel(guild: discord.Guild, text_channel):
+    session = get_radio_session(guild)
+    # Borrar el mensaje antiguo si lo tenemos
+    if session.panel_message:
+        old_msg = session.panel_message
+        try:
+            await old_msg.delete()
+            print(f"Mensaje de panel antiguo (ID: {old_msg.id}) borrado.")
+        except discord.NotFound:
+            print(f"Mensaje de panel antiguo (ID: {old_msg.id}) no encontrado para borrar.")
+        except Exception as e:
+            print(f"Error borrando mensaje de panel antiguo: {e}")
+
+    view = PersistentRadioControlsView()
+    embed = discord.Embed(title="Cargando Panel de Radio...", color=discord.Color.light_grey())
+    new_panel_msg = await text_channel.send(content="📡", embed=embed, view=view)
+    session.set_panel_message(new_panel_msg)
+    _save_guild_state(session) # Sobrevive a reinicios sin tocar el .env
+    await update_controls_message(guild, immediate=True) # Actualiza con el estado correcto
+
+
+@bot.command(name="procesos", aliases=["ffmpeg"], help="Muestra cuántos ffmpeg están corriendo y cuánto consumen.")
+@commands.has_permissions(manage_guild=True)
+async def procesos(ctx):
+    await ctx.send(_process_report())
+
+@bot.command(name="volumen", aliases=["vol", "volume"], help=f"Muestra o cambia el volumen de la radio en este servidor (0-{MAX_VOLUME_PERCENT}%).")
+@commands.guild_only()
+async def volumen(ctx, porcentaje: int = None):
+    await ctx.send(_volume_command(ctx.guild, porcentaje))
+
+def _volume_command(guild: discord.Guild, percent) -> str:
+    session = get_radio_session(guild)
+    if not DSP_ENABLED:
+        return "ℹ️ El volumen por servidor necesita la etapa DSP (`RADIO_DSP=1` y NumPy instalado)."
+    if percent is None:
+        return f"🔊 Volumen actual: **{round(session.volume * 100)}%**"
+    if not 0 <= percent <= MAX_VOLUME_PERCENT:
+        return f"⚠️ El volumen va de 0 a {MAX_VOLUME_PERCENT}%."
+    session.volume = percent / 100
+    source = guild.voice_client.source if guild.voice_client else None
+    if isinstance(source, DSPSource):
+        source.volume = session.volume # El próximo lote hace la rampa desde la ganancia actual
+    _save_guild_state(session)
+    if session.playback_mode == PLAYBACK_OPUS:
+        return f"🔊 Volumen: **{percent}%** (se aplicará a las emisoras en modo PCM; esta se reproduce en Opus directo)."
+    return f"🔊 Volumen: **{percent}%**"
+
+def _process_report() -> str:
+    stats = ffmpeg_processes.stats()
+    lines = [
+        f"🎛️ ffmpeg activos: **{stats['active']}/{stats['max']}** | en cola: **{stats['waiting']}**",
+        f"💾 RSS total: **{stats['rss_kb'] / 1024:.1f} MB** | 🔥 CPU: **{stats['cpu_percent']}%**",
+        f"📊 Admitidos: {stats['admitted']} | rechazados: {stats['rejected']} | huérfanos eliminados: {stats['reaped']}",
+    ]
+    buffers = [_playing_source(s.voice_client).source.stats() for s in radio_sessions
+               if s.voice_client and isinstance(getattr(_playing_source(s.voice_client), "source", None), JitterBuffer)]
+    if buffers:
+        lines.append(
+            f"🪣 Buffers de jitter: {len(buffers)} | cortes cubiertos con silencio: {sum(b['underruns'] for b in buffers)}"
+            f" | frames descartados por lleno: {sum(b['overruns'] for b in buffers)}"
+        )
+    dsp = [s.voice_client.source.stats() for s in radio_sessions if s.voice_client and isinstance(s.voice_client.source, DSPSource)]
+    if dsp:
+        lines.append(
+            f"🎚️ Etapa DSP: {len(dsp)} fuente(s) | ganancia media: {sum(d['gain_db'] for d in dsp) / len(dsp):+.1f} dB"
+            f" | frames por lote: {sum(d['frames_per_batch'] for d in dsp) / len(dsp):.1f} | crossfades: {sum(d['crossfades'] for d in dsp)}"
+        )
+    panel = panel_updates.stats()
+    if panel["requested"]:
+        lines.append(f"🖼️ Panel: {panel['requested']} actualizaciones pedidas | enviadas: {panel['sent']}"
+                     f" | fusionadas: {panel['coalesced']} | sin cambios: {panel['skipped']}")
+    idle = idle_reaper.stats()
+    if idle["reaped"]:
+        lines.append(f"💤 Sesiones en pausa sin oyentes: {idle['paused']} | liberadas: {idle['reaped']} | retomadas: {idle['resumed']}")
+    for process in stats["processes"][:10]:
+        lines.append(f"• `{process['pid']}` {process['label']}: {process['rss_kb'] / 1024:.1f} MB, {process['cpu_percent']}% CPU")
+    return "\n".join(lines)
+
+
+# --- Clúster (varios procesos con shards, ver cluster.py) ---
+_worker_usage = {"at": time.monotonic(), "cpu": 0.0}
+
+def _cluster_stats() -> dict:
+    # Lo que cada worker publica en el canal IPC; el lanzador suma los números de todos
+    ffmpeg = ffmpeg_processes.stats()
+    cpu_seconds, rss_kb = read_proc_usage(os.getpid()) or (0.0, 0)
+    now = time.monotonic()
+    cpu_percent = (cpu_seconds - _worker_usage["cpu"]) * 100 / max(now - _worker_usage["at"], 1e-3)
+    _worker_usage.update(at=now, cpu=cpu_seconds)
+    latency = bot.latency
+    return {
+        "guilds": len(bot.guilds),
+        "voice_sessions": sum(1 for s in radio_sessions if s.voice_client and s.voice_client.is_connected()),
+        "idle_paused": idle_reaper.stats()["paused"],
+        "ffmpeg_active": ffmpeg["active"],
+        "ffmpeg_waiting": ffmpeg["waiting"],
+        "ffmpeg_rss_mb": round(ffmpeg["rss_kb"] / 1024, 1),
+        "ffmpeg_cpu_percent": ffmpeg["cpu_percent"],
+        "rss_mb": round(rss_kb / 1024, 1),
+        "cpu_percent": round(cpu_percent, 1),
+        "latency_ms": round(latency * 1000) if math.isfinite(latency) else None,
+    }
+
+async def _cluster_panelradio(args: dict) -> dict:
+    # Enrutado por el lanzador al worker que atiende el servidor (python cluster.py panelradio GUILD_ID)
+    guild = bot.get_guild(int(args["guild_id"]))
+    if guild is None:
+        raise LookupError(f"El servidor {args['guild_id']} no está en los shards {format_shard_ids(OWNED_SHARDS)} de este worker.")
+    session = get_radio_session(guild)
+    if args.get("channel_id"):
+        text_channel = guild.get_channel(int(args["channel_id"]))
     else:
-        await ctx.send("❌ No hay canal de texto dedicado configurado en .env.", ephemeral=True)
+        text_channel = _dedicated_text_channel(guild) or (session.panel_message.channel if session.panel_message else None)
+    if text_channel is None:
+        raise LookupError("No hay canal para el panel en ese servidor; indica uno con --canal.")
+    await _send_panel(guild, text_channel)
+    return {"guild": guild.name, "channel_id": text_channel.id, "message_id": session.panel_message.id}
+
+async def _cluster_procesos(args: dict) -> str:
+    return _process_report()
+
+cluster_link = None
+if CLUSTER_IPC:
+    cluster_link = ClusterWorkerLink(CLUSTER_IPC, CLUSTER_ID, sorted(OWNED_SHARDS),
+                                     handlers={"panelradio": _cluster_panelradio, "procesos": _cluster_procesos},
+                                     collect_stats=_cluster_stats)
+    # Los IDENTIFY de todos los workers comparten el límite de Discord: el lanzador reparte los turnos
+    bot.before_identify_hook = cluster_link.before_identify
+
+@bot.command(name="cluster", aliases=["clúster"], help="Estado de todos los procesos del clúster. Solo el dueño del bot.")
+@commands.is_owner()
+async def cluster(ctx):
+    if cluster_link is None:
+        shards = f"{bot.shard_count} shard(s)" if bot.shard_count else "sin shards"
+        await ctx.send(f"ℹ️ Este bot corre en un solo proceso ({shards}). Usa `python cluster.py` para repartirlo en varios.")
+        return
+    try:
+        stats = await cluster_link.request("cluster_stats", timeout=10)
+    except (asyncio.TimeoutError, ConnectionError, RuntimeError) as e:
+        await ctx.send(f"❌ No se pudo consultar al lanzador: {e}")
+        return
+    lines = [f"🧩 **{len(stats['workers'])}** worker(s), **{stats['shard_count']}** shard(s)"]
+    for cluster_id, worker in stats["workers"].items():
+        lines.append(f"• Worker {cluster_id} (shards {format_shard_ids(worker['shards'])}): {worker.get('guilds', '?')} servidores, "
+                     f"{worker.get('voice_sessions', '?')} en voz, {worker.get('ffmpeg_active', '?')} ffmpeg, "
+                     f"{worker.get('rss_mb', '?')} MB, {worker.get('cpu_percent', '?')}% CPU")
+    totals = stats["totals"]
+    lines.append(f"Σ {totals.get('guilds', 0)} servidores | {totals.get('voice_sessions', 0)} en voz | {totals.get('ffmpeg_active', 0)} ffmpeg")
+    await ctx.send("\n".join(lines))
+
+
+# --- Comandos de aplicación (slash) ---
+@bot.tree.command(name="radio", description="Sintoniza una emisora del catálogo (o una URL directa).")
+@app_commands.describe(emisora="Nombre, género o país de la emisora, o una URL")
+@app_commands.guild_only()
+async def radio_slash(interaction: discord.Interaction, emisora: str):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    await _play_station_logic(interaction, emisora)
+
+@radio_slash.autocomplete("emisora")
+async def radio_slash_autocomplete(interaction: discord.Interaction, current: str):
+    await station_catalog.ensure_loaded()
+    choices = []
+    for key in station_catalog.search(current, limit=25):
+        name, details = station_catalog.describe(key)
+        choices.append(app_commands.Choice(name=f"{name} · {details}"[:100] if details else name[:100], value=key[:100]))
+    return choices
+
+# Equivalentes slash de los comandos con prefijo: son los únicos que llegan con RADIO_GATEWAY_PROFILE=lowmem
+@bot.tree.command(name="conectar", description="El bot se une a tu canal de voz.")
+@app_commands.guild_only()
+async def conectar_slash(interaction: discord.Interaction):
+    await JoinVoiceButton().callback(interaction)
+
+@bot.tree.command(name="salir", description="Detiene la radio y saca al bot del canal de voz.")
+@app_commands.guild_only()
+async def salir_slash(interaction: discord.Interaction):
+    await StopAndLeaveButton().callback(interaction)
+
+@bot.tree.command(name="panelradio", description="(Re)envía el panel de control de la radio a este canal (o al canal dedicado).")
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+async def panelradio_slash(interaction: discord.Interaction):
+    text_channel = _dedicated_text_channel(interaction.guild) or interaction.channel
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    await _send_panel(interaction.guild, text_channel)
+    await interaction.followup.send(f"✅ Panel de radio enviado a {text_channel.mention}.", ephemeral=True)
+
+@bot.tree.command(name="volumen", description="Muestra o cambia el volumen de la radio en este servidor.")
+@app_commands.describe(porcentaje=f"De 0 a {MAX_VOLUME_PERCENT}% (100 = volumen original)")
+@app_commands.guild_only()
+async def volumen_slash(interaction: discord.Interaction, porcentaje: app_commands.Range[int, 0, MAX_VOLUME_PERCENT] = None):
+    await interaction.response.send_message(_volume_command(interaction.guild, porcentaje), ephemeral=True)
+
+@bot.tree.command(name="procesos", description="Muestra cuántos ffmpeg están corriendo y cuánto consumen.")
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+async def procesos_slash(interaction: discord.Interaction):
+    await interaction.response.send_message(_process_report(), ephemeral=True)
+
+@bot.command(name="sincronizar", help="Registra los comandos slash (/radio) en Discord. Solo el dueño del bot.")
+@commands.is_owner()
+async def sincronizar(ctx):
+    synced = await bot.tree.sync()
+    await ctx.send(f"✅ {len(synced)} comando(s) slash sincronizados. Pueden tardar unos minutos en aparecer.")
 
 
 # --- Manejo de Errores de Comandos ---
@@ -480,5 +1332,7 @@ if __name__ == "__main__":
             print(f"Ocurrió un error al intentar ejecutar el bot: {e}")
             if isinstance(e, discord.errors.LoginFailure): print("Verifica tu BOT_TOKEN.")
             if isinstance(e, discord.errors.PrivilegedIntentsRequired): print("Habilita 'MESSAGE CONTENT INTENT'.")
+        finally:
+            guild_states.close() # Escribe el último lote pendiente
     else:
         print("El bot no puede iniciar sin un BOT_TOKEN.")
@@ -0,0 +1,239 @@
+# --- Métricas del bot en formato de texto de Prometheus ---
+# Contadores, gauges e histogramas en memoria, expuestos por un endpoint HTTP local (/metrics).
+# Nada de esto corre por frame: lo que cambia 50 veces por segundo (frames enviados, descartados)
+# ya lo cuentan las fuentes de audio y se lee recién cuando alguien consulta el endpoint.
+import asyncio
+import bisect
+import logging
+import math
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    # Escapes del formato de texto de Prometheus para valores de etiquetas
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    __slots__ = ("name", "help", "_values")
+    type = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {} # tupla de etiquetas -> valor
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.items())
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in list(self._values.items()):
+            yield self.name, dict(key), value
+
+
+class Gauge:
+    """Valor instantáneo; con ``collect`` se calcula al consultar el endpoint (``collect()`` -> número o ``{etiquetas: valor}``)."""
+
+    __slots__ = ("name", "help", "_values", "_collect")
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, collect=None):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._collect = collect
+
+    def set(self, value: float, **labels):
+        self._values[tuple(labels.items())] = value
+
+    def samples(self):
+        if self._collect is not None:
+            collected = self._collect()
+            if not isinstance(collected, dict):
+                yield self.name, {}, collected
+                return
+            for labels, value in collected.items():
+                yield self.name, dict(labels), value
+            return
+        for key, value in list(self._values.items()):
+            yield self.name, dict(key), value
+
+
+class Histogram:
+    """Histograma acumulativo por etiquetas.
+
+    Con ``sample_rate`` < 1 solo se registra una de cada ``round(1 / sample_rate)`` observaciones,
+    contada con ese peso: los totales siguen siendo estimaciones correctas del volumen real.
+    """
+
+    __slots__ = ("name", "help", "buckets", "_series", "_stride", "_tick")
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS, sample_rate: float = 1.0):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series = {} # tupla de etiquetas -> [cuentas por bucket..., +Inf, suma]
+        self._stride = max(1, round(1 / sample_rate)) if sample_rate > 0 else 0
+        self._tick = 0
+
+    def observe(self, value: float, **labels):
+        if self._stride != 1:
+            if self._stride == 0:
+                return
+            self._tick += 1
+            if self._tick % self._stride:
+                return
+        key = tuple(labels.items())
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += self._stride
+        series[-1] += value * self._stride
+
+    def time(self, **labels):
+        return _HistogramTimer(self, labels)
+
+    def samples(self):
+        for key, series in list(self._series.items()):
+            labels = dict(key)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), series):
+                cumulative += count
+                yield self.name + "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield self.name + "_count", labels, cumulative
+            yield self.name + "_sum", labels, series[-1]
+
+
+class _HistogramTimer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = "rockbot", sample_rate: float = 1.0):
+        self.prefix = prefix
+        self.sample_rate = sample_rate
+        self._metrics = []
+        self._collectors = [] # Funciones que devuelven filas (nombre, tipo, ayuda, [(etiquetas, valor)])
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(f"{self.prefix}_{name}_total", help))
+
+    def gauge(self, name: str, help: str, collect=None) -> Gauge:
+        return self._register(Gauge(f"{self.prefix}_{name}", help, collect))
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS, sampled: bool = False) -> Histogram:
+        """``sampled``: aplica ``sample_rate`` del registro (para eventos frecuentes)."""
+        return self._register(Histogram(f"{self.prefix}_{name}", help, buckets, self.sample_rate if sampled else 1.0))
+
+    def add_collector(self, collect):
+        """``collect()`` -> iterable de ``(nombre, tipo, ayuda, [(etiquetas, valor), ...])``, evaluado en cada consulta."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                print(f"Error recolectando métricas: {e}")
+                continue
+            for name, metric_type, help, rows in families:
+                name = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in rows:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class RateLimitLogCounter(logging.Handler):
+    """Cuenta los 429 que discord.py reintenta por su cuenta (solo los anuncia en el log de ``discord.http``)."""
+
+    def __init__(self, counter: Counter):
+        super().__init__(logging.WARNING)
+        self.counter = counter
+
+    def emit(self, record: logging.LogRecord):
+        if not str(record.msg).startswith("We are being rate limited"):
+            return
+        url = str(record.args[1]) if record.args and len(record.args) > 1 else ""
+        self.counter.inc(route="message" if "/messages/" in url else "other")
+
+
+class MetricsServer:
+    """Endpoint HTTP mínimo en el event loop: ``GET /metrics`` devuelve :meth:`MetricsRegistry.render`."""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self.scrapes = 0
+
+    async def start(self):
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+            print(f"Métricas disponibles en http://{self.host}:{self.port}/metrics")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass # Las cabeceras no interesan
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/metrics", "/"):
+                self.scrapes += 1
+                body = self.registry.render().encode()
+                status, content_type = "200 OK", "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                body, status, content_type = b"not found\n", "404 Not Found", "text/plain"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                         f"Connection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,97 @@
+# --- Programador de actualizaciones del panel ---
+# Un solo cambio de emisora puede pedir 3-4 actualizaciones seguidas del panel (play, after del
+# reproductor anterior, on_voice_state_update...). Aquí se agrupan las peticiones de cada servidor
+# dentro de una ventana corta y se descartan las ediciones que no cambian nada visible.
+import asyncio
+import hashlib
+import json
+
+
+def panel_fingerprint(embed, view) -> bytes:
+    """Huella del panel renderizado (embed + componentes de la vista) para detectar ediciones idénticas."""
+    payload = {
+        "embed": embed.to_dict() if embed else None,
+        "components": view.to_components() if view else None,
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode()
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+class PanelUpdateScheduler:
+    """Agrupa las actualizaciones del panel por servidor.
+
+    ``flush`` es una corrutina ``flush(guild)`` que renderiza y edita el panel; debe devolver
+    ``True`` si se envió una edición, ``False`` si se omitió por no haber cambios y ``None``
+    si no había panel que actualizar.
+    """
+
+    def __init__(self, flush, window: float = 0.75):
+        self._flush = flush
+        self._window = window
+        self._pending = {} # guild_id -> asyncio.Task
+        self._in_flight = {} # guild_id -> asyncio.Event que se activa al terminar la edición en curso
+        self.edits_requested = 0
+        self.edits_sent = 0
+        self.edits_coalesced = 0
+        self.edits_skipped = 0
+
+    def request(self, guild):
+        """Pide una actualización; si ya hay una pendiente para este servidor, se fusiona con ella."""
+        self.edits_requested += 1
+        if guild.id in self._pending:
+            self.edits_coalesced += 1
+            return
+        self._pending[guild.id] = asyncio.get_running_loop().create_task(self._run_later(guild))
+
+    async def flush_now(self, guild):
+        """Ejecuta de inmediato la actualización pendiente (o una nueva) para el servidor."""
+        task = self._pending.pop(guild.id, None)
+        if task:
+            task.cancel()
+        await self._run(guild)
+
+    def is_pending(self, guild_id: int) -> bool:
+        return guild_id in self._pending
+
+    def cancel(self, guild_id: int):
+        task = self._pending.pop(guild_id, None)
+        if task:
+            task.cancel()
+
+    async def _run_later(self, guild):
+        try:
+            await asyncio.sleep(self._window)
+        except asyncio.CancelledError:
+            return
+        # Sacarlo de pendientes ANTES de editar: lo que llegue durante la edición programa otra
+        self._pending.pop(guild.id, None)
+        await self._run(guild)
+
+    async def _run(self, guild):
+        # Una edición por servidor a la vez: la que llegue durante una edición lenta espera a que
+        # termine y renderiza el estado de ese momento (si corrieran juntas, podría quedar la más vieja)
+        while guild.id in self._in_flight:
+            await self._in_flight[guild.id].wait()
+        done = self._in_flight[guild.id] = asyncio.Event()
+        try:
+            sent = await self._flush(guild)
+        except Exception as e:
+            print(f"Error actualizando el panel del guild {guild.id}: {e}")
+            return
+        finally:
+            del self._in_flight[guild.id]
+            done.set()
+        if sent is True:
+            self.edits_sent += 1
+        elif sent is False:
+            self.edits_skipped += 1
+
+    def stats(self) -> dict:
+        return {
+            "requested": self.edits_requested,
+            "sent": self.edits_sent,
+            "coalesced": self.edits_coalesced,
+            "skipped": self.edits_skipped,
+            "pending": len(self._pending),
+            "in_flight": len(self._in_flight),
+        }
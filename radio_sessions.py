@@ -0,0 +1,133 @@
+# --- Sesiones de radio por servidor (guild) ---
+# Cada servidor tiene su propio estado de panel y reproducción, así un mismo proceso
+# puede atender miles de servidores sin que uno pise el estado del otro.
+
+DISCONNECTED_LABEL = "Desconectado 🚫"
+NO_STATION_LABEL = "Ninguna"
+
+
+class RadioSession:
+    """Estado de radio de un servidor: cliente de voz, emisora, mensaje del panel y último error."""
+
+    __slots__ = (
+        "guild_id",
+        "voice_client",
+        "current_station_name",
+        "voice_channel_name",
+        "panel_message",
+        "panel_fingerprint",
+        "last_error",
+        "station_key",
+        "station_name",
+        "stream_url",
+        "playback_mode",
+        "volume",
+        "_now_playing_key",
+        "_now_playing_index",
+        "catalog_query",
+        "catalog_page",
+        "idle_paused",
+    )
+
+    def __init__(self, guild_id: int, now_playing_index: dict = None):
+        self.guild_id = guild_id
+        self.voice_client = None
+        self.current_station_name = NO_STATION_LABEL
+        self.voice_channel_name = "Desconectado"
+        self.panel_message = None
+        self.panel_fingerprint = None # Huella del último panel enviado, para omitir ediciones idénticas
+        self.last_error = None
+        # Emisora que el usuario pidió (se mantiene mientras no pida parar, para poder recuperarla)
+        self.station_key = None
+        self.station_name = None
+        self.stream_url = None
+        self.playback_mode = None
+        self.volume = 1.0 # Volumen del servidor (etapa DSP); no se olvida al parar la emisora
+        self._now_playing_key = None # URL del stream del que se muestran los metadatos ICY
+        self._now_playing_index = now_playing_index # Índice del registro: clave -> guild_ids que la muestran
+        # Página y filtro del menú de emisoras del panel (el catálogo puede tener miles)
+        self.catalog_query = ""
+        self.catalog_page = 0
+        self.idle_paused = False # Audio detenido porque el canal quedó sin oyentes (se retoma al volver alguien)
+
+    @property
+    def now_playing_key(self):
+        return self._now_playing_key
+
+    @now_playing_key.setter
+    def now_playing_key(self, key):
+        previous = self._now_playing_key
+        if key == previous:
+            return
+        index = self._now_playing_index
+        if index is not None:
+            if previous is not None:
+                guild_ids = index.get(previous)
+                if guild_ids is not None:
+                    guild_ids.discard(self.guild_id)
+                    if not guild_ids:
+                        del index[previous]
+            if key is not None:
+                index.setdefault(key, set()).add(self.guild_id)
+        self._now_playing_key = key
+
+    def set_panel_message(self, message):
+        self.panel_message = message
+        self.panel_fingerprint = None
+
+    def set_station(self, station_key, station_name: str, stream_url: str, playback_mode: str):
+        self.station_key = station_key
+        self.station_name = station_name
+        self.stream_url = stream_url
+        self.playback_mode = playback_mode
+
+    def clear_station(self):
+        self.station_key = self.station_name = self.stream_url = self.playback_mode = self.now_playing_key = None
+        self.idle_paused = False
+
+    def mark_disconnected(self):
+        self.voice_client = None
+        self.voice_channel_name = DISCONNECTED_LABEL
+        self.current_station_name = NO_STATION_LABEL
+        self.clear_station()
+
+    def __repr__(self):
+        return f"<RadioSession guild={self.guild_id} station={self.current_station_name!r} voice={self.voice_channel_name!r}>"
+
+
+class RadioSessionRegistry:
+    """Registro de sesiones indexado por guild_id (búsqueda O(1) sin importar cuántos servidores haya)."""
+
+    __slots__ = ("_sessions", "_now_playing")
+
+    def __init__(self):
+        self._sessions = {}
+        self._now_playing = {} # now_playing_key -> {guild_id}, lo mantiene cada sesión al cambiar su clave
+
+    def get(self, guild_id: int):
+        return self._sessions.get(guild_id)
+
+    def get_or_create(self, guild_id: int) -> RadioSession:
+        session = self._sessions.get(guild_id)
+        if session is None:
+            session = self._sessions[guild_id] = RadioSession(guild_id, self._now_playing)
+        return session
+
+    def discard(self, guild_id: int):
+        session = self._sessions.pop(guild_id, None)
+        if session is not None:
+            session.now_playing_key = None
+        return session
+
+    def now_playing_guilds(self, key) -> tuple:
+        """guild_ids de las sesiones que muestran los metadatos de ``key`` (sin recorrer todas las sesiones)."""
+        return tuple(self._now_playing.get(key, ()))
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __iter__(self):
+        return iter(self._sessions.values())
+
+    def __contains__(self, guild_id):
+        return guild_id in self._sessions
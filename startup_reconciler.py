@@ -0,0 +1,89 @@
+# --- Reconciliación de servidores al arrancar y tras reconexiones del gateway ---
+# on_ready se repite en cada reconexión completa del gateway. En vez de recorrer los servidores uno
+# por uno en cada ocasión, se reconcilia cada servidor (panel + voz) en paralelo con un límite de
+# concurrencia, para no chocar con los límites de la API de Discord, y se informa cuánto tardó.
+import asyncio
+import time
+
+
+class ReconcileReport:
+    __slots__ = ("reason", "guilds", "succeeded", "failures", "elapsed", "slowest")
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        self.guilds = 0
+        self.succeeded = 0
+        self.failures = {} # guild_id -> descripción del error
+        self.elapsed = 0.0
+        self.slowest = (None, 0.0) # (guild_id, segundos)
+
+    def summary(self) -> str:
+        text = (f"Reconciliación ({self.reason}): {self.succeeded}/{self.guilds} servidor(es) en {self.elapsed:.2f} s"
+                f", {len(self.failures)} fallo(s)")
+        if self.slowest[0] is not None:
+            text += f", el más lento {self.slowest[0]} ({self.slowest[1]:.2f} s)"
+        return text
+
+
+class GuildReconciler:
+    """Ejecuta ``reconcile(guild_id)`` para muchos servidores a la vez, como máximo ``concurrency`` en paralelo.
+
+    ``reconcile`` debe ser idempotente: dejar el servidor en el estado guardado sin repetir trabajo si
+    ya lo está. Si se pide una ronda mientras otra está en curso, los servidores nuevos se suman a la
+    ronda en marcha en vez de lanzar una segunda en paralelo.
+    """
+
+    def __init__(self, reconcile, concurrency: int = 5, guild_timeout: float = 30.0):
+        self._reconcile = reconcile
+        self.concurrency = max(1, concurrency)
+        self.guild_timeout = guild_timeout
+        self._queued = set()
+        self._round = None # asyncio.Task de la ronda en curso
+        self.rounds = 0
+        self.last_report = None
+
+    async def run(self, guild_ids, reason: str = "arranque") -> ReconcileReport:
+        self._queued.update(guild_ids)
+        if self._round is None or self._round.done():
+            self._round = asyncio.get_running_loop().create_task(self._run_round(reason))
+        return await asyncio.shield(self._round)
+
+    async def _run_round(self, reason: str) -> ReconcileReport:
+        report = ReconcileReport(reason)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.perf_counter()
+        tasks = []
+        # Los servidores que llegan a mitad de la ronda se recogen en la siguiente vuelta del bucle
+        while self._queued:
+            batch, self._queued = self._queued, set()
+            tasks.extend(asyncio.create_task(self._reconcile_one(guild_id, semaphore, report)) for guild_id in batch)
+            await asyncio.gather(*tasks)
+        report.elapsed = time.perf_counter() - started
+        self.rounds += 1
+        self.last_report = report
+        return report
+
+    async def _reconcile_one(self, guild_id: int, semaphore: asyncio.Semaphore, report: ReconcileReport):
+        report.guilds += 1
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._reconcile(guild_id), self.guild_timeout)
+            except asyncio.TimeoutError:
+                report.failures[guild_id] = f"sin terminar tras {self.guild_timeout:g} s"
+            except Exception as e:
+                report.failures[guild_id] = str(e) or e.__class__.__name__
+            else:
+                report.succeeded += 1
+            elapsed = time.perf_counter() - started
+            if elapsed > report.slowest[1]:
+                report.slowest = (guild_id, elapsed)
+
+    def stats(self) -> dict:
+        report = self.last_report
+        return {
+            "rounds": self.rounds,
+            "last_guilds": report.guilds if report else 0,
+            "last_failures": len(report.failures) if report else 0,
+            "last_seconds": round(report.elapsed, 3) if report else 0.0,
+        }
@@ -0,0 +1,270 @@
+# --- Modo difusión: un solo ffmpeg/codificador Opus por emisora ---
+# Todos los servidores que escuchan la misma emisora comparten una conexión al stream, un ffmpeg
+# y una sola codificación Opus. Los frames se reparten a cada cliente de voz a través de un
+# buffer circular acotado: el productor nunca se bloquea y un oyente lento pierde frames en vez
+# de frenar a los demás.
+import threading
+import time
+
+import discord
+
+from audio_pipeline import OGG_OPUS_HEADERS, OPUS_SILENCE
+
+
+class OpusFrameRing:
+    """Buffer circular de frames Opus con número de secuencia monotónico."""
+
+    __slots__ = ("_slots", "_capacity", "_write_seq", "_cond", "closed")
+
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._slots = [None] * capacity
+        self._write_seq = 0
+        self._cond = threading.Condition()
+        self.closed = False
+
+    @property
+    def write_seq(self) -> int:
+        return self._write_seq
+
+    def push(self, frame: bytes):
+        with self._cond:
+            self._slots[self._write_seq % self._capacity] = frame
+            self._write_seq += 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def start_seq(self, lead: int) -> int:
+        """Secuencia inicial para un oyente nuevo: unos pocos frames detrás del borde en vivo."""
+        with self._cond:
+            return max(0, self._write_seq - min(lead, self._capacity))
+
+    def read(self, seq: int, timeout: float):
+        """Devuelve ``(frame, siguiente_seq, frames_perdidos)``; ``frame`` es None si no llegó nada a tiempo."""
+        with self._cond:
+            if seq >= self._write_seq and not self.closed:
+                self._cond.wait(timeout)
+            if seq >= self._write_seq:
+                return None, seq, 0
+            dropped = 0
+            oldest = self._write_seq - self._capacity
+            if seq < oldest: # El oyente se quedó atrás: saltar al frame más antiguo disponible
+                dropped = oldest - seq
+                seq = oldest
+            return self._slots[seq % self._capacity], seq + 1, dropped
+
+
+class BroadcastListener(discord.AudioSource):
+    """Fuente de audio de un cliente de voz suscrito a una emisora compartida."""
+
+    def __init__(self, broadcast, lead_frames: int, underrun_timeout: float):
+        self._broadcast = broadcast
+        self._ring = broadcast.ring
+        self._seq = self._ring.start_seq(lead_frames)
+        self._underrun_timeout = underrun_timeout
+        self._closed = False
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.underruns = 0
+
+    @property
+    def _current_error(self):
+        # AudioPlayer lo consulta cuando read() devuelve vacío
+        return self._broadcast.error
+
+    @property
+    def is_alive(self) -> bool:
+        return not self._closed and not self._ring.closed
+
+    def read(self) -> bytes:
+        frame, self._seq, dropped = self._ring.read(self._seq, self._underrun_timeout)
+        if dropped:
+            self.frames_dropped += dropped
+        if frame is None:
+            if self._ring.closed or self._closed:
+                return b'' # La emisora compartida terminó: el reproductor llama a su "after"
+            self.underruns += 1
+            return OPUS_SILENCE # Mantener el ritmo mientras el productor se recupera
+        self.frames_sent += 1
+        return frame
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self):
+        if not self._closed:
+            self._closed = True
+            self._broadcast.unsubscribe(self)
+
+
+class StationBroadcast:
+    """Una emisora en modo difusión: lee frames Opus de ffmpeg en un hilo y los publica en el ring."""
+
+    def __init__(self, url: str, name: str, source_factory, capacity: int, on_idle=None):
+        self.url = url
+        self.name = name
+        self.ring = OpusFrameRing(capacity)
+        self.error = None
+        self.frames_produced = 0
+        self.started_at = None
+        self.last_frame_at = None
+        self._source_factory = source_factory
+        self._source = None
+        self._listeners = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._on_idle = on_idle
+
+    @property
+    def listener_count(self) -> int:
+        return len(self._listeners)
+
+    @property
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self.ring.closed
+
+    def start(self):
+        self._source = self._source_factory(self.url)
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._pump, daemon=True, name=f"broadcast:{self.name}")
+        self._thread.start()
+
+    def _pump(self):
+        source = self._source
+        try:
+            while not self._stop.is_set():
+                packet = source.read()
+                if not packet:
+                    self.error = getattr(source, "_current_error", None)
+                    break
+                if packet.startswith(OGG_OPUS_HEADERS):
+                    continue
+                self.ring.push(packet)
+                self.frames_produced += 1
+                self.last_frame_at = time.monotonic()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ring.close()
+            try:
+                source.cleanup()
+            except Exception as e:
+                print(f"Error limpiando ffmpeg de la difusión {self.name}: {e}")
+            if not self._stop.is_set():
+                print(f"La difusión de {self.name} terminó ({self.error or 'fin del stream'}).")
+
+    def subscribe(self, lead_frames: int, underrun_timeout: float) -> BroadcastListener:
+        listener = BroadcastListener(self, lead_frames, underrun_timeout)
+        with self._lock:
+            self._listeners.add(listener)
+        return listener
+
+    def unsubscribe(self, listener: BroadcastListener):
+        with self._lock:
+            self._listeners.discard(listener)
+            idle = not self._listeners
+        if idle and self._on_idle:
+            self._on_idle(self)
+
+    def stop(self):
+        self._stop.set()
+        self.ring.close()
+        # El hilo termina al volver de source.read(); matar ffmpeg lo desbloquea si estaba esperando datos
+        source = self._source
+        if source is not None:
+            try:
+                source.cleanup()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            listeners = list(self._listeners)
+        return {
+            "name": self.name,
+            "listeners": len(listeners),
+            "frames_produced": self.frames_produced,
+            "frames_sent": sum(l.frames_sent for l in listeners),
+            "frames_dropped": sum(l.frames_dropped for l in listeners),
+            "underruns": sum(l.underruns for l in listeners),
+        }
+
+
+class BroadcastHub:
+    """Registro de difusiones activas indexado por URL del stream."""
+
+    def __init__(self, source_factory, capacity: int = 250, lead_frames: int = 5, underrun_timeout: float = 0.06):
+        self._source_factory = source_factory
+        self._capacity = capacity
+        self._lead_frames = lead_frames
+        self._underrun_timeout = underrun_timeout
+        self._broadcasts = {}
+        self._lock = threading.Lock()
+
+    def is_live(self, url: str) -> bool:
+        broadcast = self._broadcasts.get(url)
+        return broadcast is not None and broadcast.is_alive
+
+    def listen(self, url: str, name: str, on_start=None) -> BroadcastListener:
+        """Suscribe un nuevo oyente a la emisora, arrancando su difusión si no existe o ya terminó.
+
+        ``on_start(source)`` se llama con la fuente ffmpeg solo si se arrancó una difusión nueva.
+        """
+        with self._lock:
+            broadcast = self._broadcasts.get(url)
+            if broadcast is None or not broadcast.is_alive:
+                broadcast = StationBroadcast(url, name, self._source_factory, self._capacity, on_idle=self._release)
+                broadcast.start()
+                self._broadcasts[url] = broadcast
+                if on_start:
+                    on_start(broadcast._source)
+                print(f"Difusión iniciada para {name}.")
+            return broadcast.subscribe(self._lead_frames, self._underrun_timeout)
+
+    def drop_stalled(self, url: str, deadline: float) -> bool:
+        """Detiene la difusión de la URL si lleva más de ``deadline`` segundos sin producir frames.
+
+        Sus oyentes terminan y cada servidor se recupera por su cuenta; el primero en volver
+        arranca una difusión nueva y el resto se suma a ella.
+        """
+        with self._lock:
+            broadcast = self._broadcasts.get(url)
+            if broadcast is None:
+                return False
+            last = broadcast.last_frame_at or broadcast.started_at
+            if time.monotonic() - last < deadline:
+                return False
+            del self._broadcasts[url]
+        broadcast.stop()
+        print(f"Difusión de {broadcast.name} detenida por falta de audio.")
+        return True
+
+    def _release(self, broadcast: StationBroadcast):
+        # Sin oyentes: cerrar la conexión y el ffmpeg de la emisora
+        with self._lock:
+            if broadcast.listener_count:
+                return
+            if self._broadcasts.get(broadcast.url) is broadcast:
+                del self._broadcasts[broadcast.url]
+        broadcast.stop()
+        print(f"Difusión de {broadcast.name} detenida (sin oyentes).")
+
+    def stop_all(self):
+        with self._lock:
+            broadcasts = list(self._broadcasts.values())
+            self._broadcasts.clear()
+        for broadcast in broadcasts:
+            broadcast.stop()
+
+    def __len__(self):
+        return len(self._broadcasts)
+
+    def stats(self) -> list:
+        with self._lock:
+            broadcasts = list(self._broadcasts.values())
+        return [b.stats() for b in broadcasts]
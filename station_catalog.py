@@ -0,0 +1,450 @@
+# --- Catálogo de emisoras: archivo local grande con índice de prefijos y corrección de palabras ---
+# Además de PREDEFINED_STATIONS se puede cargar un catálogo JSON Lines (una emisora por línea, con
+# "name", "url" y opcionalmente "key", "genre", "country", "mirrors", "playback"). El archivo se
+# mapea en memoria y solo se guarda lo necesario para buscar; el resto de cada emisora se lee de
+# su línea cuando se pide. El índice se arma una vez, en un hilo, la primera vez que hace falta.
+import array
+import asyncio
+import bisect
+import collections
+import json
+import mmap
+import re
+import threading
+import time
+import unicodedata
+
+MAX_PREFIX_CANDIDATES = 5000 # Tope de emisoras a revisar por consulta
+SCAN_LIMIT = 1000 # Si el token más raro calza con menos emisoras que esto, se revisan una a una
+SPARSE_MASK_LIMIT = 2000 # Emisoras de palabras poco comunes que se pasan a bits para intersectar un token
+# Ediciones (inserción, borrado, cambio o transposición) que se toleran al corregir una palabra, según su
+# largo: hasta 5 letras una, más largas dos. Así "rok"/"rokc" llegan a "rock" sin que una palabra corta
+# calce con cualquier otra
+FUZZY_MAX_EDITS = ((5, 1),)
+FUZZY_MAX_EDITS_LONG = 2
+MAX_FUZZY_CANDIDATES = 500 # Tope de palabras a las que se les calcula la distancia de edición por consulta
+MAX_KEY_LENGTH = 80 # Las claves van como value de SelectOption y de Choice (máximo 100 caracteres)
+
+_HASH_MASK = 0xFFFFFFFF
+_WORD_MASK = (1 << 30) - 1 # Ids de palabra en los 30 bits bajos de cada entrada del índice de borrados
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_NONZERO_BYTE = re.compile(rb"[^\x00]")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sin tildes y solo letras/números separados por un espacio."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def normalize_key(key) -> str:
+    """Clave de emisora tal como la compara el bot (la entrada del usuario se pasa a minúsculas)."""
+    return str(key).lower().strip()[:MAX_KEY_LENGTH]
+
+
+def _max_edits(length: int) -> int:
+    for max_length, edits in FUZZY_MAX_EDITS:
+        if length <= max_length:
+            return edits
+    return FUZZY_MAX_EDITS_LONG
+
+
+def _deletions(word: str, depth: int) -> dict:
+    """``word`` y sus variantes con hasta ``depth`` letras menos, con cuántas se borraron.
+
+    Dos palabras a ``k`` ediciones comparten alguna variante con a lo sumo ``k`` borrados de cada lado
+    (un cambio o una transposición es un borrado en cada una; una letra de más, un borrado en la otra).
+    """
+    variants = {word: 0}
+    level = [word]
+    for deleted in range(1, depth + 1):
+        level = {variant[:i] + variant[i + 1:] for variant in level for i in range(len(variant))} - variants.keys()
+        variants.update(dict.fromkeys(level, deleted))
+    return variants
+
+
+def _char_masks(word: str) -> dict:
+    """Para cada carácter de ``word``, los bits de las posiciones en que aparece."""
+    masks = {}
+    for i, char in enumerate(word):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+
+def _edit_distance(a: str, b: str, masks: dict = None) -> int:
+    """Distancia de edición con transposiciones (OSA) entre ``a`` y ``b``.
+
+    Versión por bits de Hyyrö (2003): cada columna de la matriz es un entero, así que el costo es
+    lineal en ``len(b)``. ``masks`` es ``_char_masks(a)``, para no recalcularlo con cada palabra.
+    """
+    length = len(a)
+    if not length:
+        return len(b)
+    if masks is None:
+        masks = _char_masks(a)
+    full = (1 << length) - 1
+    last = 1 << (length - 1)
+    vp, vn, d0, previous, distance = full, 0, 0, 0, length
+    for char in b:
+        pm = masks.get(char, 0)
+        transposed = ((~d0 & pm) << 1) & previous
+        d0 = ((((pm & vp) + vp) ^ vp) | pm | vn | transposed) & full
+        hp = vn | ~(d0 | vp)
+        hn = d0 & vp
+        if hp & last:
+            distance += 1
+        elif hn & last:
+            distance -= 1
+        hp = (hp << 1) | 1
+        hn <<= 1
+        vp = (hn | ~(d0 | hp)) & full
+        vn = hp & d0 & full
+        previous = pm
+    return distance
+
+
+def _bitmap(ids, size: int) -> int:
+    bits = bytearray(size // 8 + 1)
+    for i in ids:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _iter_bits(mask: int):
+    """Posiciones de los bits encendidos de ``mask``, de menor a mayor."""
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    for match in _NONZERO_BYTE.finditer(data):
+        base = match.start() * 8
+        byte = data[match.start()]
+        while byte:
+            low = byte & -byte
+            yield base + low.bit_length() - 1
+            byte ^= low
+
+
+class _CatalogIndex:
+    """Estructuras de búsqueda inmutables; el catálogo reemplaza la instancia entera al cargar."""
+
+    def __init__(self, keys, names, genres, countries, offsets):
+        self.keys = keys
+        self.names = names
+        self.genres = genres
+        self.countries = countries
+        self.offsets = offsets # -1 = emisora de PREDEFINED_STATIONS
+        self.ids = {key: i for i, key in enumerate(keys)}
+        self.normalized_names = [normalize(name) for name in names]
+        # " nombre genero pais ": ``" " + token in texto`` comprueba si token es prefijo de alguna palabra
+        self.texts = [
+            f" {name} {normalize(genre)} {normalize(country)} "
+            for name, genre, country in zip(self.normalized_names, genres, countries)
+        ]
+        postings = collections.defaultdict(list)
+        for i, text in enumerate(self.texts):
+            for word in set(text.split()):
+                postings[word].append(i)
+        self.words = sorted(postings)
+        self.postings = [array.array("I", postings[word]) for word in self.words]
+        # Suma acumulada del largo de las listas: estima en O(1) cuántas emisoras calzan con un prefijo
+        self.cumulative = array.array("Q", [0])
+        for posting in self.postings:
+            self.cumulative.append(self.cumulative[-1] + len(posting))
+        # Las palabras muy comunes ("radio", "fm", países) además se guardan como mapa de bits: así
+        # "radio fm chile" se resuelve con AND de enteros en vez de revisar miles de emisoras
+        self.dense_min = max(64, len(keys) // 128)
+        self.dense = {w: _bitmap(posting, len(keys)) for w, posting in enumerate(self.postings) if len(posting) >= self.dense_min}
+        self.sparse_cumulative = array.array("Q", [0])
+        for w, posting in enumerate(self.postings):
+            self.sparse_cumulative.append(self.sparse_cumulative[-1] + (0 if w in self.dense else len(posting)))
+        # Para corregir palabras mal escritas (sobre el vocabulario, no sobre las emisoras), un índice
+        # de borrados como el de SymSpell pero compacto: por cada variante de ``_deletions`` un entero con
+        # su hash de 32 bits, cuántas letras se borraron y el id de la palabra, todos ordenados. Las
+        # candidatas salen de una búsqueda binaria por variante del token, sin recorrer el vocabulario.
+        # Del lado de la palabra nunca hacen falta más borrados que las ediciones que admite su largo:
+        # un token más largo gasta ediciones en las letras que le sobran.
+        self.word_deletions = array.array("Q", sorted(
+            (hash(variant) & _HASH_MASK) << 32 | deleted << 30 | w
+            for w, word in enumerate(self.words)
+            for variant, deleted in _deletions(word, _max_edits(len(word))).items()
+        ))
+        order = sorted(range(len(keys)), key=self.normalized_names.__getitem__)
+        self.sorted_names = [self.normalized_names[i] for i in order]
+        self.sorted_name_ids = array.array("I", order)
+
+    def prefix_range(self, token: str):
+        lo = bisect.bisect_left(self.words, token)
+        hi = bisect.bisect_left(self.words, token + "\x7f", lo)
+        return lo, hi
+
+    def search(self, query: str, limit: int) -> list:
+        query = normalize(query)
+        if not query:
+            return list(range(min(limit, len(self.keys))))
+        results = self._name_prefix(query, limit)
+        if len(results) < limit:
+            tokens = query.split()
+            ranges = [self.prefix_range(token) for token in tokens]
+            if not all(lo < hi for lo, hi in ranges):
+                tokens = [token if lo < hi else self.correct(token) for token, (lo, hi) in zip(tokens, ranges)]
+                if None in tokens:
+                    return results
+                ranges = [self.prefix_range(token) for token in tokens]
+            results.extend(self._word_prefix(tokens, ranges, limit - len(results), set(results)))
+        return results
+
+    def _name_prefix(self, query: str, limit: int) -> list:
+        # Nombres que empiezan con la consulta, en orden alfabético (el nombre exacto queda primero)
+        names = self.sorted_names
+        i = bisect.bisect_left(names, query)
+        results = []
+        while i < len(names) and len(results) < limit and names[i].startswith(query):
+            results.append(self.sorted_name_ids[i])
+            i += 1
+        return results
+
+    def _word_prefix(self, tokens: list, ranges: list, limit: int, exclude: set) -> list:
+        # Emisoras en que cada token es prefijo de alguna palabra del nombre, género o país
+        cumulative = self.cumulative
+        estimates = [cumulative[hi] - cumulative[lo] for lo, hi in ranges]
+        order = sorted(range(len(tokens)), key=estimates.__getitem__)
+        if len(tokens) == 1 or estimates[order[0]] <= SCAN_LIMIT:
+            lo, hi = ranges[order[0]]
+            candidates = (i for posting in self.postings[lo:hi] for i in posting)
+            return self._filter(candidates, [tokens[t] for t in order[1:]], limit, exclude)
+        # Todos los tokens son comunes: intersectar mapas de bits y revisar a mano solo los que no se pudieron pasar a bits
+        mask = None
+        unmasked = []
+        for t in order:
+            lo, hi = ranges[t]
+            if self.sparse_cumulative[hi] - self.sparse_cumulative[lo] > SPARSE_MASK_LIMIT:
+                unmasked.append(tokens[t])
+                continue
+            token_mask = self._token_mask(lo, hi)
+            mask = token_mask if mask is None else mask & token_mask
+        if mask is None:
+            lo, hi = ranges[order[0]]
+            candidates = (i for posting in self.postings[lo:hi] for i in posting)
+            return self._filter(candidates, [tokens[t] for t in order[1:]], limit, exclude)
+        return self._filter(_iter_bits(mask), unmasked, limit, exclude)
+
+    def _token_mask(self, lo: int, hi: int) -> int:
+        mask = 0
+        sparse = []
+        for w in range(lo, hi):
+            dense = self.dense.get(w)
+            if dense is not None:
+                mask |= dense
+            else:
+                sparse.extend(self.postings[w])
+        if sparse:
+            mask |= _bitmap(sparse, len(self.keys))
+        return mask
+
+    def _filter(self, candidates, tokens: list, limit: int, exclude: set) -> list:
+        others = [" " + token for token in tokens]
+        texts = self.texts
+        results = []
+        for checked, i in enumerate(candidates):
+            if checked >= MAX_PREFIX_CANDIDATES:
+                break
+            if i not in exclude and all(token in texts[i] for token in others):
+                exclude.add(i)
+                results.append(i)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def correct(self, token: str):
+        """Palabra del vocabulario más cercana a ``token`` ("rok" -> "rock", "metalica" -> "metallica"), o None.
+
+        Gana la menor distancia de edición (con transposiciones) dentro del tope según el largo; a igual
+        distancia, la palabra que está en más emisoras ("rokc" -> "rock" antes que "roka"). La mayoría
+        de los errores son de una edición, así que primero se buscan solo esas (pocas variantes) y las
+        de dos ediciones únicamente si no hay ninguna.
+        """
+        max_edits = _max_edits(len(token))
+        variants = _deletions(token, max_edits)
+        masks = _char_masks(token)
+        distances = {}
+        for limit in range(1, max_edits + 1):
+            best = self._closest(token, masks, variants, limit, distances)
+            if best is not None:
+                return best
+        return None
+
+    def _closest(self, token: str, masks: dict, variants: dict, limit: int, distances: dict):
+        deletions, words, postings = self.word_deletions, self.words, self.postings
+        best, best_rank = None, None
+        for variant, deleted in variants.items():
+            if deleted > limit:
+                continue
+            key = hash(variant) & _HASH_MASK
+            i = bisect.bisect_left(deletions, key << 32)
+            while i < len(deletions) and deletions[i] >> 32 == key:
+                entry = deletions[i]
+                i += 1
+                w = entry & _WORD_MASK
+                if entry >> 30 & 3 > limit or abs(len(words[w]) - len(token)) > limit:
+                    continue
+                distance = distances.get(w)
+                if distance is None:
+                    if len(distances) >= MAX_FUZZY_CANDIDATES:
+                        continue
+                    # Comparten una variante, pero pueden estar más lejos (o ser un choque de hash)
+                    distance = distances[w] = _edit_distance(token, words[w], masks)
+                if distance > limit:
+                    continue
+                rank = (distance, -len(postings[w]))
+                if best_rank is None or rank < best_rank:
+                    best, best_rank = words[w], rank
+        return best
+
+
+class StationCatalog:
+    """Emisoras de ``builtin`` (PREDEFINED_STATIONS) más las del archivo ``path``, con búsqueda indexada.
+
+    :meth:`get` devuelve un diccionario con la misma forma que las entradas de PREDEFINED_STATIONS.
+    Hasta que termine :meth:`ensure_loaded` solo se conocen las emisoras de ``builtin``.
+    """
+
+    def __init__(self, builtin: dict, path: str = None):
+        self.path = path
+        self._builtin = builtin
+        self._index = self._build_index([], [], [], [], array.array("q"))
+        self._mmap = None
+        self._file = None
+        self._load_lock = threading.Lock()
+        self._loading = None
+        self.loaded = not path
+        self.load_seconds = None
+        self.skipped_lines = 0
+
+    def __len__(self) -> int:
+        return len(self._index.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index.ids
+
+    def _build_index(self, keys, names, genres, countries, offsets) -> _CatalogIndex:
+        builtin = self._builtin
+        return _CatalogIndex(
+            [*builtin, *keys],
+            [station["name"] for station in builtin.values()] + names,
+            [station.get("genre", "") for station in builtin.values()] + genres,
+            [station.get("country", "") for station in builtin.values()] + countries,
+            array.array("q", [-1] * len(builtin)) + offsets,
+        )
+
+    async def ensure_loaded(self):
+        """Carga el archivo e indexa en un hilo (una sola vez, aunque lo pidan varios a la vez)."""
+        if self.loaded:
+            return
+        if self._loading is None:
+            self._loading = asyncio.get_running_loop().run_in_executor(None, self.load)
+        await asyncio.shield(self._loading)
+
+    def load(self):
+        with self._load_lock:
+            if self.loaded:
+                return
+            started = time.perf_counter()
+            try:
+                self._load_file()
+            except OSError as e:
+                print(f"No se pudo abrir el catálogo de emisoras {self.path}: {e}")
+            self.loaded = True
+            self.load_seconds = time.perf_counter() - started
+            print(f"Catálogo de emisoras: {len(self)} emisoras indexadas en {self.load_seconds * 1000:.0f} ms.")
+
+    def _load_file(self):
+        keys, names, genres, countries = [], [], [], []
+        offsets = array.array("q")
+        used_keys = set(self._builtin)
+        suffixes = {}
+        self._file = open(self.path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Archivo vacío
+            return
+        data = self._mmap
+        offset = 0
+        while offset < len(data):
+            end = data.find(b"\n", offset)
+            if end < 0:
+                end = len(data)
+            line = data[offset:end].strip()
+            if line:
+                try:
+                    record = json.loads(line)
+                    name, url = record["name"], record["url"]
+                except (ValueError, KeyError, TypeError):
+                    self.skipped_lines += 1
+                else:
+                    # Claves en minúsculas y acotadas, como las compara el bot con lo que escribe el usuario
+                    key = normalize_key(record.get("key") or "") or normalize(name).replace(" ", "-")[:MAX_KEY_LENGTH] or "emisora"
+                    unique_key = key
+                    while unique_key in used_keys:
+                        # Nombres repetidos: "radio-fm", "radio-fm-2", "radio-fm-3"...
+                        suffixes[key] = suffixes.get(key, 1) + 1
+                        unique_key = f"{key}-{suffixes[key]}"
+                    used_keys.add(unique_key)
+                    keys.append(unique_key)
+                    names.append(str(name))
+                    genres.append(str(record.get("genre") or ""))
+                    countries.append(str(record.get("country") or ""))
+                    offsets.append(offset)
+            offset = end + 1
+        if self.skipped_lines:
+            print(f"Se omitieron {self.skipped_lines} líneas inválidas del catálogo {self.path}.")
+        self._index = self._build_index(keys, names, genres, countries, offsets)
+
+    def get(self, key: str):
+        """Datos de la emisora (``name``, ``url``, ``mirrors``, ``playback``...) o None."""
+        index = self._index
+        i = index.ids.get(key)
+        if i is None:
+            return None
+        offset = index.offsets[i]
+        if offset < 0:
+            return self._builtin[key]
+        end = self._mmap.find(b"\n", offset)
+        record = json.loads(self._mmap[offset:end if end >= 0 else len(self._mmap)])
+        record.setdefault("mirrors", [])
+        record["name"] = index.names[i]
+        return record
+
+    def keys(self, limit: int = None) -> list:
+        return self._index.keys[:limit]
+
+    def search(self, query: str, limit: int = 25) -> list:
+        """Claves de las emisoras que mejor calzan con ``query`` (prefijos por palabra, corrigiendo las mal escritas)."""
+        index = self._index
+        return [index.keys[i] for i in index.search(query, limit)]
+
+    def describe(self, key: str) -> tuple:
+        """``(nombre, "género · país")`` sin leer la línea del archivo, para menús y autocompletado."""
+        index = self._index
+        i = index.ids[key]
+        details = " · ".join(part for part in (index.genres[i], index.countries[i]) if part)
+        return index.names[i], details
+
+    def page(self, query: str, page: int, size: int = 25):
+        """Página ``page`` de resultados: ``(claves, página_real, hay_más)``."""
+        page = max(0, page)
+        if not normalize(query):
+            keys = self._index.keys
+            last_page = max(0, (len(keys) - 1) // size)
+            page = min(page, last_page)
+            return keys[page * size:(page + 1) * size], page, page < last_page
+        results = self.search(query, limit=(page + 1) * size + 1)
+        last_page = max(0, (len(results) - 1) // size)
+        page = min(page, last_page)
+        return results[page * size:(page + 1) * size], page, len(results) > (page + 1) * size
+
+    def stats(self) -> dict:
+        return {
+            "stations": len(self),
+            "loaded": self.loaded,
+            "load_ms": round(self.load_seconds * 1000) if self.load_seconds is not None else None,
+            "words": len(self._index.words),
+            "skipped_lines": self.skipped_lines,
+        }
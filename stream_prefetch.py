@@ -0,0 +1,108 @@
+# --- Streams en espera ("warm standby") para cambiar de emisora al instante ---
+# Un ffmpeg recién lanzado tiene que resolver DNS, negociar TLS/HTTP, sondear el stream y llenar
+# su buffer antes de entregar el primer frame. Aquí se mantienen ffmpeg ya conectados para las
+# emisoras más elegidas, leyendo en segundo plano, de modo que cambiar de emisora sea solo
+# intercambiar la fuente del reproductor.
+import collections
+
+from jitter_buffer import JitterBuffer
+
+
+class WarmStream(JitterBuffer):
+    """Fuente ffmpeg que se lee por adelantado en un hilo y conserva los últimos ``max_frames`` frames.
+
+    Mientras está en espera no hay margen objetivo (``target_frames=0``); al entregarla a un
+    servidor se le puede fijar uno con :meth:`set_target`.
+    """
+
+    def __init__(self, source, max_frames: int, underrun_timeout: float = 0.06):
+        super().__init__(source, target_frames=0, max_frames=max_frames, underrun_timeout=underrun_timeout)
+
+
+class StreamPrefetchPool:
+    """Pool LRU de streams en espera para las emisoras más elegidas.
+
+    ``factory(station_key)`` crea la entrada en espera. Si ``exclusive`` es True las entradas
+    son :class:`WarmStream` que se entregan a un solo servidor con :meth:`claim` y se reponen;
+    si es False (modo difusión) la entrada solo mantiene viva la emisora compartida.
+    """
+
+    def __init__(self, factory, max_streams: int = 2, exclusive: bool = True):
+        self._factory = factory
+        self.max_streams = max_streams
+        self.exclusive = exclusive
+        self._warm = collections.OrderedDict() # station_key -> entrada, en orden LRU
+        self._selections = collections.Counter()
+        self._candidates = ()
+        self.hits = 0
+        self.misses = 0
+
+    def record_selection(self, station_key: str):
+        self._selections[station_key] += 1
+        if station_key in self._warm:
+            self._warm.move_to_end(station_key)
+
+    def set_candidates(self, station_keys):
+        """Emisoras elegibles (las del menú StationSelect), en orden de preferencia inicial."""
+        self._candidates = tuple(station_keys)
+
+    def desired(self) -> list:
+        # Las más elegidas primero; a igualdad se respeta el orden del menú
+        order = {key: i for i, key in enumerate(self._candidates)}
+        ranked = sorted(self._candidates, key=lambda k: (-self._selections[k], order[k]))
+        return ranked[:self.max_streams]
+
+    def claim(self, station_key: str):
+        """Entrega el stream en espera de la emisora (o None) y lo saca del pool."""
+        if not self.exclusive:
+            entry = self._warm.get(station_key)
+            if entry is not None:
+                self._warm.move_to_end(station_key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return None
+        entry = self._warm.pop(station_key, None)
+        if entry is None or not entry.is_alive:
+            if entry is not None:
+                entry.cleanup()
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def refresh(self):
+        """Arranca los streams que faltan y desaloja (LRU) los que sobran o murieron."""
+        if self.max_streams <= 0:
+            return
+        wanted = self.desired()
+        for key, entry in list(self._warm.items()):
+            if not entry.is_alive:
+                self._evict(key)
+        for key in wanted:
+            if key in self._warm:
+                continue
+            while len(self._warm) >= self.max_streams:
+                victim = next((k for k in self._warm if k not in wanted), next(iter(self._warm)))
+                self._evict(victim)
+            try:
+                self._warm[key] = self._factory(key)
+                print(f"Stream en espera preparado para '{key}'.")
+            except Exception as e:
+                print(f"No se pudo preparar el stream en espera de '{key}': {e}")
+
+    def _evict(self, station_key: str):
+        entry = self._warm.pop(station_key, None)
+        if entry is not None:
+            entry.cleanup()
+
+    def close(self):
+        for key in list(self._warm):
+            self._evict(key)
+
+    def stats(self) -> dict:
+        return {
+            "warm": list(self._warm),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,226 @@
+# --- Resolución de URLs de streams: playlists, redirecciones, espejos y caché con TTL ---
+# Antes de pasarle una URL a ffmpeg se expanden las playlists (.pls/.m3u/.m3u8), se siguen las
+# redirecciones y, si hay varios espejos, se elige el primero que responde. El resultado se guarda
+# por URL con un TTL (y un TTL corto para URLs muertas), así que las emisoras populares no pagan
+# nada en el camino caliente.
+import asyncio
+import configparser
+import time
+from urllib.parse import urljoin, urlparse
+
+import aiohttp
+
+PLAYLIST_CONTENT_TYPES = {
+    "audio/x-scpls": "pls",
+    "audio/scpls": "pls",
+    "audio/x-mpegurl": "m3u",
+    "audio/mpegurl": "m3u",
+    "application/x-mpegurl": "m3u",
+    "application/vnd.apple.mpegurl": "m3u",
+}
+PLAYLIST_EXTENSIONS = {".pls": "pls", ".m3u": "m3u", ".m3u8": "m3u"}
+MAX_PLAYLIST_BYTES = 64 * 1024
+MAX_PLAYLIST_DEPTH = 3
+
+
+class StreamResolveError(Exception):
+    """La URL no se pudo resolver a un stream reproducible."""
+
+
+def _playlist_kind(url: str, content_type: str):
+    kind = PLAYLIST_CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+    if kind:
+        return kind
+    path = urlparse(url).path.lower()
+    for ext, ext_kind in PLAYLIST_EXTENSIONS.items():
+        if path.endswith(ext):
+            return ext_kind
+    return None
+
+
+def parse_pls(text: str, base_url: str) -> list:
+    parser = configparser.ConfigParser(interpolation=None, strict=False)
+    parser.optionxform = str.lower
+    try:
+        parser.read_string(text)
+    except configparser.Error:
+        return []
+    section = next((s for s in parser.sections() if s.lower() == "playlist"), None)
+    if section is None:
+        return []
+    entries = sorted(
+        (int(key[4:]), value.strip()) for key, value in parser.items(section)
+        if key.startswith("file") and key[4:].isdigit()
+    )
+    return [urljoin(base_url, value) for _, value in entries if value]
+
+
+def parse_m3u(text: str, base_url: str):
+    """Devuelve ``(entradas, es_hls)``. En un HLS maestro las variantes van de mayor a menor ancho de banda."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if any(line.startswith("#EXT-X-TARGETDURATION") or line.startswith("#EXT-X-MEDIA-SEQUENCE") for line in lines):
+        return [base_url], True # Playlist de segmentos HLS: ffmpeg la maneja directamente
+    variants = []
+    entries = []
+    pending_bandwidth = None
+    for line in lines:
+        if line.startswith("#EXT-X-STREAM-INF"):
+            pending_bandwidth = 0
+            for attr in line.split(":", 1)[-1].split(","):
+                if attr.startswith("BANDWIDTH="):
+                    try:
+                        pending_bandwidth = int(attr.split("=", 1)[1])
+                    except ValueError:
+                        pass
+        elif line.startswith("#"):
+            continue
+        elif pending_bandwidth is not None:
+            variants.append((pending_bandwidth, urljoin(base_url, line)))
+            pending_bandwidth = None
+        else:
+            entries.append(urljoin(base_url, line))
+    if variants:
+        return [url for _, url in sorted(variants, reverse=True)], True
+    return entries, False
+
+
+class StreamResolver:
+    """Resuelve URLs de streams con caché TTL, caché negativa y resoluciones concurrentes deduplicadas."""
+
+    def __init__(self, ttl: float = 300.0, negative_ttl: float = 30.0, timeout: float = 5.0, max_entries: int = 2048):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._cache = {} # url -> (expira_en, url_resuelta | None, error | None)
+        self._inflight = {}
+        self._session = None
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+    def cached(self, url: str):
+        """URL resuelta si está en caché y vigente (sin tocar la red), o None."""
+        entry = self._cache.get(url)
+        if entry and entry[0] > time.monotonic() and entry[1]:
+            return entry[1]
+        return None
+
+    async def resolve(self, url: str) -> str:
+        if urlparse(url).scheme not in ("http", "https"):
+            return url # Archivos locales, rtmp, etc.: ffmpeg se encarga
+        entry = self._cache.get(url)
+        now = time.monotonic()
+        if entry and entry[0] > now:
+            if entry[1] is None:
+                self.negative_hits += 1
+                raise StreamResolveError(entry[2])
+            self.hits += 1
+            if entry[0] - now < self.ttl * 0.2 and url not in self._inflight:
+                # Refrescar en segundo plano antes de que expire, sin hacer esperar a nadie
+                self._start_resolution(url)
+            return entry[1]
+        self.misses += 1
+        future = self._inflight.get(url) or self._start_resolution(url)
+        return await asyncio.shield(future)
+
+    async def prewarm(self, urls):
+        results = await asyncio.gather(*(self.resolve(url) for url in urls), return_exceptions=True)
+        failed = [url for url, result in zip(urls, results) if isinstance(result, Exception)]
+        if failed:
+            print(f"No se pudieron resolver {len(failed)} URL(s) al precargar: {', '.join(failed)}")
+
+    def _start_resolution(self, url: str):
+        future = asyncio.get_running_loop().create_task(self._resolve_and_cache(url))
+        self._inflight[url] = future
+        future.add_done_callback(lambda task: self._finish_resolution(url, task))
+        return future
+
+    def _finish_resolution(self, url: str, task):
+        self._inflight.pop(url, None)
+        if not task.cancelled():
+            task.exception() # Los refrescos en segundo plano no los espera nadie: no avisar de excepción perdida
+
+    async def _resolve_and_cache(self, url: str) -> str:
+        try:
+            resolved = await self._resolve_candidates([url], depth=0)
+        except StreamResolveError as e:
+            if not self.cached(url): # Un refresco fallido no pisa un resultado que aún es válido
+                self._store(url, None, str(e), self.negative_ttl)
+            raise
+        self._store(url, resolved, None, self.ttl)
+        return resolved
+
+    def _store(self, url, resolved, error, ttl):
+        if url not in self._cache and len(self._cache) >= self.max_entries:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[url] = (time.monotonic() + ttl, resolved, error)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout),
+                headers={"User-Agent": "Rock-Bot/1.0", "Icy-MetaData": "0"},
+            )
+        return self._session
+
+    async def _resolve_candidates(self, urls: list, depth: int) -> str:
+        """Abre los candidatos en paralelo y se queda con el primero que responda como stream."""
+        tasks = [asyncio.ensure_future(self._resolve_one(url, depth)) for url in dict.fromkeys(urls)]
+        errors = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    return await next_done
+                except StreamResolveError as e:
+                    errors.append(str(e))
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise StreamResolveError("; ".join(errors) or "playlist vacía")
+
+    async def _resolve_one(self, url: str, depth: int) -> str:
+        if urlparse(url).scheme not in ("http", "https"):
+            return url
+        session = await self._get_session()
+        try:
+            async with session.get(url, allow_redirects=True) as response:
+                if response.status >= 400:
+                    raise StreamResolveError(f"{url} respondió HTTP {response.status}")
+                final_url = str(response.url)
+                kind = _playlist_kind(final_url, response.headers.get("Content-Type"))
+                if kind is None:
+                    return final_url # Es el stream de audio: no se descarga nada más
+                body = await response.content.read(MAX_PLAYLIST_BYTES)
+        except aiohttp.ClientResponseError as e:
+            if e.status and e.status >= 400:
+                raise StreamResolveError(f"{url} respondió HTTP {e.status}") from e
+            return url # Ej. servidores SHOUTcast v1 ("ICY 200 OK"): ffmpeg sí los entiende
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            raise StreamResolveError(f"{url} no responde ({e.__class__.__name__})") from e
+
+        text = body.decode("utf-8", errors="replace")
+        if kind == "pls":
+            entries, is_hls = parse_pls(text, final_url), False
+        else:
+            entries, is_hls = parse_m3u(text, final_url)
+        if is_hls:
+            # HLS: la variante de más calidad (o la propia playlist de segmentos) se le pasa a ffmpeg
+            return entries[0]
+        if not entries:
+            raise StreamResolveError(f"La playlist {url} no tiene entradas")
+        if depth + 1 >= MAX_PLAYLIST_DEPTH:
+            return entries[0]
+        return await self._resolve_candidates(entries, depth + 1)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+        }
@@ -0,0 +1,172 @@
+# --- Supervisor de streams: detecta cortes y recupera el audio sin intervención ---
+# Vigila el ritmo de entrega de frames de cada sesión. Si un stream no entrega audio real dentro
+# del plazo (o termina por error), se reinicia en la misma URL o en un espejo alternativo, con
+# espera exponencial con jitter para que cientos de servidores no reconecten al mismo CDN a la vez.
+import asyncio
+import random
+import time
+
+
+class BackoffPolicy:
+    """Espera exponencial con jitter: la mitad fija y la otra mitad aleatoria."""
+
+    def __init__(self, base: float = 1.0, cap: float = 60.0):
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt: int) -> float:
+        ceiling = min(self.cap, self.base * (2 ** attempt))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+def mirror_for_attempt(urls, attempt: int) -> str:
+    """URL a usar en el intento ``attempt``: el primero repite la principal, los siguientes rotan por los espejos."""
+    return urls[attempt % len(urls)]
+
+
+class _Watch:
+    __slots__ = ("source", "station_name", "healthy_since")
+
+    def __init__(self, source, station_name: str):
+        self.source = source
+        self.station_name = station_name
+        self.healthy_since = None
+
+
+class StreamSupervisor:
+    """Vigila las fuentes (:class:`audio_pipeline.MonitoredSource`) y programa su recuperación.
+
+    ``restart(guild_id, attempt)`` es una corrutina que vuelve a poner a sonar la emisora de la
+    sesión; ``attempt`` permite rotar entre los espejos. Debe devolver False si ya no hay nada que
+    recuperar (ej. el bot salió del canal). ``clock`` es el reloj con el que las fuentes marcan
+    ``started_at``/``last_frame_at`` (``time.monotonic``).
+    """
+
+    def __init__(self, restart, stall_deadline: float = 8.0, startup_deadline: float = 15.0,
+                 check_interval: float = 1.0, backoff: BackoffPolicy = None, max_attempts: int = 8,
+                 healthy_after: float = 30.0, on_give_up=None, clock=time.monotonic):
+        self._restart = restart
+        self.stall_deadline = stall_deadline
+        self.startup_deadline = startup_deadline
+        self.check_interval = check_interval
+        self.backoff = backoff or BackoffPolicy()
+        self.max_attempts = max_attempts
+        self.healthy_after = healthy_after
+        self._on_give_up = on_give_up
+        self._clock = clock
+        self._watches = {} # guild_id -> _Watch
+        self._attempts = {} # guild_id -> intentos seguidos sin recuperar audio estable
+        self._recoveries = {} # guild_id -> asyncio.Task
+        self._task = None
+        self.stalls_detected = 0
+        self.restarts = 0
+        self.recovered = 0
+        self.gave_up = 0
+        self.recovery_seconds = [] # Tiempo desde el corte hasta volver a tener audio (últimas 100)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._watch_loop())
+
+    def watch(self, guild_id: int, source, station_name: str):
+        self._watches[guild_id] = _Watch(source, station_name)
+
+    def unwatch(self, guild_id: int):
+        """La sesión dejó de sonar a propósito (stop, salir del canal): no recuperar."""
+        self._watches.pop(guild_id, None)
+        self._attempts.pop(guild_id, None)
+        task = self._recoveries.pop(guild_id, None)
+        if task:
+            task.cancel()
+
+    def is_recovering(self, guild_id: int) -> bool:
+        return guild_id in self._recoveries
+
+    def report_failure(self, guild_id: int, reason: str):
+        """El reproductor terminó solo o con error: programar la recuperación."""
+        self._schedule_recovery(guild_id, reason, stalled_at=self._clock())
+
+    async def _watch_loop(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            now = self._clock()
+            for guild_id, watch in list(self._watches.items()):
+                if guild_id in self._recoveries:
+                    continue
+                source = watch.source
+                if source.last_frame_at is None:
+                    if now - source.started_at > self.startup_deadline:
+                        self.stalls_detected += 1
+                        self._schedule_recovery(guild_id, f"{watch.station_name} no entregó audio en {self.startup_deadline:.0f} s", source.started_at)
+                    continue
+                silent_for = now - source.last_frame_at
+                if silent_for > self.stall_deadline:
+                    self.stalls_detected += 1
+                    self._schedule_recovery(guild_id, f"{watch.station_name} lleva {silent_for:.0f} s sin audio", source.last_frame_at)
+                    continue
+                if watch.healthy_since is None:
+                    watch.healthy_since = source.first_frame_at
+                if guild_id in self._attempts and now - watch.healthy_since > self.healthy_after:
+                    self._attempts.pop(guild_id, None) # Audio estable: el próximo corte parte de cero
+
+    def _schedule_recovery(self, guild_id: int, reason: str, stalled_at: float):
+        if guild_id in self._recoveries:
+            return
+        attempt = self._attempts.get(guild_id, 0)
+        if attempt >= self.max_attempts:
+            self.gave_up += 1
+            print(f"Se abandona la recuperación en guild {guild_id} tras {attempt} intentos: {reason}")
+            self._watches.pop(guild_id, None)
+            self._attempts.pop(guild_id, None)
+            if self._on_give_up:
+                asyncio.get_running_loop().create_task(self._on_give_up(guild_id, reason))
+            return
+        self._attempts[guild_id] = attempt + 1
+        self._watches.pop(guild_id, None)
+        delay = self.backoff.delay(attempt)
+        print(f"Corte detectado en guild {guild_id} ({reason}). Reintento {attempt + 1} en {delay:.1f} s.")
+        self._recoveries[guild_id] = asyncio.get_running_loop().create_task(self._recover(guild_id, attempt, delay, stalled_at))
+
+    async def _recover(self, guild_id: int, attempt: int, delay: float, stalled_at: float):
+        try:
+            await asyncio.sleep(delay)
+            self.restarts += 1
+            restarted = await self._restart(guild_id, attempt)
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            restarted = None
+            print(f"Error reiniciando el stream en guild {guild_id}: {e}")
+        finally:
+            if self._recoveries.get(guild_id) is asyncio.current_task():
+                del self._recoveries[guild_id]
+        if restarted is False:
+            self._attempts.pop(guild_id, None)
+            return
+        watch = self._watches.get(guild_id)
+        if watch is None:
+            # No se pudo crear la fuente: el siguiente intento espera más (y prueba otro espejo)
+            self._schedule_recovery(guild_id, "el reinicio falló", stalled_at)
+            return
+        asyncio.get_running_loop().create_task(self._measure_recovery(watch, stalled_at))
+
+    async def _measure_recovery(self, watch: _Watch, stalled_at: float):
+        # Esperar el primer frame real de la fuente nueva para medir el tiempo de recuperación
+        deadline = self._clock() + self.startup_deadline
+        while watch.source.first_frame_at is None and self._clock() < deadline:
+            await asyncio.sleep(0.1)
+        if watch.source.first_frame_at is not None:
+            self.recovered += 1
+            self.recovery_seconds.append(watch.source.first_frame_at - stalled_at)
+            del self.recovery_seconds[:-100]
+            print(f"Audio de {watch.station_name} recuperado en {watch.source.first_frame_at - stalled_at:.1f} s.")
+
+    def stats(self) -> dict:
+        return {
+            "watched": len(self._watches),
+            "recovering": len(self._recoveries),
+            "stalls_detected": self.stalls_detected,
+            "restarts": self.restarts,
+            "recovered": self.recovered,
+            "gave_up": self.gave_up,
+        }
@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+
+import discord
+import pytest
+from discord.opus import Encoder as OpusEncoder
+
+from audio_pipeline import PCM_SILENCE
+
+np = pytest.importorskip("numpy")
+
+from audio_dsp import FRAME_VALUES, DSPSource, StationLoudness, db_to_gain # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def frame(*values) -> bytes:
+    """Frame PCM s16 estéreo: ``values`` se repite hasta completar las muestras del frame."""
+    return np.resize(np.array(values, dtype=np.int16), FRAME_VALUES).tobytes()
+
+
+def samples(data) -> np.ndarray:
+    assert len(data) == OpusEncoder.FRAME_SIZE
+    return np.frombuffer(bytes(data), dtype=np.int16)
+
+
+class ScriptedSource(discord.AudioSource):
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.cleaned = False
+
+    def read(self):
+        return self.frames.pop(0) if self.frames else b""
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        self.cleaned = True
+
+
+def test_volume_scales_samples_and_keeps_frame_size():
+    dsp = DSPSource(ScriptedSource([frame(1000, -1000, 4, -3)] * 2), volume=0.5, batch_frames=1)
+    out = dsp.read()
+    assert not isinstance(out, bytes) # Vista sobre la memoria reservada
+    assert samples(out)[:4].tolist() == [500, -500, 2, -1] # float32 -> int16 trunca hacia cero
+    assert samples(dsp.read())[:4].tolist() == [500, -500, 2, -1]
+    assert dsp.read() == b""
+
+
+def test_gain_is_clipped_to_int16_range():
+    dsp = DSPSource(ScriptedSource([frame(30000, -30000, 100, 32767)]), volume=2.0, batch_frames=1)
+    out = samples(dsp.read())
+    assert out[:4].tolist() == [32767, -32768, 200, 32767]
+    assert out.dtype == np.int16 and out.min() >= -32768 and out.max() <= 32767
+
+
+def test_volume_change_ramps_within_one_batch():
+    source = ScriptedSource([frame(10000)] * 2)
+    dsp = DSPSource(source, volume=1.0, batch_frames=1)
+    assert set(samples(dsp.read()).tolist()) == {10000}
+    dsp.volume = 0.5
+    ramp = samples(dsp.read()).astype(np.int32)
+    assert ramp[0] > 9900 and ramp[-1] == 5000 # Sin salto: parte de la ganancia anterior y llega a la nueva
+    assert np.all(np.diff(ramp) <= 0)
+    assert dsp.gain == 0.5
+
+
+def test_batches_buffered_frames_and_passes_silence_untouched():
+    source = ScriptedSource([frame(100), frame(200), PCM_SILENCE, frame(300)])
+    dsp = DSPSource(source, volume=2.0, batch_frames=5, buffered=lambda: len(source.frames))
+    # Cada frame se copia al leerlo: las vistas se reutilizan en el lote siguiente, como en el reproductor
+    outputs = [out if out is PCM_SILENCE or not out else samples(out)[0] for out in (dsp.read() for _ in range(5))]
+    assert outputs[:2] == [200, 400]
+    assert outputs[2] is PCM_SILENCE # El silencio de relleno se entrega tal cual, sin procesar
+    assert outputs[3:] == [600, b""]
+    assert dsp.stats()["frames"] == 3 and dsp.stats()["frames_per_batch"] == 1.5
+
+
+def test_loudness_brings_stations_to_target_with_limits():
+    loudness = StationLoudness(target_dbfs=-18, max_boost_db=9, max_cut_db=15)
+    full = 32768.0
+    loudness.observe("normal", [(full * db_to_gain(-24)) ** 2] * 10)
+    loudness.observe("bajita", [(full * db_to_gain(-40)) ** 2] * 10)
+    loudness.observe("muda", [0.0] * 10) # Bajo la compuerta: no cuenta
+    assert loudness.level_dbfs("normal") == -24.0
+    assert loudness.gain("normal") == pytest.approx(db_to_gain(6))
+    assert loudness.gain("bajita") == pytest.approx(db_to_gain(9)) # Tope de refuerzo
+    assert loudness.gain("muda") == 1.0 and loudness.level_dbfs("muda") is None
+
+
+def test_normalization_output_reaches_target_rms():
+    level = int(32768 * db_to_gain(-30))
+    dsp = DSPSource(ScriptedSource([frame(level, -level)] * 50), loudness=StationLoudness(target_dbfs=-18, max_boost_db=20),
+                    loudness_key="x", batch_frames=1)
+    for _ in range(49):
+        dsp.read()
+    out = samples(dsp.read()).astype(np.float64)
+    assert 20 * np.log10(np.sqrt(np.mean(out ** 2)) / 32768) == pytest.approx(-18, abs=0.1)
+
+
+def test_crossfade_keeps_previous_until_new_audio_then_mixes():
+    previous = ScriptedSource([frame(8000)] * 10)
+    new = ScriptedSource([PCM_SILENCE, PCM_SILENCE] + [frame(-8000)] * 10)
+    done = []
+    dsp = DSPSource(new, batch_frames=1)
+    dsp.crossfade_from(previous, frames=4, on_done=done.append)
+    assert [samples(dsp.read())[0] for _ in range(2)] == [8000, 8000] # La nueva aún conecta: suena la anterior
+    mixed = [samples(dsp.read()) for _ in range(4)]
+    assert all(out.min() >= -8000 and out.max() <= 8000 for out in mixed)
+    assert mixed[0][0] > 7000 and mixed[-1][-1] == -8000 # De la anterior a la nueva
+    assert done == [previous] and dsp.stats()["crossfades"] == 1 and not dsp.stats()["fading"]
+    assert samples(dsp.read())[0] == -8000
+
+
+def test_without_numpy_dsp_stays_off():
+    # Sin NumPy, RADIO_DSP=1 no rompe el arranque: la etapa queda desactivada y el audio pasa como antes
+    code = "import sys; sys.modules['numpy'] = None; import audio_dsp, main; print(audio_dsp.dsp_available(), main.DSP_ENABLED)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60,
+                            env={**os.environ, "RADIO_DSP": "1"})
+    assert result.returncode == 0, result.stderr
+    assert "RADIO_DSP=1 necesita NumPy" in result.stdout
+    assert result.stdout.strip().endswith("False False")
@@ -0,0 +1,125 @@
+import asyncio
+import io
+import shutil
+
+import discord
+import pytest
+
+from audio_pipeline import (OPUS_SILENCE, PCM_SILENCE, PLAYBACK_OPUS, PLAYBACK_PCM, MonitoredSource, OpusCodecCache,
+                            create_opus_source, silence_frame, station_playback_mode)
+from benchmarks.stream_server import LoopingStreamServer, generate_test_audio
+
+
+class FakeProcess:
+    pid = 4242
+    stdout = io.BytesIO()
+
+    def poll(self):
+        return 0
+
+
+@pytest.fixture
+def spawned(monkeypatch):
+    """Argumentos con los que discord.py lanzaría ffmpeg, sin lanzarlo."""
+    calls = []
+
+    def spawn(self, args, **kwargs):
+        calls.append(args)
+        return FakeProcess()
+
+    monkeypatch.setattr(discord.FFmpegAudio, "_spawn_process", spawn)
+    return calls
+
+
+@pytest.mark.parametrize("station, default, mode", [
+    ({"name": "X", "url": "u"}, PLAYBACK_PCM, PLAYBACK_PCM),
+    ({"name": "X", "url": "u", "playback": "opus"}, PLAYBACK_PCM, PLAYBACK_OPUS),
+    ({"name": "X", "url": "u", "playback": "flac"}, PLAYBACK_PCM, PLAYBACK_PCM), # Valor desconocido: el por defecto
+    (None, PLAYBACK_OPUS, PLAYBACK_OPUS), # URL directa: RADIO_PLAYBACK_MODE
+])
+def test_station_playback_mode(station, default, mode):
+    assert station_playback_mode(station, default) == mode
+
+
+def test_builtin_stations_stay_on_pcm():
+    from emisoras_data import PREDEFINED_STATIONS
+    assert all(station_playback_mode(data, PLAYBACK_PCM) == PLAYBACK_PCM for data in PREDEFINED_STATIONS.values())
+
+
+@pytest.mark.parametrize("codec", ["opus", "libopus"])
+def test_opus_source_copies_opus_streams(spawned, codec):
+    create_opus_source("http://radio/x", {"before_options": "-nostdin", "options": "-vn"}, codec=codec)
+    args = spawned[0]
+    assert args[args.index("-c:a") + 1] == "copy"
+    assert "-frame_duration" not in args
+
+
+@pytest.mark.parametrize("codec", ["mp3", "aac", None]) # None: el sondeo no pudo determinarlo
+def test_opus_source_encodes_anything_else(spawned, codec):
+    create_opus_source("http://radio/x", {"before_options": "-nostdin", "options": "-vn"}, codec=codec, bitrate=96)
+    args = spawned[0]
+    assert args[args.index("-c:a") + 1] == "libopus"
+    assert args[args.index("-b:a") + 1] == "96k"
+    assert args[args.index("-frame_duration") + 1] == "20"
+    assert "-vn" in args and args[-1] == "pipe:1"
+
+
+def test_opus_codec_cache_probes_each_url_once(monkeypatch):
+    probes = []
+
+    async def probe(url, method=None):
+        probes.append(url)
+        return {"http://radio/opus": "opus", "http://radio/mp3": "mp3"}.get(url), None
+
+    monkeypatch.setattr(discord.FFmpegOpusAudio, "probe", probe)
+
+    async def scenario():
+        cache = OpusCodecCache(max_entries=2)
+        assert cache.cached("http://radio/opus") is None
+        codecs = [await cache.probe(url) for url in ("http://radio/opus", "http://radio/opus", "http://radio/raro", "http://radio/raro")]
+        assert cache.cached("http://radio/opus") == "opus"
+        assert cache.cached("http://radio/raro") is None # Sin códec conocido: se codificará con libopus
+        await cache.probe("http://radio/mp3") # Tercera URL con máximo 2: se descarta la más antigua
+        assert cache.cached("http://radio/opus") is None and cache.cached("http://radio/mp3") == "mp3"
+        return codecs
+
+    assert asyncio.run(scenario()) == ["opus", "opus", None, None]
+    assert probes == ["http://radio/opus", "http://radio/raro", "http://radio/mp3"]
+
+
+class ScriptedSource(discord.AudioSource):
+    def __init__(self, frames, opus: bool):
+        self.frames = list(frames)
+        self.opus = opus
+
+    def read(self):
+        return self.frames.pop(0) if self.frames else b""
+
+    def is_opus(self):
+        return self.opus
+
+
+@pytest.mark.parametrize("opus, silence", [(False, PCM_SILENCE), (True, OPUS_SILENCE)])
+def test_monitored_source_ignores_padding_silence(opus, silence):
+    audio = b"\x01" * (len(PCM_SILENCE) if not opus else 40)
+    source = MonitoredSource(ScriptedSource([silence, audio, silence, audio], opus), "x")
+    assert silence_frame(source) is silence
+    for _ in range(4):
+        source.read()
+    assert source.frames == 2 and source.silent_frames == 2
+    source.retired = True
+    assert source.read() is silence # Retirada: nunca devuelve vacío al reproductor
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="requiere ffmpeg")
+def test_opus_stream_copy_end_to_end(tmp_path):
+    path = generate_test_audio(str(tmp_path / "tono.opus"), seconds=3, codec="libopus")
+    server = LoopingStreamServer(path, bitrate_kbps=256, content_type="audio/ogg").start()
+    source = create_opus_source(server.url, {"before_options": "-nostdin", "options": "-vn"}, codec="opus")
+    try:
+        packets = [source.read() for _ in range(60)]
+    finally:
+        source.cleanup()
+        server.stop()
+    audio = [packet for packet in packets if not packet.startswith((b"OpusHead", b"OpusTags"))]
+    assert len(audio) >= 50 and all(0 < len(packet) < 1500 for packet in audio) # Paquetes Opus de 20 ms, no PCM
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from cluster import WorkerProcess, split_shards
+
+
+def forward(chunks, limit: int = 64):
+    """Salida de un worker (``chunks`` de bytes) pasada por ``_forward_output`` con un StreamReader de ``limit`` bytes."""
+    async def scenario():
+        stream = asyncio.StreamReader(limit=limit)
+        worker = WorkerProcess(2, [0], {}, hub=None, backoff=None)
+        forwarding = asyncio.create_task(worker._forward_output(stream))
+        for chunk in chunks:
+            stream.feed_data(chunk)
+            await asyncio.sleep(0)
+        stream.feed_eof()
+        await asyncio.wait_for(forwarding, 1)
+
+    asyncio.run(scenario())
+
+
+def test_output_lines_get_worker_prefix(capsys):
+    forward([b"hola\nmun", b"do\n", b"sin salto"])
+    assert capsys.readouterr().out == "[w2] hola\n[w2] mundo\n[w2] sin salto"
+
+
+def test_line_longer_than_limit_is_forwarded_whole(capsys):
+    long_line = "ñ" * 500 # 1000 bytes con un límite de 64: antes ValueError y el lanzador dejaba de reiniciar el worker
+    forward([long_line.encode()[:333], long_line.encode()[333:] + b"\nsigue\n"])
+    assert capsys.readouterr().out == f"[w2] {long_line}\n[w2] sigue\n" # Sin caracteres partidos ni prefijos a mitad de línea
+
+
+@pytest.mark.parametrize("shards, workers, expected", [
+    (8, 3, [[0, 1, 2], [3, 4, 5], [6, 7]]),
+    (2, 4, [[0], [1]]), # Nunca más workers que shards
+    (5, 1, [[0, 1, 2, 3, 4]]),
+])
+def test_split_shards(shards, workers, expected):
+    assert split_shards(shards, workers) == expected
@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+import pytest
+
+import cluster_ipc
+from cluster_ipc import (MAX_LINE, ClusterHub, ClusterWorkerLink, control_request, format_shard_ids, parse_address,
+                         parse_shard_ids, shard_for_guild)
+
+
+@pytest.mark.parametrize("text, shard_ids", [
+    ("0-3", [0, 1, 2, 3]),
+    ("0,2,5", [0, 2, 5]),
+    (" 0-1, 4 ,6-7", [0, 1, 4, 6, 7]),
+    ("", None),
+])
+def test_shard_ids_round_trip(text, shard_ids):
+    assert parse_shard_ids(text) == shard_ids
+    if shard_ids:
+        assert parse_shard_ids(format_shard_ids(shard_ids)) == shard_ids
+    assert format_shard_ids([0, 1, 2, 3, 8, 10, 11]) == "0-3,8,10-11"
+
+
+def test_shard_for_guild_and_address():
+    assert shard_for_guild(81384788765712384, 1) == 0
+    assert shard_for_guild((5 << 22) | 123, 4) == 1
+    assert parse_address("127.0.0.1:8790") == ("127.0.0.1", 8790)
+    assert parse_address(":9000") == ("127.0.0.1", 9000)
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "el canal IPC no avanzó"
+        await asyncio.sleep(0.01)
+
+
+async def start_cluster(shard_count: int = 2, handlers=None, stats=None):
+    hub = ClusterHub(shard_count, port=0)
+    await hub.start()
+    link = ClusterWorkerLink(hub.address, 0, [0, 1], handlers or {}, lambda: stats or {"guilds": 3}, stats_interval=0.05)
+    link.start()
+    await wait_for(lambda: hub.heartbeat_age(0) is not None)
+    return hub, link
+
+
+def test_worker_registers_publishes_stats_and_runs_routed_commands():
+    async def echo(args):
+        return {"guild": args["guild_id"], "big": "x" * 200_000} # Respuesta de más de 64 KiB en una sola línea
+
+    async def failing(args):
+        raise RuntimeError("sin permisos en el canal")
+
+    async def scenario():
+        hub, link = await start_cluster(handlers={"echo": echo, "failing": failing})
+        try:
+            await wait_for(lambda: hub.stats()["totals"])
+            stats = hub.stats()
+            result = await hub.route(4 << 22, "echo", {})
+            with pytest.raises(RuntimeError, match="sin permisos"):
+                await hub.route(4 << 22, "failing", {})
+            with pytest.raises(RuntimeError, match="Comando desconocido"):
+                await hub.route(4 << 22, "nada", {})
+            from_cli = await control_request(hub.address, "cluster_stats", timeout=2)
+            return stats, result, from_cli
+        finally:
+            link._task.cancel()
+            await hub.close()
+
+    stats, result, from_cli = asyncio.run(scenario())
+    assert stats["workers"]["0"]["shards"] == [0, 1] and stats["totals"] == {"guilds": 3}
+    assert result == {"guild": 4 << 22, "big": "x" * 200_000}
+    assert from_cli["routed"] == 3 and from_cli["workers"]["0"]["guilds"] == 3
+
+
+def test_route_without_worker_for_shard():
+    async def scenario():
+        hub, link = await start_cluster(shard_count=4) # El worker solo atiende los shards 0 y 1
+        try:
+            with pytest.raises(LookupError, match="shard 3"):
+                await hub.route(3 << 22, "echo", {})
+            with pytest.raises(RuntimeError, match="Pedido desconocido"):
+                await control_request(hub.address, "nada", timeout=2)
+        finally:
+            link._task.cancel()
+            await hub.close()
+
+    asyncio.run(scenario())
+
+
+def test_identify_turns_are_spaced(monkeypatch):
+    monkeypatch.setattr(cluster_ipc, "IDENTIFY_INTERVAL", 0.1)
+
+    async def scenario():
+        hub, link = await start_cluster()
+        try:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            await asyncio.gather(link.before_identify(0, initial=True), link.before_identify(1))
+            return hub.identifies, loop.time() - started
+        finally:
+            link._task.cancel()
+            await hub.close()
+
+    identifies, elapsed = asyncio.run(scenario())
+    assert identifies == 2 and elapsed >= 0.1 # Dos IDENTIFY en el mismo cubo: el segundo espera su turno
+
+
+def test_hub_survives_oversized_and_invalid_lines():
+    async def scenario():
+        hub = ClusterHub(1, port=0)
+        await hub.start()
+        try:
+            host, port = parse_address(hub.address)
+            results = []
+            for payload in (b"{no es json}\n", b"x" * (MAX_LINE + 10) + b"\n"):
+                reader, writer = await asyncio.open_connection(host, port)
+                writer.write(json.dumps({"op": "hello", "cluster": 7, "shards": [0]}).encode() + b"\n" + payload)
+                await writer.drain()
+                results.append(await asyncio.wait_for(reader.read(), 2)) # El lanzador corta solo esa conexión
+                writer.close()
+            await wait_for(lambda: hub.heartbeat_age(7) is None)
+            return results, await control_request(hub.address, "cluster_stats", timeout=2)
+        finally:
+            await hub.close()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [b"", b""]
+    assert stats["workers"] == {} # El worker que mandó basura quedó fuera del registro
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+from ffmpeg_manager import FFmpegProcessManager
+
+
+class SlowExitProcess:
+    """Proceso que tarda en terminar después de ``kill`` (como un ffmpeg con el disco o la red trabados)."""
+
+    pid = 4242
+
+    def __init__(self, exit_delay: float):
+        self.exit_delay = exit_delay
+        self.killed = False
+        self.reaped = False
+
+    def poll(self):
+        return -9 if self.reaped else None
+
+    def kill(self):
+        self.killed = True
+
+    def wait(self, timeout=None):
+        time.sleep(self.exit_delay)
+        self.reaped = True
+        return -9
+
+
+class FakeSource:
+    def __init__(self, process):
+        self._process = process
+
+
+def test_release_owner_does_not_block_the_loop():
+    async def scenario():
+        manager = FFmpegProcessManager(max_processes=1, queue_timeout=2)
+        process = SlowExitProcess(exit_delay=0.3)
+        manager.start()
+        (await manager.admit(owner=1, label="a")).bind(FakeSource(process))
+
+        started = time.perf_counter()
+        assert manager.release_owner(1) == 1
+        release_seconds = time.perf_counter() - started
+        assert process.killed and not process.reaped
+        assert manager.stats()["dying"] == 1
+        assert manager.try_admit(owner=2) is None # El cupo sigue ocupado hasta que el proceso termine
+
+        started = time.perf_counter()
+        slot = await manager.admit(owner=2, label="b")
+        admit_seconds = time.perf_counter() - started
+        return release_seconds, admit_seconds, process, slot, manager.stats()
+
+    release_seconds, admit_seconds, process, slot, stats = asyncio.run(scenario())
+    assert release_seconds < 0.05
+    assert 0.2 < admit_seconds < 1.0
+    assert process.reaped and slot.owner == 2
+    assert stats["dying"] == 0 and stats["active"] == 1
+
+
+def test_release_without_kill_hands_slot_over_immediately():
+    async def scenario():
+        manager = FFmpegProcessManager(max_processes=1, queue_timeout=1)
+        slot = await manager.admit(owner=1)
+        waiter = asyncio.ensure_future(manager.admit(owner=2))
+        await asyncio.sleep(0)
+        slot.release()
+        return await asyncio.wait_for(waiter, 0.1)
+
+    assert asyncio.run(scenario()).owner == 2
@@ -0,0 +1,101 @@
+import asyncio
+import sqlite3
+
+from guild_state import GUILD_STATE_FIELDS, GuildStateStore
+
+ROW = {
+    "panel_channel_id": 111,
+    "panel_message_id": 222,
+    "voice_channel_id": 333,
+    "station_key": "rockandpop",
+    "station_name": "Rock and Pop",
+    "stream_url": "http://radio/rockandpop",
+    "playback_mode": "pcm",
+    "volume_percent": 80,
+}
+
+
+def row(**changes):
+    return {**ROW, **changes}
+
+
+def load(path) -> dict:
+    store = GuildStateStore(str(path))
+    try:
+        return asyncio.run(store.load())
+    finally:
+        store.close()
+
+
+def test_round_trip_in_wal_mode(tmp_path):
+    path = tmp_path / "estado.db"
+
+    async def scenario():
+        store = GuildStateStore(str(path), flush_delay=0.01)
+        assert await store.load() == {}
+        store.save(1, ROW)
+        store.save(2, row(station_key=None, volume_percent=None)) # Sin emisora: columnas en NULL
+        await asyncio.sleep(0.1)
+        return store
+
+    store = asyncio.run(scenario())
+    assert store.stats() == {"guilds": 2, "pending": 0, "rows_written": 2, "batches": 1}
+    store.close()
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert load(path) == {1: ROW, 2: row(station_key=None, volume_percent=None)}
+
+
+def test_writes_within_delay_are_coalesced(tmp_path):
+    path = tmp_path / "estado.db"
+
+    async def scenario():
+        store = GuildStateStore(str(path), flush_delay=0.05)
+        await store.load()
+        for volume in (10, 20, 30): # Varios cambios del mismo servidor antes del lote: se escribe el último
+            store.save(1, row(volume_percent=volume))
+        store.save(2, ROW)
+        assert store.get(1)["volume_percent"] == 30 and store.stats()["pending"] == 2
+        await asyncio.sleep(0.2)
+        first = store.stats()
+        store.save(2, dict(ROW)) # Igual a lo ya escrito: no se agenda otro lote
+        store.forget(3) # Servidor que nunca se guardó: nada que borrar
+        await asyncio.sleep(0.2)
+        assert store.stats() == first
+        store.forget(2)
+        assert store.guild_ids() == {1}
+        await asyncio.sleep(0.2)
+        return store, first
+
+    store, first = asyncio.run(scenario())
+    store.close()
+    assert first == {"guilds": 2, "pending": 0, "rows_written": 2, "batches": 1}
+    assert store.stats()["batches"] == 2
+    assert load(path) == {1: row(volume_percent=30)}
+
+
+def test_close_writes_pending_rows(tmp_path):
+    path = tmp_path / "estado.db"
+
+    async def scenario():
+        store = GuildStateStore(str(path), flush_delay=60) # El lote no alcanza a salir antes de cerrar
+        await store.load()
+        store.save(7, ROW)
+        return store
+
+    store = asyncio.run(scenario())
+    assert store.stats()["pending"] == 1
+    store.close() # Como en main.py: con el event loop ya detenido
+    assert load(path) == {7: ROW}
+
+
+def test_old_database_gets_new_columns(tmp_path):
+    path = tmp_path / "estado.db"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE guild_state (guild_id INTEGER PRIMARY KEY, panel_channel_id INTEGER, "
+                       "panel_message_id INTEGER, updated_at REAL NOT NULL)")
+    connection.execute("INSERT INTO guild_state VALUES (5, 10, 20, 0)")
+    connection.commit()
+    connection.close()
+    expected = dict.fromkeys(GUILD_STATE_FIELDS)
+    expected.update(panel_channel_id=10, panel_message_id=20)
+    assert load(path) == {5: expected}
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from benchmarks.stream_server import LoopingStreamServer
+from icy_metadata import IcyStreamReader, NowPlayingHub, parse_stream_title
+
+
+@pytest.fixture
+def audio_path(tmp_path):
+    path = tmp_path / "audio.bin"
+    path.write_bytes(os.urandom(64000)) # Bytes arbitrarios: el lector no interpreta el audio
+    return str(path)
+
+
+def _read_exactly(reader: IcyStreamReader, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = reader.read(min(4096, size - len(data)))
+        assert chunk, "el stream terminó antes de tiempo"
+        data += chunk
+    return bytes(data)
+
+
+@pytest.mark.parametrize("status_line", [False, True], ids=["http", "icy-200-ok"])
+def test_reader_strips_metadata_blocks(audio_path, status_line):
+    server = LoopingStreamServer(audio_path, icy_metaint=1000, titles=["Los Jaivas - Todos juntos", "Café Tacvba - Eres"],
+                                 title_interval=0.3, icy_name="Radio Prueba", icy_status_line=status_line).start()
+    seen = []
+    reader = IcyStreamReader(server.url, on_metadata=lambda title, name: seen.append((title, name)), reconnect_attempts=0)
+    try:
+        data = _read_exactly(reader, 36000) # Ráfaga inicial de 2 s más un trozo a ritmo real
+        time.sleep(0.4)
+        _read_exactly(reader, 8000)
+    finally:
+        reader.close()
+        server.stop()
+    assert data == server.audio_data[:36000] # Ni un byte de metadatos mezclado con el audio
+    assert reader.metaint == 1000 and reader.station_name == "Radio Prueba"
+    assert seen[0] == (None, "Radio Prueba")
+    assert seen[1] == ("Los Jaivas - Todos juntos", "Radio Prueba")
+    assert ("Café Tacvba - Eres", "Radio Prueba") in seen # UTF-8 de punta a punta
+
+
+def test_reader_without_metaint_passes_audio_through(audio_path):
+    server = LoopingStreamServer(audio_path).start()
+    reader = IcyStreamReader(server.url, reconnect_attempts=0)
+    try:
+        data = _read_exactly(reader, 20000)
+    finally:
+        reader.close()
+        server.stop()
+    assert reader.metaint == 0 and data == server.audio_data[:20000]
+
+
+def test_close_calls_on_close_once():
+    closed = []
+    reader = IcyStreamReader("http://127.0.0.1:9/stream", on_close=lambda: closed.append(1))
+    reader.close()
+    reader.close()
+    assert closed == [1]
+    assert reader.read() == b""
+
+
+@pytest.mark.parametrize("block, title", [
+    ("StreamTitle='Canción de Cuna';StreamUrl='';".encode("utf-8"), "Canción de Cuna"),
+    ("StreamTitle='Canción de Cuna';".encode("latin-1"), "Canción de Cuna"),
+    (b"StreamTitle='  Artista - Tema ';\x00\x00\x00", "Artista - Tema"),
+    (b"StreamTitle='';", ""),
+    (b"StreamUrl='http://x';", None),
+])
+def test_parse_stream_title(block, title):
+    assert parse_stream_title(block) == title
+
+
+def _hub_scenario(steps, min_interval: float):
+    """Ejecuta ``steps(hub)`` en un event loop y devuelve lo publicado con su instante."""
+    published = []
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        hub = NowPlayingHub(lambda key, title, name: published.append((key, title, time.monotonic() - started)),
+                            min_interval=min_interval)
+        hub.start(loop)
+        await steps(hub)
+        return hub
+
+    return asyncio.run(scenario()), published
+
+
+def test_hub_throttles_and_coalesces_title_changes():
+    async def steps(hub):
+        on_metadata, _ = hub.reader_callbacks("a")
+        on_metadata("Uno", None)
+        await asyncio.sleep(0.05)
+        for title in ("Dos", "Tres", "Tres"):
+            on_metadata(title, None)
+        await asyncio.sleep(0.05)
+        assert hub.current("a") == ("Tres", None) # El panel ya ve el último aunque no se publique
+        await asyncio.sleep(0.4)
+
+    hub, published = _hub_scenario(steps, min_interval=0.3)
+    assert [(key, title) for key, title, _ in published] == [("a", "Uno"), ("a", "Tres")]
+    assert published[1][2] - published[0][2] >= 0.3 # La segunda espera su turno
+    assert hub.stats()["changes"] == 3 and hub.stats()["published"] == 2
+
+
+def test_hub_streams_are_throttled_independently():
+    async def steps(hub):
+        on_a, _ = hub.reader_callbacks("a")
+        on_b, _ = hub.reader_callbacks("b")
+        on_a("A1", None)
+        on_b("B1", None)
+        await asyncio.sleep(0.05)
+
+    _, published = _hub_scenario(steps, min_interval=10)
+    assert [(key, title) for key, title, _ in published] == [("a", "A1"), ("b", "B1")]
+
+
+def test_hub_forgets_stream_when_last_reader_closes():
+    async def steps(hub):
+        on_first, close_first = hub.reader_callbacks("a")
+        _, close_second = hub.reader_callbacks("a")
+        on_first("Uno", "Radio")
+        on_first("Dos", "Radio") # Queda una publicación diferida
+        await asyncio.sleep(0.05)
+        close_first()
+        await asyncio.sleep(0.05)
+        assert hub.current("a") == ("Dos", "Radio") # Aún queda un lector
+        close_second()
+        await asyncio.sleep(0.05)
+        assert hub.current("a") == (None, None)
+        assert hub.stats()["streams"] == 0 and hub.stats()["readers"] == 0
+        assert not hub._published_at and not hub._pending
+        await asyncio.sleep(0.3) # La publicación diferida se canceló
+
+    _, published = _hub_scenario(steps, min_interval=0.2)
+    assert [title for _, title, _ in published] == ["Uno"]
+
+
+def test_hub_keeps_stream_reopened_before_eviction_runs():
+    async def steps(hub):
+        on_metadata, close = hub.reader_callbacks("a")
+        on_metadata("Uno", None)
+        await asyncio.sleep(0.02)
+        close()
+        hub.reader_callbacks("a") # El supervisor reabre el stream antes de que el loop procese el cierre
+        await asyncio.sleep(0.02)
+        assert hub.current("a") == ("Uno", None)
+
+    _hub_scenario(steps, min_interval=1)
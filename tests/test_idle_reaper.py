@@ -0,0 +1,102 @@
+import asyncio
+
+from idle_reaper import IdleSessionReaper
+
+GRACE = 0.05
+
+
+class Recorder:
+    """Callbacks del reaper: registra a qué servidores se llamó; ``pause`` decide qué devuelve ``on_idle``."""
+
+    def __init__(self, pause: bool = False):
+        self.pause = pause
+        self.idle = []
+        self.returned = []
+
+    async def on_idle(self, guild_id):
+        self.idle.append(guild_id)
+        return self.pause
+
+    async def on_listener_return(self, guild_id):
+        self.returned.append(guild_id)
+
+
+def make_reaper(pause: bool = False, grace: float = GRACE):
+    recorder = Recorder(pause)
+    return IdleSessionReaper(recorder.on_idle, recorder.on_listener_return, grace=grace), recorder
+
+
+def test_timer_fires_after_grace():
+    async def scenario():
+        reaper, calls = make_reaper()
+        reaper.watch_channel(1, 100, listeners=1)
+        reaper.member_moved(1, 100, None) # El último oyente se va
+        await asyncio.sleep(GRACE / 2)
+        assert calls.idle == []
+        await asyncio.sleep(GRACE * 2)
+        return reaper, calls
+
+    reaper, calls = asyncio.run(scenario())
+    assert calls.idle == [1] and reaper.stats()["reaped"] == 1
+
+
+def test_listener_returning_before_expiry_cancels_timer():
+    async def scenario():
+        reaper, calls = make_reaper()
+        reaper.watch_channel(1, 100, listeners=0) # El bot entra a un canal vacío
+        await asyncio.sleep(GRACE / 2)
+        reaper.member_moved(1, 200, 100) # Llega alguien desde otro canal
+        await asyncio.sleep(GRACE * 2)
+        return reaper, calls
+
+    reaper, calls = asyncio.run(scenario())
+    assert calls.idle == [] and reaper.listeners(1) == 1 and reaper.stats()["empty"] == 0
+
+
+def test_repeated_join_and_leave_restarts_the_grace():
+    async def scenario():
+        reaper, calls = make_reaper()
+        reaper.watch_channel(1, 100, listeners=1)
+        for _ in range(5): # Entra y sale varias veces: cada salida empieza un plazo nuevo, nunca dos a la vez
+            reaper.member_moved(1, 100, None)
+            await asyncio.sleep(GRACE / 3)
+            reaper.member_moved(1, None, 100)
+        assert calls.idle == []
+        reaper.member_moved(1, 100, None)
+        reaper.member_moved(1, 100, 100) # Mute/deafen en el mismo canal: no cambia el conteo
+        await asyncio.sleep(GRACE * 2)
+        return reaper, calls
+
+    reaper, calls = asyncio.run(scenario())
+    assert calls.idle == [1] and reaper.stats()["reaped"] == 1
+
+
+def test_paused_session_resumes_when_someone_returns():
+    async def scenario():
+        reaper, calls = make_reaper(pause=True)
+        reaper.watch_channel(1, 100, listeners=0)
+        await asyncio.sleep(GRACE * 2)
+        assert reaper.is_paused(1) and calls.idle == [1]
+        await asyncio.sleep(GRACE * 2)
+        assert calls.idle == [1] # En pausa no se vuelve a liberar
+        reaper.member_moved(1, None, 100)
+        await asyncio.sleep(0.01)
+        return reaper, calls
+
+    reaper, calls = asyncio.run(scenario())
+    assert calls.returned == [1] and not reaper.is_paused(1)
+    assert reaper.stats() == {"watched": 1, "empty": 0, "paused": 0, "reaped": 1, "resumed": 1}
+
+
+def test_unwatch_and_disabled_grace_never_fire():
+    async def scenario():
+        reaper, calls = make_reaper()
+        reaper.watch_channel(1, 100, listeners=0)
+        reaper.unwatch(1) # El bot salió antes de que venciera el plazo
+        disabled, disabled_calls = make_reaper(grace=0) # RADIO_IDLE_GRACE=0
+        disabled.watch_channel(2, 200, listeners=0)
+        await asyncio.sleep(GRACE * 2)
+        return calls, disabled_calls
+
+    calls, disabled_calls = asyncio.run(scenario())
+    assert calls.idle == [] and disabled_calls.idle == []
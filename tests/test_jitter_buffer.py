@@ -0,0 +1,129 @@
+import queue
+import time
+
+import discord
+from discord.opus import Encoder as OpusEncoder
+
+from audio_pipeline import OPUS_SILENCE, PCM_SILENCE
+from jitter_buffer import JitterBuffer
+
+
+class ScriptedSource(discord.AudioSource):
+    """ffmpeg falso: ``read`` bloquea hasta que la prueba empuja un frame; ``None`` termina el stream."""
+
+    def __init__(self, opus: bool = False):
+        self.opus = opus
+        self.frames = queue.Queue()
+        self.cleaned = False
+
+    def push(self, *frames):
+        for frame in frames:
+            self.frames.put(frame)
+
+    def read(self):
+        frame = self.frames.get()
+        return b"" if frame is None else frame
+
+    def is_opus(self):
+        return self.opus
+
+    def cleanup(self):
+        self.cleaned = True
+        self.frames.put(None)
+
+
+def pcm(n: int) -> bytes:
+    return bytes([n]) * OpusEncoder.FRAME_SIZE
+
+
+def wait_until(condition, timeout: float = 1.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "el hilo lector no avanzó"
+        time.sleep(0.005)
+
+
+def test_prefill_plays_silence_until_target():
+    source = ScriptedSource()
+    buffer = JitterBuffer(source, target_frames=3, max_frames=10, underrun_timeout=0.01)
+    try:
+        source.push(pcm(1), pcm(2))
+        wait_until(lambda: buffer.buffered_frames == 2)
+        assert buffer.read() is PCM_SILENCE # Aún juntando margen: silencio, no cuenta como corte
+        source.push(pcm(3))
+        wait_until(lambda: buffer.buffered_frames == 3)
+        frames = [buffer.read() for _ in range(3)]
+    finally:
+        buffer.cleanup()
+    assert [bytes(frame) for frame in frames] == [pcm(1), pcm(2), pcm(3)]
+    assert not isinstance(frames[0], bytes) # Vista sobre la memoria reservada, no un bytes nuevo
+    assert buffer.underruns == 0 and buffer.rebuffers == 0
+
+
+def test_underrun_returns_silence_and_rebuffers():
+    source = ScriptedSource()
+    buffer = JitterBuffer(source, target_frames=2, max_frames=10, underrun_timeout=0.01)
+    try:
+        source.push(pcm(1), pcm(2))
+        wait_until(lambda: buffer.buffered_frames == 2)
+        assert bytes(buffer.read()) == pcm(1) and bytes(buffer.read()) == pcm(2)
+        assert buffer.read() is PCM_SILENCE
+        assert buffer.underruns == 1 and buffer.rebuffers == 1
+        source.push(pcm(3))
+        wait_until(lambda: buffer.buffered_frames == 1)
+        assert buffer.read() is PCM_SILENCE # Con un solo frame no alcanza el margen otra vez
+        assert buffer.underruns == 1
+        source.push(pcm(4))
+        wait_until(lambda: buffer.buffered_frames == 2)
+        assert bytes(buffer.read()) == pcm(3)
+    finally:
+        buffer.cleanup()
+
+
+def test_overrun_drops_oldest_frames():
+    source = ScriptedSource()
+    buffer = JitterBuffer(source, target_frames=0, max_frames=4, underrun_timeout=0.01)
+    try:
+        source.push(*(pcm(n) for n in range(10))) # El reproductor está en pausa
+        wait_until(lambda: source.frames.empty() and buffer.overruns == 6)
+        assert buffer.buffered_frames == 4
+        frames = [bytes(buffer.read()) for _ in range(4)]
+    finally:
+        buffer.cleanup()
+    assert frames == [pcm(n) for n in range(6, 10)]
+    assert buffer.stats() == {"buffered": 0, "target": 0, "max": 4, "underruns": 0, "overruns": 6, "rebuffers": 0}
+
+
+def test_opus_skips_ogg_headers_and_uses_opus_silence():
+    source = ScriptedSource(opus=True)
+    buffer = JitterBuffer(source, target_frames=1, max_frames=10, underrun_timeout=0.01)
+    try:
+        assert buffer.read() is OPUS_SILENCE
+        source.push(b"OpusHead\x01\x02", b"OpusTags\x00", b"paquete-1", b"paquete-2")
+        wait_until(lambda: buffer.buffered_frames == 2)
+        assert [buffer.read(), buffer.read()] == [b"paquete-1", b"paquete-2"]
+        assert buffer.read() is OPUS_SILENCE
+        assert buffer.underruns == 1
+    finally:
+        buffer.cleanup()
+
+
+def test_end_of_stream_drains_then_stops():
+    source = ScriptedSource()
+    buffer = JitterBuffer(source, target_frames=5, max_frames=10, underrun_timeout=0.01)
+    source.push(pcm(1), None) # Termina antes de juntar el margen: se entrega lo que hay
+    wait_until(lambda: not buffer.is_alive)
+    assert bytes(buffer.read()) == pcm(1)
+    assert buffer.read() == b"" # El reproductor termina; no silencio infinito
+    assert buffer.underruns == 0
+    buffer.cleanup()
+    assert source.cleaned
+
+
+def test_short_pcm_read_ends_stream():
+    source = ScriptedSource()
+    buffer = JitterBuffer(source, target_frames=0, max_frames=10, underrun_timeout=0.01)
+    source.push(pcm(1), b"\x00" * 100) # Frame incompleto: ffmpeg terminó
+    wait_until(lambda: not buffer.is_alive)
+    assert bytes(buffer.read()) == pcm(1) and buffer.read() == b""
+    buffer.cleanup()
@@ -0,0 +1,108 @@
+import asyncio
+import math
+import re
+
+from metrics import MetricsRegistry, MetricsServer
+
+# Formato de texto de Prometheus 0.0.4: nombre, etiquetas opcionales y valor (float, +Inf, -Inf o NaN)
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{((?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*",?)*)\})? (\S+)$')
+_LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+_UNESCAPE = {"\\\\": "\\", '\\"': '"', "\\n": "\n"}
+
+
+def parse(text: str) -> dict:
+    """``{familia: {"type": ..., "help": ..., "samples": [(nombre, etiquetas, valor)]}}``; falla si una línea no es válida."""
+    assert text.endswith("\n")
+    families = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name, help = line[7:].split(" ", 1)
+            current = families.setdefault(name, {"samples": []})
+            current["help"] = help
+            continue
+        if line.startswith("# TYPE "):
+            name, metric_type = line[7:].split(" ")
+            assert metric_type in ("counter", "gauge", "histogram", "summary", "untyped")
+            assert name in families and not families[name]["samples"], "TYPE después de las muestras"
+            families[name]["type"] = metric_type
+            continue
+        match = _SAMPLE.match(line)
+        assert match, f"línea inválida: {line!r}"
+        name, raw_labels, raw_value = match.groups()
+        labels = {key: re.sub(r"\\.", lambda m: _UNESCAPE[m.group()], value) for key, value in _LABEL.findall(raw_labels or "")}
+        family = re.sub(r"_(bucket|sum|count)$", "", name) if current.get("type") == "histogram" else name
+        assert family in families and families[family] is current, f"{name} fuera de su familia"
+        current["samples"].append((name, labels, float(raw_value)))
+    return families
+
+
+def test_exposition_parses_with_escaped_labels():
+    registry = MetricsRegistry(prefix="test")
+    errors = registry.counter("errors", "Errores por emisora.")
+    errors.inc(station='Radio "Uno"\\FM\nHD')
+    errors.inc(2, station="simple")
+    registry.gauge("voice_sessions", "Sesiones de voz.", collect=lambda: 3)
+    registry.gauge("frames", "Frames por modo.", collect=lambda: {(("mode", "pcm"),): 10, (("mode", "opus"),): 0.5})
+    registry.add_collector(lambda: [("panel_pending", "gauge", "Paneles pendientes.", [({"shard": 0}, 4)])])
+
+    families = parse(registry.render())
+
+    assert families["test_errors_total"]["type"] == "counter"
+    assert families["test_errors_total"]["samples"] == [
+        ("test_errors_total", {"station": 'Radio "Uno"\\FM\nHD'}, 1.0), # Las etiquetas vuelven intactas
+        ("test_errors_total", {"station": "simple"}, 2.0),
+    ]
+    assert families["test_voice_sessions"]["samples"] == [("test_voice_sessions", {}, 3.0)]
+    assert {s[1]["mode"]: s[2] for s in families["test_frames"]["samples"]} == {"pcm": 10.0, "opus": 0.5}
+    assert families["test_panel_pending"]["samples"] == [("test_panel_pending", {"shard": "0"}, 4.0)]
+
+
+def test_histogram_buckets_sum_count_and_inf():
+    registry = MetricsRegistry(prefix="test")
+    latency = registry.histogram("latency_seconds", "Latencia.", buckets=(0.1, 0.5, 1.0))
+    for value in (0.05, 0.1, 0.3, 0.7, 2.0, 40.0): # 0.1 cae en le="0.1"; 2.0 y 40.0 solo en +Inf
+        latency.observe(value, component="select")
+
+    family = parse(registry.render())["test_latency_seconds"]
+    assert family["type"] == "histogram"
+    buckets = [(labels["le"], value) for name, labels, value in family["samples"] if name.endswith("_bucket")]
+    assert buckets == [("0.1", 2.0), ("0.5", 3.0), ("1.0", 4.0), ("+Inf", 6.0)] # Acumulativos, +Inf al final
+    values = {name: (labels, value) for name, labels, value in family["samples"] if not name.endswith("_bucket")}
+    assert values["test_latency_seconds_count"] == ({"component": "select"}, 6.0) # Igual al bucket +Inf
+    assert math.isclose(values["test_latency_seconds_sum"][1], 43.15)
+    assert all(labels["component"] == "select" for name, labels, _ in family["samples"])
+
+
+def test_sampled_histogram_keeps_totals():
+    registry = MetricsRegistry(prefix="test", sample_rate=0.25)
+    edits = registry.histogram("edit_seconds", "Ediciones.", buckets=(1.0,), sampled=True)
+    for _ in range(100):
+        edits.observe(0.5)
+    samples = {name: value for name, _, value in parse(registry.render())["test_edit_seconds"]["samples"] if not name.endswith("_bucket")}
+    assert samples == {"test_edit_seconds_count": 100.0, "test_edit_seconds_sum": 50.0}
+
+
+def test_server_serves_exposition():
+    registry = MetricsRegistry(prefix="test")
+    registry.counter("requests", "Pedidos.").inc()
+
+    async def scenario():
+        server = MetricsServer(registry, port=0)
+        await server.start()
+        try:
+            responses = []
+            for path in ("/metrics", "/otra"):
+                reader, writer = await asyncio.open_connection(server.host, server.port)
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+                responses.append(await reader.read())
+                writer.close()
+            return responses, server.scrapes
+        finally:
+            await server.close()
+
+    (ok, missing), scrapes = asyncio.run(scenario())
+    head, body = ok.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200") and b"version=0.0.4" in head
+    assert parse(body.decode())["test_requests_total"]["samples"] == [("test_requests_total", {}, 1.0)]
+    assert missing.startswith(b"HTTP/1.1 404") and scrapes == 1
@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+from panel_updates import PanelUpdateScheduler
+
+
+def test_request_during_slow_edit_runs_after_it():
+    async def scenario():
+        guild = SimpleNamespace(id=1)
+        state = {"version": 1}
+        rendered, active = [], []
+
+        async def flush(g):
+            active.append(g.id)
+            assert len(active) == 1, "dos ediciones del mismo panel a la vez"
+            version = state["version"]
+            await asyncio.sleep(0.2 if version == 1 else 0.01) # La primera edición es lenta
+            rendered.append(version)
+            active.pop()
+            return True
+
+        scheduler = PanelUpdateScheduler(flush, window=0.05)
+        scheduler.request(guild)
+        await asyncio.sleep(0.1) # Ya está editando la versión 1
+        state["version"] = 2
+        scheduler.request(guild)
+        await asyncio.sleep(0.4)
+        return rendered, scheduler.stats()
+
+    rendered, stats = asyncio.run(scenario())
+    assert rendered == [1, 2] # El panel termina mostrando el último estado
+    assert stats["sent"] == 2 and stats["pending"] == 0 and stats["in_flight"] == 0
+
+
+def test_flush_now_waits_for_edit_in_flight():
+    async def scenario():
+        guild = SimpleNamespace(id=1)
+        order = []
+
+        async def flush(g):
+            order.append("start")
+            await asyncio.sleep(0.1)
+            order.append("end")
+            return False
+
+        scheduler = PanelUpdateScheduler(flush, window=0.0)
+        scheduler.request(guild)
+        await asyncio.sleep(0.02)
+        await scheduler.flush_now(guild)
+        return order, scheduler.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["start", "end", "start", "end"]
+    assert stats["skipped"] == 2
+
+
+def test_requests_within_window_are_coalesced():
+    async def scenario():
+        guild = SimpleNamespace(id=1)
+        calls = []
+
+        async def flush(g):
+            calls.append(g.id)
+            return True
+
+        scheduler = PanelUpdateScheduler(flush, window=0.05)
+        for _ in range(4):
+            scheduler.request(guild)
+        await asyncio.sleep(0.1)
+        return calls, scheduler.stats()
+
+    calls, stats = asyncio.run(scenario())
+    assert calls == [1]
+    assert stats["requested"] == 4 and stats["coalesced"] == 3 and stats["sent"] == 1
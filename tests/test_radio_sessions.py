@@ -0,0 +1,21 @@
+from radio_sessions import RadioSessionRegistry
+
+
+def test_now_playing_index_follows_session_keys():
+    sessions = RadioSessionRegistry()
+    a, b, c = (sessions.get_or_create(guild_id) for guild_id in (1, 2, 3))
+    a.now_playing_key = b.now_playing_key = "http://radio/x"
+    c.now_playing_key = "http://radio/y"
+    assert sorted(sessions.now_playing_guilds("http://radio/x")) == [1, 2]
+    assert sessions.now_playing_guilds("http://radio/y") == (3,)
+
+    b.now_playing_key = "http://radio/y" # Cambio de emisora
+    assert sessions.now_playing_guilds("http://radio/x") == (1,)
+    assert sorted(sessions.now_playing_guilds("http://radio/y")) == [2, 3]
+
+    a.mark_disconnected()
+    assert sessions.now_playing_guilds("http://radio/x") == ()
+    assert "http://radio/x" not in sessions._now_playing # Sin claves vacías acumuladas
+
+    sessions.discard(3)
+    assert sessions.now_playing_guilds("http://radio/y") == (2,)
@@ -0,0 +1,160 @@
+import asyncio
+
+import discord
+import pytest
+
+from guild_state import GuildStateStore
+from startup_reconciler import GuildReconciler
+
+
+class FakeGuilds:
+    """``reconcile`` falso: cada servidor tarda ``delay`` y registra cuántos corren a la vez."""
+
+    def __init__(self, delay: float = 0.01, failing=(), hanging=()):
+        self.delay = delay
+        self.failing = set(failing)
+        self.hanging = set(hanging)
+        self.running = 0
+        self.peak = 0
+        self.done = []
+
+    async def reconcile(self, guild_id: int):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(60 if guild_id in self.hanging else self.delay)
+            if guild_id in self.failing:
+                raise RuntimeError(f"panel de {guild_id} no encontrado")
+            self.done.append(guild_id)
+        finally:
+            self.running -= 1
+
+
+def test_concurrency_limit_is_honored():
+    guilds = FakeGuilds()
+    reconciler = GuildReconciler(guilds.reconcile, concurrency=3)
+    report = asyncio.run(reconciler.run(range(20)))
+    assert guilds.peak == 3
+    assert sorted(guilds.done) == list(range(20))
+    assert report.guilds == report.succeeded == 20 and report.failures == {}
+    assert reconciler.stats()["rounds"] == 1 and reconciler.stats()["last_guilds"] == 20
+
+
+def test_failing_guild_does_not_abort_the_rest():
+    guilds = FakeGuilds(failing={3, 7}, hanging={5})
+    reconciler = GuildReconciler(guilds.reconcile, concurrency=4, guild_timeout=0.1)
+    report = asyncio.run(reconciler.run(range(10)))
+    assert sorted(guilds.done) == [0, 1, 2, 4, 6, 8, 9]
+    assert report.succeeded == 7 and set(report.failures) == {3, 5, 7}
+    assert report.failures[3] == "panel de 3 no encontrado"
+    assert report.failures[5] == "sin terminar tras 0.1 s"
+    assert "7/10 servidor(es)" in report.summary() and "3 fallo(s)" in report.summary()
+
+
+def test_guilds_requested_mid_round_join_it():
+    guilds = FakeGuilds(delay=0.05)
+    reconciler = GuildReconciler(guilds.reconcile, concurrency=2)
+
+    async def scenario():
+        first = asyncio.create_task(reconciler.run([1, 2], reason="arranque"))
+        await asyncio.sleep(0.01)
+        second = await reconciler.run([3], reason="reconexión") # Otra ronda pedida a mitad de la primera
+        return await first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second and first.reason == "arranque"
+    assert sorted(guilds.done) == [1, 2, 3] and reconciler.rounds == 1
+
+
+# --- Retomar la radio de un servidor (main._resume_guild_playback) ---
+
+class FakeMember:
+    def __init__(self, bot: bool):
+        self.bot = bot
+
+
+class FakeVoiceChannel(discord.VoiceChannel):
+    def __init__(self, channel_id: int, members):
+        self.id = channel_id
+        self.name = "Radio"
+        self._fake_members = members
+        self.connects = 0
+
+    @property
+    def members(self):
+        return self._fake_members
+
+    async def connect(self, **kwargs):
+        self.connects += 1
+        return "voice-client"
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, channel):
+        self.id = guild_id
+        self.name = f"Servidor {guild_id}"
+        self.channel = channel
+        self.voice_client = None
+        self.me = None
+
+    def get_channel(self, channel_id):
+        return self.channel if channel_id == self.channel.id else None
+
+
+STATE = {
+    "panel_channel_id": None, "panel_message_id": None, "voice_channel_id": 50, "station_key": "rockandpop",
+    "station_name": "Rock and Pop", "stream_url": "http://radio/rockandpop", "playback_mode": "pcm", "volume_percent": None,
+}
+
+
+@pytest.fixture
+def resume(monkeypatch, tmp_path):
+    """``main._resume_guild_playback`` con la base de estado en tmp_path y sin lanzar ffmpeg."""
+    import main
+    started = []
+
+    async def start_station_playback(guild, voice_client, session, url, name, mode, station_key=None):
+        started.append((guild.id, voice_client, url))
+
+    guilds = {}
+    monkeypatch.setattr(main, "_start_station_playback", start_station_playback)
+    monkeypatch.setattr(main.bot, "get_guild", guilds.get)
+
+    def run(members):
+        guild = FakeGuild(len(guilds) + 1, FakeVoiceChannel(50, members))
+        guilds[guild.id] = guild
+
+        async def scenario():
+            store = GuildStateStore(str(tmp_path / f"estado-{guild.id}.db"), flush_delay=0.01)
+            monkeypatch.setattr(main, "guild_states", store)
+            await store.load()
+            store.save(guild.id, STATE)
+            session = main.radio_sessions.get_or_create(guild.id)
+            try:
+                resumed = await main._resume_guild_playback(guild, session, STATE)
+            finally:
+                main.radio_sessions.discard(guild.id)
+            await asyncio.sleep(0.05)
+            return resumed, store
+
+        resumed, store = asyncio.run(scenario())
+        store.close()
+        return guild, resumed, store
+
+    run.started = started
+    return run
+
+
+def test_guild_without_listeners_is_skipped_and_state_forgotten(resume):
+    guild, resumed, store = resume([FakeMember(bot=True)]) # Solo bots en el canal guardado
+    assert resumed is False
+    assert guild.channel.connects == 0 and resume.started == []
+    saved = store.get(guild.id)
+    assert saved["station_key"] is None and saved["stream_url"] is None # No se reintenta en cada arranque
+
+
+def test_guild_with_listeners_resumes_station(resume):
+    guild, resumed, store = resume([FakeMember(bot=False)])
+    assert resumed is True
+    assert guild.channel.connects == 1 and resume.started == [(guild.id, "voice-client", STATE["stream_url"])]
+    assert store.get(guild.id)["station_key"] == "rockandpop"
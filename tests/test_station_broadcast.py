@@ -0,0 +1,121 @@
+import queue
+import time
+
+from audio_pipeline import OPUS_SILENCE
+from station_broadcast import BroadcastHub, OpusFrameRing
+
+
+class FakeOpusSource:
+    """Hace de ffmpeg: entrega los paquetes que el test le pone y termina con ``cleanup``."""
+
+    def __init__(self, url):
+        self.url = url
+        self.packets = queue.Queue()
+        self.cleaned = False
+
+    def read(self):
+        return self.packets.get(timeout=5)
+
+    def feed(self, count: int, start: int = 0):
+        for i in range(start, start + count):
+            self.packets.put(b"frame-%d" % i)
+
+    def cleanup(self):
+        self.cleaned = True
+        self.packets.put(b"") # Desbloquea el hilo de la difusión como lo haría matar ffmpeg
+
+
+def _wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "la condición no se cumplió a tiempo"
+        time.sleep(0.005)
+
+
+def _hub():
+    sources = []
+
+    def factory(url):
+        sources.append(FakeOpusSource(url))
+        return sources[-1]
+
+    return BroadcastHub(factory, capacity=8, lead_frames=2, underrun_timeout=0.01), sources
+
+
+def test_ring_slow_reader_jumps_to_oldest_retained_frame():
+    ring = OpusFrameRing(4)
+    for i in range(10):
+        ring.push(b"%d" % i)
+    frame, next_seq, dropped = ring.read(0, timeout=0)
+    assert (frame, next_seq, dropped) == (b"6", 7, 6) # Se perdieron 0..5; quedan 6..9
+    assert ring.read(next_seq, timeout=0) == (b"7", 8, 0)
+
+
+def test_ring_reader_at_live_edge_waits_and_gets_nothing():
+    ring = OpusFrameRing(4)
+    ring.push(b"0")
+    assert ring.read(1, timeout=0.01) == (None, 1, 0)
+    ring.close()
+    assert ring.read(1, timeout=1) == (None, 1, 0) # Cerrado: no espera
+
+
+def test_ring_start_seq_is_bounded_by_capacity():
+    ring = OpusFrameRing(4)
+    assert ring.start_seq(5) == 0
+    for i in range(20):
+        ring.push(b"%d" % i)
+    assert ring.start_seq(2) == 18
+    assert ring.start_seq(10) == 16 # No antes del frame más antiguo retenido
+
+
+def test_slow_listener_counts_dropped_frames():
+    hub, sources = _hub()
+    listener = hub.listen("http://radio/a", "A")
+    sources[0].feed(20)
+    _wait_for(lambda: hub.stats()[0]["frames_produced"] == 20)
+    assert listener.read() == b"frame-12" # Capacidad 8: retiene 12..19
+    assert listener.frames_dropped == 12
+    assert [listener.read() for _ in range(7)] == [b"frame-%d" % i for i in range(13, 20)]
+    assert listener.read() == OPUS_SILENCE and listener.underruns == 1
+    listener.cleanup()
+
+
+def test_late_subscriber_starts_at_live_edge():
+    hub, sources = _hub()
+    first = hub.listen("http://radio/a", "A")
+    sources[0].feed(6)
+    _wait_for(lambda: hub.stats()[0]["frames_produced"] == 6)
+    late = hub.listen("http://radio/a", "A")
+    assert len(sources) == 1 # Se suma a la difusión existente
+    assert late.read() == b"frame-4" # lead_frames=2 detrás del borde
+    assert late.frames_dropped == 0
+    assert first.read() == b"frame-0"
+    first.cleanup()
+    late.cleanup()
+
+
+def test_last_unsubscribe_stops_broadcast_and_removes_it():
+    hub, sources = _hub()
+    a = hub.listen("http://radio/a", "A")
+    b = hub.listen("http://radio/a", "A")
+    assert len(hub) == 1 and hub.stats()[0]["listeners"] == 2
+    a.cleanup()
+    assert len(hub) == 1 and not sources[0].cleaned
+    b.cleanup()
+    assert len(hub) == 0
+    assert sources[0].cleaned
+    assert b.read() == b"" # Sin difusión el reproductor recibe fin de stream
+    c = hub.listen("http://radio/a", "A")
+    assert len(sources) == 2 # Un oyente nuevo arranca otra difusión
+    c.cleanup()
+
+
+def test_ended_stream_closes_listeners():
+    hub, sources = _hub()
+    listener = hub.listen("http://radio/a", "A")
+    sources[0].feed(1)
+    sources[0].packets.put(b"") # Fin del stream
+    _wait_for(lambda: not hub.is_live("http://radio/a"))
+    assert listener.read() == b"frame-0"
+    assert listener.read() == b""
+    listener.cleanup()
@@ -0,0 +1,101 @@
+import json
+import random
+import time
+
+import pytest
+
+from station_catalog import MAX_KEY_LENGTH, StationCatalog, _edit_distance
+
+BUILTIN = {
+    "rockandpop": {"name": "Rock and Pop", "url": "http://example/rockandpop", "mirrors": []},
+    "carabineros": {"name": "Radio Carabineros", "url": "http://example/carabineros", "mirrors": []},
+}
+
+STATIONS = [
+    {"name": "Metallica FM", "url": "http://example/metallica", "genre": "Metal", "country": "Chile"},
+    {"name": "Radio Rockola", "url": "http://example/rockola", "genre": "Rock", "country": "Chile"},
+    {"name": "Rob Radio", "url": "http://example/rob", "genre": "Talk", "country": "Argentina"},
+    {"name": "Jazz Corner", "url": "http://example/jazz", "genre": "Jazz", "country": "México"},
+    {"name": "Pop Hits", "url": "http://example/pophits", "genre": "Pop", "country": "Perú"},
+]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = tmp_path / "catalogo.jsonl"
+    path.write_text("".join(json.dumps(station, ensure_ascii=False) + "\n" for station in STATIONS), encoding="utf-8")
+    catalog = StationCatalog(BUILTIN, str(path))
+    catalog.load()
+    return catalog
+
+
+@pytest.mark.parametrize("typo, word", [
+    ("rok", "rock"), ("rokc", "rock"), ("metalica", "metallica"), ("jaz", "jazz"), ("radoi", "radio"), ("metlaica", "metallica"),
+])
+def test_correct_short_and_long_typos(catalog, typo, word):
+    assert catalog._index.correct(typo) == word
+
+
+@pytest.mark.parametrize("token", ["xyz", "qwrt", "zzzzzzzzzz"])
+def test_correct_rejects_unrelated_words(catalog, token):
+    assert catalog._index.correct(token) is None
+
+
+def test_search_uses_correction_for_typos(catalog):
+    assert set(catalog.search("rokc")) == {"rockandpop", "radio-rockola"}
+    assert catalog.search("metalica") == ["metallica-fm"]
+    assert catalog.search("radio rok chile") == ["radio-rockola"]
+
+
+def test_search_prefers_exact_prefixes(catalog):
+    assert catalog.search("rock")[0] == "rockandpop" # Nombre que empieza con la consulta
+    assert catalog.search("chile metal") == ["metallica-fm"]
+    assert len(catalog.search("")) == len(BUILTIN) + len(STATIONS)
+
+
+def test_keys_are_lowercase_and_capped(tmp_path):
+    path = tmp_path / "catalogo.jsonl"
+    records = [
+        {"key": "RadioX", "name": "Radio X", "url": "http://example/x"},
+        {"key": "k" * 150, "name": "Larga", "url": "http://example/larga"},
+        {"name": "Nombre " * 30, "url": "http://example/nombre"},
+    ]
+    path.write_text("".join(json.dumps(record) + "\n" for record in records), encoding="utf-8")
+    catalog = StationCatalog({}, str(path))
+    catalog.load()
+    assert "radiox" in catalog and "RadioX" not in catalog
+    assert catalog.get("radiox")["url"] == "http://example/x"
+    assert all(len(key) <= MAX_KEY_LENGTH for key in catalog.keys()) # value de SelectOption/Choice: máximo 100
+
+
+def _typo(rng, word):
+    i = rng.randrange(len(word) - 1)
+    return rng.choice([
+        word[:i] + word[i + 1:],
+        word[:i] + rng.choice("aeiou") + word[i:],
+        word[:i] + word[i + 1] + word[i] + word[i + 2:],
+    ])
+
+
+def test_typo_correction_latency_on_large_vocabulary(tmp_path):
+    rng = random.Random(7)
+    syllables = [c + v for c in "bcdfgjklmnprstvz" for v in "aeiou"] + ["ar", "en", "is", "on", "ur"]
+    vocabulary = sorted({"".join(rng.choices(syllables, k=rng.randint(2, 5))) for _ in range(30000)})
+    path = tmp_path / "catalogo.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(20000):
+            f.write(json.dumps({"name": " ".join(rng.sample(vocabulary, 2)), "url": f"http://example/{i}"}) + "\n")
+    catalog = StationCatalog({}, str(path))
+    catalog.load()
+    index = catalog._index
+    queries = [_typo(rng, rng.choice(index.words)) for _ in range(300)]
+    queries = [q for q in queries if index.prefix_range(q)[0] == index.prefix_range(q)[1]]
+    times = []
+    for query in queries:
+        started = time.perf_counter()
+        word = index.correct(query)
+        times.append(time.perf_counter() - started)
+        assert word is not None and _edit_distance(query, word) <= 1
+    times.sort()
+    assert times[len(times) // 2] < 0.001 # Holgado: en una máquina normal la mediana es ~0.1 ms
+    assert times[int(len(times) * 0.95)] < 0.005
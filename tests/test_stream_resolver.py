@@ -0,0 +1,205 @@
+import asyncio
+import socket
+from collections import Counter
+
+import pytest
+from aiohttp import web
+
+from benchmarks.stream_server import LoopingStreamServer
+from stream_resolver import StreamResolveError, StreamResolver, parse_m3u, parse_pls
+
+
+def _closed_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class PlaylistServer:
+    """Servidor aiohttp local con rutas fijas; cuenta las peticiones por ruta."""
+
+    def __init__(self, routes: dict):
+        self.routes = routes # ruta -> corrutina handler(request)
+        self.requests = Counter()
+        self._runner = None
+        self.port = None
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    async def __aenter__(self):
+        app = web.Application()
+        for path, handler in self.routes.items():
+            app.router.add_get(path, self._counted(path, handler))
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._runner.cleanup()
+
+    def _counted(self, path, handler):
+        async def counted(request):
+            self.requests[path] += 1
+            return await handler(request)
+        return counted
+
+
+def _text(body: str, content_type: str, delay: float = 0.0):
+    async def handler(request):
+        if delay:
+            await asyncio.sleep(delay)
+        return web.Response(text=body.replace("{base}", f"http://{request.host}"), content_type=content_type)
+    return handler
+
+
+def _status(code: int):
+    async def handler(request):
+        return web.Response(status=code)
+    return handler
+
+
+def _redirect(path: str):
+    async def handler(request):
+        raise web.HTTPFound(path)
+    return handler
+
+
+async def _resolve(resolver: StreamResolver, url: str):
+    try:
+        return await resolver.resolve(url)
+    finally:
+        await resolver.close()
+
+
+def test_parse_pls_orders_entries_and_joins_relative_urls():
+    text = "[playlist]\nNumberOfEntries=3\nFile2=http://b/stream\nFile1=/relative\nTitle1=x\nFile10=http://c/\n"
+    assert parse_pls(text, "http://host/list.pls") == ["http://host/relative", "http://b/stream", "http://c/"]
+    assert parse_pls("no es una playlist", "http://host/") == []
+
+
+def test_parse_m3u_master_orders_variants_by_bandwidth():
+    text = ("#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=64000,CODECS=\"mp4a.40.5\"\nlow/index.m3u8\n"
+            "#EXT-X-STREAM-INF:BANDWIDTH=192000\nhigh/index.m3u8\n")
+    assert parse_m3u(text, "http://host/live/master.m3u8") == (
+        ["http://host/live/high/index.m3u8", "http://host/live/low/index.m3u8"], True)
+    media = "#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXTINF:6,\nseg1.aac\n"
+    assert parse_m3u(media, "http://host/live/media.m3u8") == (["http://host/live/media.m3u8"], True)
+    assert parse_m3u("#EXTM3U\n#EXTINF:-1,Radio\nhttp://a/stream\n", "http://host/x.m3u") == (["http://a/stream"], False)
+
+
+def test_pls_with_dead_entries_falls_through_to_redirecting_one(tmp_path):
+    audio = tmp_path / "audio.mp3"
+    audio.write_bytes(b"\xff\xfb" * 4096)
+    stream = LoopingStreamServer(str(audio), burst_seconds=0).start()
+    dead_port = _closed_port()
+
+    async def scenario():
+        routes = {
+            "/list.pls": _text(f"[playlist]\nFile1=http://127.0.0.1:{dead_port}/stream\nFile2={{base}}/gone\n"
+                               f"File3={{base}}/moved\nNumberOfEntries=3\n", "audio/x-scpls"),
+            "/gone": _status(404),
+            "/moved": _redirect(stream.url),
+        }
+        async with PlaylistServer(routes) as server:
+            resolved = await _resolve(StreamResolver(), server.url("/list.pls"))
+            return resolved, server.requests
+
+    try:
+        resolved, requests = asyncio.run(scenario())
+    finally:
+        stream.stop()
+    assert resolved == stream.url
+    assert requests["/gone"] == 1 and requests["/moved"] == 1
+
+
+def test_playlist_with_only_dead_entries_raises():
+    dead_port = _closed_port()
+
+    async def scenario():
+        routes = {
+            "/list.m3u": _text(f"#EXTM3U\nhttp://127.0.0.1:{dead_port}/a\n{{base}}/gone\n", "audio/x-mpegurl"),
+            "/gone": _status(503),
+        }
+        async with PlaylistServer(routes) as server:
+            await _resolve(StreamResolver(), server.url("/list.m3u"))
+
+    with pytest.raises(StreamResolveError, match="503"):
+        asyncio.run(scenario())
+
+
+def test_hls_master_resolves_to_highest_bandwidth_variant():
+    async def scenario():
+        routes = {
+            "/live/master.m3u8": _text("#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=48000\nlow.m3u8\n"
+                                       "#EXT-X-STREAM-INF:BANDWIDTH=128000\nhigh.m3u8\n", "application/vnd.apple.mpegurl"),
+        }
+        async with PlaylistServer(routes) as server:
+            return await _resolve(StreamResolver(), server.url("/live/master.m3u8")), server
+
+    resolved, server = asyncio.run(scenario())
+    assert resolved == server.url("/live/high.m3u8")
+    assert set(server.requests) == {"/live/master.m3u8"} # Las variantes las abre ffmpeg, no el resolvedor
+
+
+def test_positive_cache_expires_after_ttl():
+    async def scenario():
+        routes = {"/stream": _text("audio", "audio/mpeg")}
+        async with PlaylistServer(routes) as server:
+            resolver = StreamResolver(ttl=0.3)
+            url = server.url("/stream")
+            try:
+                assert await resolver.resolve(url) == url
+                assert await resolver.resolve(url) == url
+                assert server.requests["/stream"] == 1 and resolver.hits == 1
+                await asyncio.sleep(0.35)
+                assert resolver.cached(url) is None
+                assert await resolver.resolve(url) == url
+                assert server.requests["/stream"] == 2 and resolver.misses == 2
+            finally:
+                await resolver.close()
+
+    asyncio.run(scenario())
+
+
+def test_negative_cache_expires_after_negative_ttl():
+    async def scenario():
+        routes = {"/gone": _status(404)}
+        async with PlaylistServer(routes) as server:
+            resolver = StreamResolver(negative_ttl=0.2)
+            url = server.url("/gone")
+            try:
+                for _ in range(2):
+                    with pytest.raises(StreamResolveError, match="404"):
+                        await resolver.resolve(url)
+                assert server.requests["/gone"] == 1 and resolver.negative_hits == 1
+                await asyncio.sleep(0.25)
+                with pytest.raises(StreamResolveError):
+                    await resolver.resolve(url)
+                assert server.requests["/gone"] == 2
+            finally:
+                await resolver.close()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_resolves_share_one_request():
+    async def scenario():
+        routes = {
+            "/slow.pls": _text("[playlist]\nFile1={base}/stream\n", "audio/x-scpls", delay=0.1),
+            "/stream": _text("audio", "audio/mpeg"),
+        }
+        async with PlaylistServer(routes) as server:
+            resolver = StreamResolver()
+            try:
+                results = await asyncio.gather(*(resolver.resolve(server.url("/slow.pls")) for _ in range(5)))
+            finally:
+                await resolver.close()
+            return results, server
+
+    results, server = asyncio.run(scenario())
+    assert results == [server.url("/stream")] * 5
+    assert server.requests["/slow.pls"] == 1 and server.requests["/stream"] == 1
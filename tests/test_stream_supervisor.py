@@ -0,0 +1,187 @@
+import asyncio
+
+import pytest
+
+from stream_supervisor import BackoffPolicy, StreamSupervisor, mirror_for_attempt
+
+TICK = 0.01 # check_interval real de las pruebas; el tiempo del supervisor lo marca FakeClock
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class FakeSource:
+    """Lo que el supervisor lee de una MonitoredSource, con instantes del reloj falso."""
+
+    def __init__(self, clock, playing: bool = True):
+        self.clock = clock
+        self.started_at = clock()
+        self.first_frame_at = self.last_frame_at = clock() if playing else None
+
+    def frame(self):
+        if self.first_frame_at is None:
+            self.first_frame_at = self.clock()
+        self.last_frame_at = self.clock()
+
+
+class Harness:
+    """Supervisor con un reinicio falso que registra los intentos y, si ``heals``, vuelve a vigilar una fuente nueva."""
+
+    def __init__(self, clock, heals: bool = True, **kwargs):
+        self.clock = clock
+        self.heals = heals
+        self.attempts = []
+        self.sources = []
+        self.given_up = []
+        kwargs.setdefault("backoff", BackoffPolicy(base=0.02, cap=0.02))
+        self.supervisor = StreamSupervisor(self._restart, check_interval=TICK, clock=clock, on_give_up=self._give_up, **kwargs)
+
+    async def _restart(self, guild_id, attempt):
+        self.attempts.append(attempt)
+        if self.heals:
+            self.watch(guild_id)
+        return True
+
+    async def _give_up(self, guild_id, reason):
+        self.given_up.append(guild_id)
+
+    def watch(self, guild_id: int = 1, playing: bool = True):
+        source = FakeSource(self.clock, playing)
+        self.sources.append(source)
+        self.supervisor.watch(guild_id, source, "Radio Prueba")
+        return source
+
+
+async def settle(seconds: float = 0.1):
+    await asyncio.sleep(seconds)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_backoff_grows_with_jitter_and_cap():
+    policy = BackoffPolicy(base=1.0, cap=8.0)
+    for attempt, ceiling in enumerate((1, 2, 4, 8, 8, 8)):
+        delays = [policy.delay(attempt) for _ in range(200)]
+        assert all(ceiling / 2 <= d <= ceiling for d in delays)
+        assert max(delays) - min(delays) > ceiling / 10 # Con jitter: no todos reconectan a la vez
+
+
+def test_mirror_rotation():
+    urls = ["http://principal", "http://espejo1", "http://espejo2"]
+    assert [mirror_for_attempt(urls, a) for a in range(5)] == urls + urls[:2]
+    assert mirror_for_attempt(["http://unica"], 3) == "http://unica"
+
+
+def test_stall_detected_only_after_deadline(clock):
+    async def scenario():
+        h = Harness(clock, stall_deadline=8)
+        h.supervisor.start()
+        source = h.watch()
+        clock.advance(7)
+        await settle()
+        assert h.attempts == []
+        source.frame() # Llega audio: el plazo se cuenta desde el último frame
+        clock.advance(7)
+        await settle()
+        assert h.attempts == []
+        clock.advance(2)
+        await settle()
+        assert h.attempts == [0]
+        assert h.supervisor.stats()["stalls_detected"] == 1 and h.supervisor.stats()["restarts"] == 1
+        return h
+
+    h = asyncio.run(scenario())
+    assert len(h.sources) == 2 # Se vigila la fuente nueva
+
+
+def test_startup_deadline_for_streams_that_never_play(clock):
+    async def scenario():
+        h = Harness(clock, stall_deadline=1, startup_deadline=15)
+        h.supervisor.start()
+        h.watch(playing=False)
+        clock.advance(10) # Más que stall_deadline: sin primer frame solo cuenta el plazo de arranque
+        await settle()
+        assert h.attempts == []
+        clock.advance(6)
+        await settle()
+        assert h.attempts == [0]
+
+    asyncio.run(scenario())
+
+
+def test_failed_restarts_back_off_then_give_up(clock):
+    async def scenario():
+        h = Harness(clock, heals=False, max_attempts=3)
+        h.supervisor.start()
+        h.supervisor.report_failure(1, "el stream terminó")
+        await settle(0.3)
+        return h
+
+    h = asyncio.run(scenario())
+    assert h.attempts == [0, 1, 2] # Cada intento fallido avanza al siguiente espejo
+    assert h.given_up == [1]
+    assert h.supervisor.stats()["gave_up"] == 1 and h.supervisor.stats()["watched"] == 0
+
+
+def test_attempts_reset_after_stable_audio(clock):
+    async def scenario():
+        h = Harness(clock, stall_deadline=8, healthy_after=30)
+        h.supervisor.start()
+        h.watch()
+        h.supervisor.report_failure(1, "corte")
+        await settle()
+        clock.advance(10) # La fuente nueva vuelve a cortarse antes de estar estable
+        await settle()
+        assert h.attempts == [0, 1]
+
+        h.sources[-1].frame()
+        for _ in range(4): # 40 s de audio estable
+            clock.advance(10)
+            h.sources[-1].frame()
+            await settle(0.03)
+        clock.advance(10)
+        await settle()
+        assert h.attempts == [0, 1, 0] # El corte siguiente parte de cero
+        assert h.supervisor.stats()["recovered"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_unwatch_cancels_pending_restart(clock):
+    async def scenario():
+        h = Harness(clock, backoff=BackoffPolicy(base=0.2, cap=0.2))
+        h.supervisor.start()
+        h.watch()
+        h.supervisor.report_failure(1, "corte")
+        assert h.supervisor.is_recovering(1)
+        h.supervisor.unwatch(1) # El usuario paró la radio mientras se esperaba el reintento
+        await settle(0.3)
+        assert not h.supervisor.is_recovering(1)
+        return h
+
+    h = asyncio.run(scenario())
+    assert h.attempts == [] and h.supervisor.stats()["restarts"] == 0
+
+
+def test_restart_reporting_nothing_to_recover_stops(clock):
+    async def scenario():
+        supervisor = StreamSupervisor(lambda guild_id, attempt: asyncio.sleep(0, result=False), check_interval=TICK,
+                                      clock=clock, backoff=BackoffPolicy(base=0.01, cap=0.01))
+        supervisor.start()
+        supervisor.report_failure(1, "corte")
+        await settle()
+        return supervisor.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["restarts"] == 1 and stats["recovering"] == 0 and stats["watched"] == 0 and stats["gave_up"] == 0